@@ -79,3 +79,38 @@ class LecteurCreationPermissionsTests(TestCase):
         admins = User.objects.filter(is_staff=True)
         self.assertEqual(admins.count(), 1)
         self.assertTrue(admins.filter(username='resetadmin').exists())
+
+
+class UsernameAllocationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        for username in ('alice@example.com', 'alice@example.com1', 'alice@example.com2', 'alice@example.com4'):
+            User.objects.create_user(username=username, password='pass')
+
+    def test_first_free_name_found_in_one_query(self):
+        from accounts.usernames import allocate_username
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_username('alice@example.com'), 'alice@example.com3')
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_username('bob@example.com'), 'bob@example.com')
+
+    def test_suffix_respects_max_length(self):
+        from accounts.usernames import allocate_username
+        base = 'x' * 150
+        get_user_model().objects.create_user(username=base, password='pass')
+        self.assertEqual(allocate_username(base), 'x' * 149 + '1')
+
+    def test_truncated_candidates_already_taken(self):
+        from accounts.usernames import allocate_username, create_user_with_free_username
+        base = 'y' * 150
+        for username in (base, 'y' * 149 + '1', 'y' * 149 + '2'):
+            get_user_model().objects.create_user(username=username, password='pass')
+        self.assertEqual(allocate_username(base), 'y' * 149 + '3')
+        user = create_user_with_free_username(base, 'S3cret-pass')
+        self.assertEqual(user.username, 'y' * 149 + '3')
+
+    def test_create_user_single_insert_and_usable_password(self):
+        from accounts.usernames import create_user_with_free_username
+        user = create_user_with_free_username('alice@example.com', 'S3cret-pass', role='lecteur', email='alice@example.com')
+        self.assertEqual((user.username, user.role), ('alice@example.com3', 'lecteur'))
+        self.assertTrue(self.client.login(username='alice@example.com3', password='S3cret-pass'))
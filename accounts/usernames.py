@@ -0,0 +1,63 @@
+"""
+Attribution des noms d'utilisateur des comptes créés automatiquement (lecteurs).
+
+Les noms déjà pris commençant par le nom souhaité sont lus en une seule requête
+(`username LIKE 'base%'`, servie par l'index unique de la colonne) ; le premier
+nom libre parmi `base`, `base1`, `base2`... est choisi en mémoire. Créer un compte
+coûte donc une lecture et une insertion, quel que soit le nombre de comptes
+partageant le même préfixe.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+
+def allocate_username(base, reserved=()):
+    """Premier nom d'utilisateur libre parmi `base`, `base1`, `base2`...
+
+    Si `base` atteint la longueur maximale, le suffixe remplace ses derniers
+    caractères : les noms pris sont alors relus pour ce préfixe tronqué (une
+    requête de plus par nombre de chiffres du suffixe). `reserved` : noms déjà
+    attribués mais pas encore enregistrés (import par lots), traités comme pris.
+    """
+    User = get_user_model()
+    max_length = User._meta.get_field('username').max_length
+    base = base[:max_length]
+
+    taken, queried = set(), set()
+
+    def load(prefix):
+        if prefix not in queried:
+            queried.add(prefix)
+            taken.update(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+
+    load(base)
+    if base not in taken and base not in reserved:
+        return base
+    suffix = 1
+    while True:
+        stem = base[:max_length - len(str(suffix))]
+        load(stem)
+        candidate = f'{stem}{suffix}'
+        if candidate not in taken and candidate not in reserved:
+            return candidate
+        suffix += 1
+
+
+def create_user_with_free_username(base, password, attempts=3, **fields):
+    """Crée un utilisateur sous le premier nom libre dérivé de `base`.
+
+    Le mot de passe est haché avant l'unique INSERT. Si un autre processus prend
+    le nom entre la lecture et l'insertion, l'attribution est recommencée (au plus
+    `attempts` fois). Retourne l'utilisateur créé, ou None.
+    """
+    User = get_user_model()
+    for _ in range(attempts):
+        user = User(username=allocate_username(base), **fields)
+        user.set_password(password)
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            continue
+        return user
+    return None
@@ -45,6 +45,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Dernière activité des lecteurs : tampon en mémoire vidé par un UPDATE groupé périodique
+    'members.middleware.ActivityTrackerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -125,6 +127,20 @@ if DATABASE_URL and dj_database_url:
     }
 # Sinon, on garde la configuration SQLite pour le développement local (déclarée plus haut)
 
+# --- Cache partagé via REDIS_URL (production, plusieurs processus)
+# La version du catalogue, les verrous de recalcul (library.cache) et la
+# reconstruction de l'index d'autocomplétion supposent un cache commun à tous
+# les workers. Sans REDIS_URL, le cache local par défaut est propre à chaque
+# processus : convenable en développement (un seul processus).
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 # WhiteNoise: stockage compressé en production
 if not DEBUG:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -148,3 +164,16 @@ MESSAGE_TAGS = {
 
 # Pagination
 PAGINATION_SIZE = 20
+
+# E-mails (notifications envoyées par la commande run_notification_worker)
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend',
+)
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False').lower() in ('1', 'true', 'yes')
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'bibliotheque@localhost')
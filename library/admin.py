@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Category, Book
+from django.db import transaction
+from .models import Category, Book, LibraryStats
+from .cache import bump_catalog_version
+from . import autocomplete, stats
 
 
 @admin.register(Category)
@@ -20,11 +23,11 @@ class BookAdmin(admin.ModelAdmin):
     """Admin pour les livres"""
     list_display = ('title', 'author', 'isbn', 'category', 'total_copies', 'available_copies', 'is_active', 'date_added')
     list_filter = ('category', 'is_active', 'date_added', 'language')
-    search_fields = ('title', 'author', 'isbn')
-    readonly_fields = ('date_added', 'updated_at')
+    search_fields = ('title', 'author', 'isbn', 'isbn13')
+    readonly_fields = ('isbn13', 'date_added', 'updated_at')
     fieldsets = (
         ('Informations Principales', {
-            'fields': ('title', 'author', 'isbn', 'category')
+            'fields': ('title', 'author', 'isbn', 'isbn13', 'category')
         }),
         ('Exemplaires', {
             'fields': ('total_copies', 'available_copies')
@@ -42,12 +45,31 @@ class BookAdmin(admin.ModelAdmin):
 
     def mark_as_active(self, request, queryset):
         """Action pour marquer les livres comme actifs"""
+        category_ids = set(queryset.values_list('category_id', flat=True))
         updated = queryset.update(is_active=True)
+        transaction.on_commit(bump_catalog_version)  # update() ne déclenche pas les signaux
+        autocomplete.reset_index()
+        stats.refresh_categories(category_ids)
         self.message_user(request, f'{updated} livre(s) marqué(s) comme actif(s).')
     mark_as_active.short_description = 'Marquer comme actif'
 
     def mark_as_inactive(self, request, queryset):
         """Action pour marquer les livres comme inactifs"""
+        category_ids = set(queryset.values_list('category_id', flat=True))
         updated = queryset.update(is_active=False)
+        transaction.on_commit(bump_catalog_version)  # update() ne déclenche pas les signaux
+        autocomplete.reset_index()
+        stats.refresh_categories(category_ids)
         self.message_user(request, f'{updated} livre(s) marqué(s) comme inactif(s).')
     mark_as_inactive.short_description = 'Marquer comme inactif'
+
+
+@admin.register(LibraryStats)
+class LibraryStatsAdmin(admin.ModelAdmin):
+    """Admin (lecture seule) des compteurs du tableau de bord"""
+    list_display = ('total_books', 'available_books', 'active_loans', 'overdue_loans',
+                    'total_lecteurs', 'categories_count', 'reconciled_at')
+    readonly_fields = [f.name for f in LibraryStats._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
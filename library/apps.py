@@ -8,3 +8,7 @@ class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
     verbose_name = 'Gestion des Livres'
+
+    def ready(self):
+        # Brancher la maintenance de l'index plein texte sur Book
+        from . import signals  # noqa: F401
@@ -0,0 +1,177 @@
+"""
+Index de préfixes en mémoire pour l'autocomplétion des titres et auteurs.
+
+L'index est un tableau trié de clés normalisées (sans accents, minuscules)
+interrogé par `bisect` : une recherche coûte O(log n + k) sans accès à la base.
+Chaque titre est indexé à partir de chacun de ses mots (« anneaux » retrouve
+« Le Seigneur des anneaux »), chaque auteur en entier et par nom.
+
+L'index est construit dès la première requête traitée par chaque processus
+(`warm_index`, branché sur `request_started`) plutôt qu'à la première
+autocomplétion, puis tenu à jour par les signaux de `Book` (voir
+`library.signals`). Il retient la version du catalogue (`library.cache`) sur
+laquelle il a été construit : une écriture faite par un autre processus
+incrémente cette version et l'index est reconstruit à la recherche suivante.
+Cela suppose un cache partagé entre les processus (voir `CACHES` dans
+`config.settings`) ; avec le cache local par défaut, chaque processus ne voit
+que ses propres écritures.
+"""
+import logging
+import sys
+import threading
+from bisect import bisect_left
+
+from django.db import DatabaseError
+
+from .cache import get_catalog_version
+from .fuzzy import normalize
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 10
+
+
+class PrefixIndex:
+    """Tableau trié de `(clé, type, libellé, id du livre)`"""
+
+    def __init__(self):
+        self._entries = []
+        self._keys = []
+        self._by_book = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _book_entries(book):
+        entries = set()
+        title_words = normalize(book.title).split()
+        for i in range(len(title_words)):
+            entries.add((' '.join(title_words[i:]), 'title', book.title, book.pk))
+        author_words = normalize(book.author).split()
+        for i in range(len(author_words)):
+            entries.add((' '.join(author_words[i:]), 'author', book.author, book.pk))
+        return sorted(entries)
+
+    def build(self, books):
+        """Construit l'index d'un coup (tri unique plutôt que des insertions)"""
+        entries = []
+        by_book = {}
+        for book in books:
+            book_entries = self._book_entries(book)
+            by_book[book.pk] = book_entries
+            entries.extend(book_entries)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys = [e[0] for e in entries]
+            self._by_book = by_book
+
+    def _remove_locked(self, book_id):
+        for entry in self._by_book.pop(book_id, ()):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+                del self._keys[i]
+
+    def add(self, book):
+        """Ajoute ou remplace les entrées d'un livre"""
+        book_entries = self._book_entries(book)
+        with self._lock:
+            self._remove_locked(book.pk)
+            for entry in book_entries:
+                i = bisect_left(self._entries, entry)
+                self._entries.insert(i, entry)
+                self._keys.insert(i, entry[0])
+            self._by_book[book.pk] = book_entries
+
+    def remove(self, book_id):
+        """Retire toutes les entrées d'un livre"""
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def lookup(self, prefix, limit=MAX_RESULTS):
+        """Suggestions dont une clé commence par `prefix` (dédoublonnées par libellé)"""
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, prefix)
+            while i < len(self._keys) and self._keys[i].startswith(prefix) and len(results) < limit:
+                _, kind, label, book_id = self._entries[i]
+                if (kind, label) not in seen:
+                    seen.add((kind, label))
+                    results.append({'label': label, 'kind': kind, 'book_id': book_id})
+                i += 1
+        return results
+
+    def stats(self):
+        """Taille de l'index : nombre d'entrées et mémoire approximative (octets)"""
+        with self._lock:
+            size = sys.getsizeof(self._entries) + sys.getsizeof(self._keys) + sys.getsizeof(self._by_book)
+            for entry in self._entries:
+                size += sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[2])
+            for book_entries in self._by_book.values():
+                size += sys.getsizeof(book_entries)
+            return {
+                'books': len(self._by_book),
+                'entries': len(self._entries),
+                'memory_bytes': size,
+            }
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Index du processus, (re)construit à partir des livres actifs au premier
+    appel et chaque fois que la version du catalogue a changé"""
+    global _index, _index_version
+    # Version lue avant la construction : une écriture validée pendant celle-ci
+    # provoquera une nouvelle reconstruction
+    version = get_catalog_version()
+    if _index is None or _index_version != version:
+        with _index_lock:
+            if _index is None or _index_version != version:
+                from .models import Book
+                index = PrefixIndex()
+                index.build(Book.objects.filter(is_active=True).only('pk', 'title', 'author').iterator())
+                _index, _index_version = index, version
+    return _index
+
+
+def reset_index():
+    """Oublie l'index courant (reconstruit au prochain appel)"""
+    global _index, _index_version
+    with _index_lock:
+        _index = _index_version = None
+
+
+def warm_index(sender, **kwargs):
+    """Récepteur de `request_started` : construit l'index dès la première requête
+    du processus, pour que la première autocomplétion ne parcoure pas le catalogue"""
+    if _index is not None:
+        return
+    try:
+        get_index()
+    except DatabaseError:
+        # Base indisponible (ou pas encore migrée) : construction au premier appel
+        logger.exception('Construction de l\'index d\'autocomplétion impossible')
+
+
+def update_book(book):
+    """Répercute l'enregistrement d'un livre si l'index est déjà chargé"""
+    if _index is None:
+        return
+    if book.is_active:
+        _index.add(book)
+    else:
+        _index.remove(book.pk)
+
+
+def remove_book(book_id):
+    """Répercute la suppression d'un livre si l'index est déjà chargé"""
+    if _index is not None:
+        _index.remove(book_id)
@@ -0,0 +1,158 @@
+"""
+Outils de cache du catalogue.
+
+Les entrées en cache sont préfixées par un numéro de version du catalogue,
+incrémenté à chaque écriture sur `Book` : l'invalidation se fait en O(1)
+(les anciennes clés ne sont plus lues et expirent d'elles-mêmes). Les écritures
+appellent `bump_catalog_version` via `transaction.on_commit` : incrémentée avant
+la validation, la version laisserait une lecture concurrente mettre en cache les
+anciennes lignes sous le nouveau numéro.
+
+`get_or_refresh` fournit en plus un cache « stale-while-revalidate » pour les
+données coûteuses du tableau de bord, avec un seul recalcul à la fois.
+
+Versions et verrous vivent dans le cache Django : ils ne sont partagés entre
+les processus qu'avec un cache commun (Redis, via `REDIS_URL` dans
+`config.settings`). Avec le cache local par défaut, chaque processus a sa
+propre version et recalcule de son côté (un recalcul à la fois par processus).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = 'library:catalog_version'
+
+# Durée de vie des entrées versionnées (secondes)
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def get_catalog_version():
+    """Version courante du catalogue"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalide toutes les entrées versionnées du catalogue"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def catalog_key(namespace, params):
+    """Clé de cache versionnée dérivée de paramètres normalisés (dict sérialisable)"""
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'library:{namespace}:v{get_catalog_version()}:{digest}'
+
+
+# --- Stale-while-revalidate avec coalescence des recalculs -----------------
+
+SWR_COUNTER_KEYS = {
+    'hit': 'library:swr:hits',
+    'miss': 'library:swr:misses',
+    'stale': 'library:swr:stale',
+}
+
+# Durée maximale d'un recalcul (le verrou expire au-delà)
+SWR_LOCK_TIMEOUT = 30
+
+# Attente maximale d'un recalcul en cours lancé par une autre requête (secondes)
+SWR_WAIT_TIMEOUT = 2.0
+SWR_WAIT_INTERVAL = 0.05
+
+
+def _incr_counter(kind):
+    key = SWR_COUNTER_KEYS[kind]
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def swr_counters():
+    """Compteurs hit / miss / stale du cache stale-while-revalidate"""
+    values = cache.get_many(list(SWR_COUNTER_KEYS.values()))
+    return {kind: values.get(key, 0) for kind, key in SWR_COUNTER_KEYS.items()}
+
+
+def reset_swr_counters():
+    cache.delete_many(list(SWR_COUNTER_KEYS.values()))
+
+
+def _refresh(key, lock_key, compute, fresh_for, stale_for):
+    try:
+        value = compute()
+        cache.set(key, (value, time.time() + fresh_for), fresh_for + stale_for)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def _refresh_in_background(key, lock_key, compute, fresh_for, stale_for):
+    def run():
+        try:
+            _refresh(key, lock_key, compute, fresh_for, stale_for)
+        except Exception:
+            logger.exception('Échec du recalcul en arrière-plan de %s', key)
+        finally:
+            # Chaque thread ouvre sa propre connexion : la fermer
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'swr-refresh:{key}', daemon=True).start()
+
+
+def get_or_refresh(key, compute, fresh_for=30, stale_for=300):
+    """Lecture en cache « stale-while-revalidate ».
+
+    - valeur fraîche : servie directement (hit) ;
+    - valeur périmée : servie telle quelle (stale) pendant qu'une seule requête,
+      protégée par un verrou en cache (`cache.add`), la recalcule en arrière-plan ;
+    - absence : une seule requête recalcule (miss), les autres attendent son
+      résultat quelques instants au lieu de recalculer en parallèle.
+
+    « Une seule » vaut pour l'ensemble des processus partageant le cache : avec
+    le cache local par défaut, un recalcul par processus.
+    """
+    lock_key = f'{key}:lock'
+    cached = cache.get(key)
+    if cached is not None:
+        value, fresh_until = cached
+        if time.time() < fresh_until:
+            _incr_counter('hit')
+            return value
+        _incr_counter('stale')
+        if cache.add(lock_key, 1, SWR_LOCK_TIMEOUT):
+            if getattr(settings, 'LIBRARY_CACHE_BACKGROUND_REFRESH', True):
+                _refresh_in_background(key, lock_key, compute, fresh_for, stale_for)
+            else:
+                _refresh(key, lock_key, compute, fresh_for, stale_for)
+        return value
+
+    _incr_counter('miss')
+    if cache.add(lock_key, 1, SWR_LOCK_TIMEOUT):
+        return _refresh(key, lock_key, compute, fresh_for, stale_for)
+
+    # Un autre processus recalcule déjà : attendre son résultat
+    deadline = time.time() + SWR_WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(SWR_WAIT_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+    return compute()
@@ -0,0 +1,124 @@
+"""
+Facettes du catalogue (catégorie, langue, disponibilité).
+
+Toutes les facettes sont calculées à partir d'une seule requête groupée par
+`(catégorie, langue)` avec agrégation conditionnelle (total et exemplaires
+disponibles). Chaque facette ignore son propre filtre et applique les autres
+(comptages « disjonctifs »), ce qui se fait en Python sur ces quelques lignes.
+
+La requête ne dépend que de la recherche textuelle : son résultat est mis en
+cache sous une clé dérivée de la recherche normalisée et de la version du
+catalogue (voir `library.cache`).
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import CATALOG_CACHE_TIMEOUT, catalog_key
+
+AVAILABILITY_CHOICES = (
+    ('available', 'Disponibles'),
+    ('unavailable', 'Indisponibles'),
+)
+
+
+def facet_rows(queryset):
+    """Exécute la requête d'agrégation unique et retourne des lignes sérialisables"""
+    rows = (
+        queryset.order_by()
+        .values('category_id', 'category__name', 'language')
+        .annotate(
+            total=Count('id'),
+            available=Count('id', filter=Q(available_copies__gt=0)),
+        )
+    )
+    return [
+        (row['category_id'], row['category__name'], row['language'], row['total'], row['available'])
+        for row in rows
+    ]
+
+
+def get_facet_rows(queryset, search_key):
+    """`facet_rows` mis en cache ; `search_key` identifie la recherche normalisée"""
+    key = catalog_key('facets', search_key)
+    rows = cache.get(key)
+    if rows is None:
+        rows = facet_rows(queryset)
+        cache.set(key, rows, CATALOG_CACHE_TIMEOUT)
+    return rows
+
+
+def _count(total, available, availability):
+    if availability == 'available':
+        return available
+    if availability == 'unavailable':
+        return total - available
+    return total
+
+
+def _query(params, name, value):
+    params = params.copy()
+    for key in ('page', 'cursor'):
+        params.pop(key, None)
+    if value in (None, ''):
+        params.pop(name, None)
+    else:
+        params[name] = value
+    return params.urlencode()
+
+
+def build_facets(rows, params, category=None, language='', availability=''):
+    """Construit les facettes affichables à partir des lignes agrégées.
+
+    `params` est la QueryDict de la requête : chaque entrée reçoit la query string
+    qui active (ou désactive) son filtre en conservant les autres.
+    """
+    category_id = category.pk if category else None
+    categories = {}
+    languages = {}
+    availability_counts = {'available': 0, 'unavailable': 0}
+
+    for cat_id, cat_name, lang, total, available in rows:
+        if language in ('', lang):
+            entry = categories.setdefault(cat_id, {'id': cat_id, 'name': cat_name or 'Sans catégorie', 'count': 0})
+            entry['count'] += _count(total, available, availability)
+        if category_id in (None, cat_id):
+            entry = languages.setdefault(lang, {'value': lang, 'count': 0})
+            entry['count'] += _count(total, available, availability)
+            if language in ('', lang):
+                availability_counts['available'] += available
+                availability_counts['unavailable'] += total - available
+
+    category_facets = []
+    for entry in sorted(categories.values(), key=lambda e: (-e['count'], e['name'])):
+        if not entry['count'] or entry['id'] is None:
+            continue
+        selected = entry['id'] == category_id
+        entry['selected'] = selected
+        entry['query'] = _query(params, 'category', '' if selected else entry['id'])
+        category_facets.append(entry)
+
+    language_facets = []
+    for entry in sorted(languages.values(), key=lambda e: (-e['count'], e['value'])):
+        if not entry['count']:
+            continue
+        selected = entry['value'] == language
+        entry['selected'] = selected
+        entry['query'] = _query(params, 'language', '' if selected else entry['value'])
+        language_facets.append(entry)
+
+    availability_facets = []
+    for value, label in AVAILABILITY_CHOICES:
+        selected = value == availability
+        availability_facets.append({
+            'value': value,
+            'label': label,
+            'count': availability_counts[value],
+            'selected': selected,
+            'query': _query(params, 'availability', '' if selected else value),
+        })
+
+    return {
+        'categories': category_facets,
+        'languages': language_facets,
+        'availability': availability_facets,
+    }
@@ -33,6 +33,14 @@ class BookForm(forms.ModelForm):
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        total = cleaned_data.get('total_copies')
+        available = cleaned_data.get('available_copies')
+        if total is not None and available is not None and available > total:
+            self.add_error('available_copies', 'Le nombre d\'exemplaires disponibles ne peut pas dépasser le nombre total.')
+        return cleaned_data
+
 
 class BookSearchForm(forms.Form):
     """Formulaire de recherche de livres"""
@@ -61,3 +69,13 @@ class BookSearchForm(forms.Form):
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'})
     )
+    language = forms.CharField(
+        label='Langue',
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Langue'})
+    )
+    fuzzy = forms.BooleanField(
+        label='Recherche approchée (tolère les fautes de frappe)',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
@@ -0,0 +1,172 @@
+"""
+Recherche approchée (tolérante aux fautes de frappe) sur le catalogue.
+
+Le vocabulaire du catalogue (`CatalogWord`) couvre les colonnes textuelles de
+l'index plein texte (titre, auteur, éditeur, description) : un mot trouvé par la
+recherche n'est donc jamais « corrigé ». Chaque mot compte les livres qui
+l'emploient (`book_count`) et disparaît du vocabulaire quand ce nombre retombe
+à zéro (modification ou suppression du dernier livre).
+
+Le vocabulaire est indexé par trigrammes (`WordTrigram`, même découpage que
+pg_trgm : deux espaces en tête, un en fin). Pour corriger un mot, on ne lit que
+les listes de trigrammes qu'il partage avec le vocabulaire (index sur
+`trigram`) ; la similarité de Jaccard est calculée et classée dans la même
+requête groupée, à partir du nombre de trigrammes enregistré pour chaque mot
+(`trigram_count`). Aucun parcours de la table `library_book`.
+"""
+import re
+import unicodedata
+from collections import Counter
+
+from django.db.models import Count, F, FloatField, Value
+from django.db.models.functions import Cast
+
+from .models import Book, CatalogWord, WordTrigram
+
+# Seuil de similarité en dessous duquel un candidat est ignoré (défaut pg_trgm : 0.3)
+SIMILARITY_THRESHOLD = 0.3
+
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = 100
+
+# Colonnes de `Book` alimentant le vocabulaire (celles de l'index plein texte, hors ISBN)
+VOCABULARY_FIELDS = ('title', 'author', 'publisher', 'description')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules et suppression des accents"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Mots indexables d'un texte (normalisés, hors nombres et mots trop courts)"""
+    return {
+        w for w in _WORD_RE.findall(normalize(text))
+        if MIN_WORD_LENGTH <= len(w) <= MAX_WORD_LENGTH and not w.isdigit()
+    }
+
+
+def trigrams(word):
+    """Trigrammes d'un mot, avec le remplissage de pg_trgm"""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def book_words(book):
+    """Mots du vocabulaire apportés par un livre"""
+    return tokenize(' '.join(getattr(book, field) or '' for field in VOCABULARY_FIELDS))
+
+
+def stored_words(book_id):
+    """Mots du livre tel qu'il est enregistré en base (avant modification)"""
+    values = Book._base_manager.filter(pk=book_id).values(*VOCABULARY_FIELDS).first()
+    return tokenize(' '.join(values[field] or '' for field in VOCABULARY_FIELDS)) if values else set()
+
+
+def _index_trigrams(words):
+    """Trigrammes des mots (queryset de `CatalogWord`) donnés"""
+    WordTrigram.objects.bulk_create(
+        [WordTrigram(trigram=t, word_id=pk) for pk, w in words.values_list('id', 'word') for t in trigrams(w)],
+        ignore_conflicts=True, batch_size=1000,
+    )
+
+
+def add_words(words):
+    """Compte un livre de plus pour chaque mot (créé, avec ses trigrammes, s'il est inconnu)"""
+    words = set(words)
+    if not words:
+        return 0
+    known = set(CatalogWord.objects.filter(word__in=words).values_list('word', flat=True))
+    new_words = words - known
+    if new_words:
+        CatalogWord.objects.bulk_create(
+            [CatalogWord(word=w, book_count=0, trigram_count=len(trigrams(w))) for w in new_words],
+            ignore_conflicts=True,
+        )
+        _index_trigrams(CatalogWord.objects.filter(word__in=new_words))
+    CatalogWord.objects.filter(word__in=words).update(book_count=F('book_count') + 1)
+    return len(new_words)
+
+
+def remove_words(words):
+    """Compte un livre de moins pour chaque mot ; retire les mots qui ne sont plus employés"""
+    words = set(words)
+    if not words:
+        return 0
+    CatalogWord.objects.filter(word__in=words, book_count__gt=0).update(book_count=F('book_count') - 1)
+    deleted, _ = CatalogWord.objects.filter(word__in=words, book_count=0).delete()
+    return deleted
+
+
+def index_book(book, old_words=frozenset()):
+    """Met à jour le vocabulaire pour un livre dont les mots étaient `old_words`"""
+    new_words = book_words(book)
+    remove_words(old_words - new_words)
+    return add_words(new_words - old_words)
+
+
+def unindex_book(book):
+    """Retire du vocabulaire les mots d'un livre supprimé"""
+    return remove_words(book_words(book))
+
+
+def rebuild_vocabulary(books):
+    """Reconstruit entièrement le vocabulaire à partir d'un itérable de livres"""
+    CatalogWord.objects.all().delete()
+    counts = Counter()
+    for book in books:
+        counts.update(book_words(book))
+    CatalogWord.objects.bulk_create(
+        [CatalogWord(word=w, book_count=n, trigram_count=len(trigrams(w))) for w, n in counts.items()],
+        batch_size=1000,
+    )
+    _index_trigrams(CatalogWord.objects.all())
+    return len(counts)
+
+
+def similar_words(word, limit=5):
+    """Mots du vocabulaire proches de `word`, triés par similarité décroissante.
+
+    Retourne une liste de tuples `(mot, similarité)`.
+    """
+    word = normalize(word)
+    grams = trigrams(word)
+    # Jaccard = communs / (trigrammes du mot + trigrammes du candidat - communs),
+    # classé par la base : aucun candidat proche n'est écarté avant d'être évalué
+    candidates = (
+        WordTrigram.objects.filter(trigram__in=grams)
+        .values('word__word')
+        .annotate(shared=Count('id'))
+        .annotate(similarity=Cast('shared', FloatField()) / (
+            Value(len(grams)) + F('word__trigram_count') - F('shared')
+        ))
+        .filter(similarity__gte=SIMILARITY_THRESHOLD)
+        .order_by('-similarity', 'word__word')[:limit]
+    )
+    return [(row['word__word'], row['similarity']) for row in candidates]
+
+
+def correct_query(term):
+    """Remplace chaque mot inconnu du vocabulaire par son plus proche voisin.
+
+    Retourne la requête corrigée, ou None si aucune correction n'a été trouvée.
+    """
+    words = _WORD_RE.findall(normalize(term))
+    candidates = [w for w in words if len(w) >= MIN_WORD_LENGTH and not w.isdigit()]
+    if not candidates:
+        return None
+    known = set(CatalogWord.objects.filter(word__in=candidates).values_list('word', flat=True))
+    corrected = []
+    changed = False
+    for w in words:
+        if w in candidates and w not in known:
+            matches = similar_words(w, limit=1)
+            if matches:
+                corrected.append(matches[0][0])
+                changed = True
+                continue
+        corrected.append(w)
+    return ' '.join(corrected) if changed else None
@@ -0,0 +1,51 @@
+"""
+Normalisation des ISBN.
+
+`normalize_isbn` convertit une saisie libre (tirets, espaces, ISBN-10 ou
+ISBN-13, code-barres EAN scanné) en ISBN-13 canonique sans séparateurs, ou
+retourne None si la valeur n'est pas un ISBN valide (clé de contrôle comprise).
+"""
+import re
+
+_SEPARATORS_RE = re.compile(r'[\s\-‐‑–—.]')
+
+# Préfixe « ISBN », éventuellement suivi de la désignation -10 / -13 (« ISBN-13: ... »)
+_PREFIX_RE = re.compile(r'^\s*ISBN(?:[\s\-‐‑–—]?1[03](?=[\s:]))?[\s:]*', re.IGNORECASE)
+
+
+def _isbn10_is_valid(code):
+    total = 0
+    for i, char in enumerate(code):
+        if char in 'Xx' and i == 9:
+            value = 10
+        elif char.isdigit():
+            value = int(char)
+        else:
+            return False
+        total += (10 - i) * value
+    return total % 11 == 0
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """Retourne l'ISBN-13 canonique de `value`, ou None si ce n'est pas un ISBN"""
+    if not value:
+        return None
+    code = _SEPARATORS_RE.sub('', _PREFIX_RE.sub('', str(value)))
+
+    if len(code) == 10:
+        if not _isbn10_is_valid(code):
+            return None
+        first12 = '978' + code[:9]
+        return first12 + _isbn13_check_digit(first12)
+
+    if len(code) == 13 and code.isdigit() and code[:3] in ('978', '979'):
+        if _isbn13_check_digit(code[:12]) != code[12]:
+            return None
+        return code
+
+    return None
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from library.isbn import normalize_isbn
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Calcule la colonne isbn13 (ISBN-13 normalisé) des livres existants, par lots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Nombre de livres traités par lot')
+        parser.add_argument('--all', action='store_true', help='Recalculer tous les livres (et pas seulement ceux sans isbn13)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        books = Book.objects.order_by('pk')
+        if not options['all']:
+            books = books.filter(isbn13__isnull=True)
+
+        last_pk = 0
+        scanned = updated = 0
+        while True:
+            chunk = list(books.filter(pk__gt=last_pk).only('pk', 'isbn', 'isbn13')[:batch_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            scanned += len(chunk)
+            changed = []
+            for book in chunk:
+                normalized = normalize_isbn(book.isbn)
+                if normalized != book.isbn13:
+                    book.isbn13 = normalized
+                    changed.append(book)
+            if changed:
+                Book.objects.bulk_update(changed, ['isbn13'])
+                updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'{scanned} livre(s) examiné(s), {updated} mis à jour.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from library import fuzzy, search
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit l\'index plein texte du catalogue (FTS5 sous SQLite) et le vocabulaire de la recherche approchée.'
+
+    def handle(self, *args, **options):
+        words = fuzzy.rebuild_vocabulary(Book.objects.only(*fuzzy.VOCABULARY_FIELDS).iterator())
+        self.stdout.write(self.style.SUCCESS(f'Vocabulaire reconstruit: {words} mot(s).'))
+
+        backend = search.get_backend()
+        if backend != 'sqlite':
+            self.stdout.write(self.style.NOTICE(
+                f'Moteur "{backend}" : l\'index est maintenu par la base, rien à reconstruire.'
+            ))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Index reconstruit: {count} livre(s) indexé(s).'))
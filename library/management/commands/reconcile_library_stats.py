@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from library import stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcule de façon ensembliste les compteurs LibraryStats du tableau de bord.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Afficher les écarts sans corriger la ligne')
+
+    def handle(self, *args, **options):
+        from library.models import LibraryStats
+        current = LibraryStats.objects.filter(pk=stats.STATS_PK).first()
+        expected = stats.compute()
+
+        drift = 0
+        for name in stats.COUNTER_FIELDS:
+            stored = getattr(current, name) if current else None
+            if stored != expected[name]:
+                drift += 1
+                self.stdout.write(self.style.WARNING(f'- {name}: {stored} -> {expected[name]}'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.NOTICE(f'Dry-run: {drift} compteur(s) en écart, aucune correction.'))
+            return
+
+        stats.reconcile()
+        self.stdout.write(self.style.SUCCESS(f'Statistiques recalculées ({drift} compteur(s) corrigé(s)).'))
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+FTS_TABLE = 'library_book_fts'
+FTS_COLUMNS = ('title', 'author', 'isbn', 'publisher', 'description')
+
+PG_INDEX = 'library_book_fts_gin'
+PG_VECTOR_SQL = (
+    "setweight(to_tsvector('french', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce(author, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce(isbn, '')), 'B') || "
+    "setweight(to_tsvector('french', coalesce(publisher, '')), 'C') || "
+    "setweight(to_tsvector('french', coalesce(description, '')), 'D')"
+)
+
+
+def forwards(apps, schema_editor):
+    """Créer l'index plein texte adapté au moteur de base de données"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        columns = ', '.join(FTS_COLUMNS)
+        selected = ', '.join(f"coalesce({c}, '')" for c in FTS_COLUMNS)
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"{columns}, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compilé sans FTS5 : la recherche retombera sur icontains
+            return
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {selected} FROM library_book'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON library_book USING GIN (({PG_VECTOR_SQL}))'
+        )
+
+
+def backwards(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:13
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Copie figée des fonctions de `library.fuzzy` au moment de cette migration
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return {w for w in re.findall(r'\w+', normalize(text)) if 3 <= len(w) <= 100 and not w.isdigit()}
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_vocabulary(apps, schema_editor):
+    """Alimenter le vocabulaire à partir des livres existants"""
+    Book = apps.get_model('library', 'Book')
+    CatalogWord = apps.get_model('library', 'CatalogWord')
+    WordTrigram = apps.get_model('library', 'WordTrigram')
+
+    words = set()
+    for title, author in Book.objects.values_list('title', 'author').iterator():
+        words |= tokenize(f'{title} {author}')
+    CatalogWord.objects.bulk_create([CatalogWord(word=w) for w in words], batch_size=1000)
+    WordTrigram.objects.bulk_create(
+        [WordTrigram(trigram=t, word_id=pk) for pk, w in CatalogWord.objects.values_list('id', 'word') for t in trigrams(w)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_book_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, unique=True, verbose_name='Mot')),
+            ],
+            options={
+                'verbose_name': 'Mot du catalogue',
+                'verbose_name_plural': 'Mots du catalogue',
+                'ordering': ['word'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WordTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Trigramme')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='library.catalogword', verbose_name='Mot')),
+            ],
+            options={
+                'verbose_name': 'Trigramme',
+                'verbose_name_plural': 'Trigrammes',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='wordtrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'word'), name='library_wordtrigram_unique'),
+        ),
+        migrations.RunPython(build_vocabulary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:14
+
+import re
+
+from django.db import migrations, models
+
+
+# Copie figée de `library.isbn.normalize_isbn` au moment de cette migration
+_SEPARATORS_RE = re.compile(r'[\s\-‐‑–—.]')
+_PREFIX_RE = re.compile(r'^\s*ISBN(?:[\s\-‐‑–—]?1[03](?=[\s:]))?[\s:]*', re.IGNORECASE)
+
+
+def _isbn10_is_valid(code):
+    total = 0
+    for i, char in enumerate(code):
+        if char in 'Xx' and i == 9:
+            value = 10
+        elif char.isdigit():
+            value = int(char)
+        else:
+            return False
+        total += (10 - i) * value
+    return total % 11 == 0
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    if not value:
+        return None
+    code = _SEPARATORS_RE.sub('', _PREFIX_RE.sub('', str(value)))
+    if len(code) == 10:
+        if not _isbn10_is_valid(code):
+            return None
+        first12 = '978' + code[:9]
+        return first12 + _isbn13_check_digit(first12)
+    if len(code) == 13 and code.isdigit() and code[:3] in ('978', '979'):
+        if _isbn13_check_digit(code[:12]) != code[12]:
+            return None
+        return code
+    return None
+
+
+def backfill_isbn13(apps, schema_editor):
+    """Calculer isbn13 des livres existants (la recherche par code-barres ne lit que cette colonne)"""
+    Book = apps.get_model('library', 'Book')
+    changed = []
+    for book in Book.objects.only('pk', 'isbn').iterator():
+        book.isbn13 = normalize_isbn(book.isbn)
+        if book.isbn13:
+            changed.append(book)
+    Book.objects.bulk_update(changed, ['isbn13'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_catalog_vocabulary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=13, null=True, verbose_name='ISBN-13 normalisé'),
+        ),
+        migrations.RunPython(backfill_isbn13, migrations.RunPython.noop),
+    ]
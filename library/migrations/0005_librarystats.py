@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_book_isbn13'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_books', models.IntegerField(default=0, verbose_name='Livres')),
+                ('available_books', models.IntegerField(default=0, verbose_name='Livres disponibles')),
+                ('unavailable_books', models.IntegerField(default=0, verbose_name='Livres indisponibles')),
+                ('active_loans', models.IntegerField(default=0, verbose_name='Emprunts en cours')),
+                ('overdue_loans', models.IntegerField(default=0, verbose_name='Emprunts en retard')),
+                ('total_lecteurs', models.IntegerField(default=0, verbose_name='Lecteurs actifs')),
+                ('total_lecteurs_total', models.IntegerField(default=0, verbose_name='Lecteurs')),
+                ('categories_count', models.IntegerField(default=0, verbose_name='Catégories')),
+                ('active_categories', models.IntegerField(default=0, verbose_name='Catégories actives')),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True, verbose_name='Dernier recalcul complet')),
+            ],
+            options={
+                'verbose_name': 'Statistiques de la bibliothèque',
+                'verbose_name_plural': 'Statistiques de la bibliothèque',
+            },
+        ),
+    ]
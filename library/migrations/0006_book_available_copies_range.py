@@ -0,0 +1,25 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:29
+
+from django.db import migrations, models
+
+
+def clamp_available_copies(apps, schema_editor):
+    """Ramener le stock existant dans [0, total_copies] avant d'ajouter la contrainte"""
+    Book = apps.get_model('library', 'Book')
+    Book.objects.filter(available_copies__gt=models.F('total_copies')).update(available_copies=models.F('total_copies'))
+    Book.objects.filter(available_copies__lt=0).update(available_copies=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_librarystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_available_copies, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.CheckConstraint(check=models.Q(('available_copies__gte', 0), ('available_copies__lte', models.F('total_copies'))), name='library_book_available_copies_range'),
+        ),
+    ]
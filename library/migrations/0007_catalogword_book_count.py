@@ -0,0 +1,59 @@
+# Generated by Django 4.2.8 on 2026-10-18 00:16
+
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import migrations, models
+
+
+# Copie figée des fonctions de `library.fuzzy` au moment de cette migration
+VOCABULARY_FIELDS = ('title', 'author', 'publisher', 'description')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return {w for w in re.findall(r'\w+', normalize(text)) if 3 <= len(w) <= 100 and not w.isdigit()}
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def rebuild_vocabulary(apps, schema_editor):
+    """Reconstruire le vocabulaire (éditeur et description inclus) avec le nombre de livres par mot"""
+    Book = apps.get_model('library', 'Book')
+    CatalogWord = apps.get_model('library', 'CatalogWord')
+    WordTrigram = apps.get_model('library', 'WordTrigram')
+
+    counts = Counter()
+    for values in Book.objects.values_list(*VOCABULARY_FIELDS).iterator():
+        counts.update(tokenize(' '.join(value or '' for value in values)))
+    WordTrigram.objects.all().delete()
+    CatalogWord.objects.all().delete()
+    CatalogWord.objects.bulk_create([CatalogWord(word=w, book_count=n) for w, n in counts.items()], batch_size=1000)
+    WordTrigram.objects.bulk_create(
+        [WordTrigram(trigram=t, word_id=pk) for pk, w in CatalogWord.objects.values_list('id', 'word') for t in trigrams(w)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_available_copies_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogword',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de livres'),
+        ),
+        migrations.RunPython(rebuild_vocabulary, migrations.RunPython.noop),
+    ]
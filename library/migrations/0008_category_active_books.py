@@ -0,0 +1,32 @@
+# Generated by Django 4.2.8 on 2026-10-18 00:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_books(apps, schema_editor):
+    """Initialiser le nombre de livres actifs de chaque catégorie"""
+    Book = apps.get_model('library', 'Book')
+    Category = apps.get_model('library', 'Category')
+    active_books = (
+        Book.objects.filter(category=OuterRef('pk'), is_active=True)
+        .order_by().values('category').annotate(n=Count('id')).values('n')
+    )
+    Category.objects.update(active_books=Coalesce(Subquery(active_books), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_catalogword_book_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_books',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Livres actifs'),
+        ),
+        migrations.RunPython(count_active_books, migrations.RunPython.noop),
+    ]
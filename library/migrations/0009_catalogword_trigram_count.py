@@ -0,0 +1,29 @@
+# Generated by Django 4.2.8 on 2026-10-18 00:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def count_trigrams(apps, schema_editor):
+    """Nombre de trigrammes de chaque mot, lu dans l'index (un UPDATE ensembliste)"""
+    CatalogWord = apps.get_model('library', 'CatalogWord')
+    WordTrigram = apps.get_model('library', 'WordTrigram')
+    CatalogWord.objects.update(trigram_count=Subquery(
+        WordTrigram.objects.filter(word=OuterRef('pk')).values('word').annotate(n=Count('id')).values('n')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_category_active_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogword',
+            name='trigram_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Nombre de trigrammes'),
+        ),
+        migrations.RunPython(count_trigrams, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone
+from . import stats
+from .cache import bump_catalog_version
+from .isbn import normalize_isbn
 
 
 class Category(models.Model):
@@ -17,6 +21,11 @@ class Category(models.Model):
         auto_now_add=True,
         verbose_name='Date de création'
     )
+    active_books = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Livres actifs'
+    )
 
     class Meta:
         verbose_name = 'Catégorie'
@@ -26,6 +35,14 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """`active_books` est tenu par `library.stats` : une instance périmée ne doit pas l'écraser"""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'active_books'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Book(models.Model):
     """Modèle pour les livres"""
@@ -42,6 +59,14 @@ class Book(models.Model):
         unique=True,
         verbose_name='ISBN'
     )
+    isbn13 = models.CharField(
+        max_length=13,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        verbose_name='ISBN-13 normalisé'
+    )
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
@@ -102,26 +127,167 @@ class Book(models.Model):
             models.Index(fields=['isbn']),
             models.Index(fields=['category']),
         ]
+        constraints = [
+            # Garde-fou en base : le stock ne peut ni devenir négatif ni dépasser le total
+            models.CheckConstraint(
+                check=models.Q(available_copies__gte=0, available_copies__lte=models.F('total_copies')),
+                name='library_book_available_copies_range',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.author}"
 
+    def save(self, *args, **kwargs):
+        """Synchroniser `isbn13` (forme canonique indexée) avec la saisie libre `isbn`"""
+        self.isbn13 = normalize_isbn(self.isbn)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'isbn' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'isbn13'}
+        super().save(*args, **kwargs)
+
     def is_available(self):
         """Vérifie si le livre est disponible"""
         return self.available_copies > 0
 
+    # Condition d'un emprunt (-1) ou d'un retour (+1), en SQL et en filtre ORM
+    STOCK_CONDITIONS = {
+        -1: ('available_copies > 0', models.Q(available_copies__gt=0)),
+        1: ('available_copies < total_copies', models.Q(available_copies__lt=models.F('total_copies'))),
+    }
+
+    def _adjust_stock(self, delta):
+        """Fait varier `available_copies` de `delta` (±1) par un seul UPDATE conditionnel.
+
+        Aucune lecture préalable : la condition (`available_copies > 0` ou
+        `available_copies < total_copies`) est évaluée par la base sur la ligne
+        verrouillée, ce qui exclut toute survente entre deux requêtes concurrentes.
+        Retourne le nouveau stock, ou None si la condition n'est pas remplie.
+        """
+        condition, condition_q = self.STOCK_CONDITIONS[delta]
+        now = timezone.now()
+        if connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+        ):
+            # UPDATE ... RETURNING : un seul aller-retour
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {qn(self._meta.db_table)} '
+                    f'SET available_copies = available_copies + %s, updated_at = %s '
+                    f'WHERE id = %s AND {condition} RETURNING available_copies',
+                    [delta, connection.ops.adapt_datetimefield_value(now), self.pk],
+                )
+                row = cursor.fetchone()
+            available = row[0] if row else None
+        else:
+            available = None
+            if Book.objects.filter(condition_q, pk=self.pk).update(
+                available_copies=models.F('available_copies') + delta, updated_at=now
+            ):
+                available = Book.objects.filter(pk=self.pk).values_list('available_copies', flat=True).get()
+        if available is None:
+            return None
+
+        self.available_copies = available
+        self.updated_at = now
+        # Pas de signal post_save : compteurs et cache catalogue mis à jour ici
+        if delta < 0 and available == 0:
+            stats.apply_delta(available_books=-1, unavailable_books=1)
+        elif delta > 0 and available == 1:
+            stats.apply_delta(available_books=1, unavailable_books=-1)
+        transaction.on_commit(bump_catalog_version)
+        return available
+
     def borrow_book(self):
-        """Emprunter un exemplaire"""
-        if self.available_copies > 0:
-            self.available_copies -= 1
-            self.save()
-            return True
-        return False
+        """Emprunter un exemplaire (décrément atomique, sans survente)"""
+        return self._adjust_stock(-1) is not None
 
     def return_book(self):
-        """Retourner un exemplaire"""
-        if self.available_copies < self.total_copies:
-            self.available_copies += 1
-            self.save()
-            return True
-        return False
+        """Retourner un exemplaire (incrément atomique, plafonné au nombre total)"""
+        return self._adjust_stock(1) is not None
+
+
+class CatalogWord(models.Model):
+    """Vocabulaire du catalogue (mots des colonnes de l'index plein texte), utilisé
+    par la recherche approchée et la suggestion « Vouliez-vous dire ? »"""
+    word = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Mot'
+    )
+    book_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Nombre de livres'
+    )
+    trigram_count = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Nombre de trigrammes'
+    )
+
+    class Meta:
+        verbose_name = 'Mot du catalogue'
+        verbose_name_plural = 'Mots du catalogue'
+        ordering = ['word']
+
+    def __str__(self):
+        return self.word
+
+
+class WordTrigram(models.Model):
+    """Index inversé trigramme -> mot du vocabulaire"""
+    trigram = models.CharField(
+        max_length=3,
+        verbose_name='Trigramme'
+    )
+    word = models.ForeignKey(
+        CatalogWord,
+        on_delete=models.CASCADE,
+        related_name='trigrams',
+        verbose_name='Mot'
+    )
+
+    class Meta:
+        verbose_name = 'Trigramme'
+        verbose_name_plural = 'Trigrammes'
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'word'], name='library_wordtrigram_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram} -> {self.word}"
+
+
+class LibraryStats(models.Model):
+    """Compteurs agrégés de la bibliothèque (ligne unique, pk=1).
+
+    Tenus à jour de façon incrémentale par les signaux de `Book`, `Category`,
+    `Loan` et `Lecteur` (voir `library.stats`) ; la commande
+    `reconcile_library_stats` les recalcule de façon ensembliste.
+    """
+    total_books = models.IntegerField(default=0, verbose_name='Livres')
+    available_books = models.IntegerField(default=0, verbose_name='Livres disponibles')
+    unavailable_books = models.IntegerField(default=0, verbose_name='Livres indisponibles')
+    active_loans = models.IntegerField(default=0, verbose_name='Emprunts en cours')
+    overdue_loans = models.IntegerField(default=0, verbose_name='Emprunts en retard')
+    total_lecteurs = models.IntegerField(default=0, verbose_name='Lecteurs actifs')
+    total_lecteurs_total = models.IntegerField(default=0, verbose_name='Lecteurs')
+    categories_count = models.IntegerField(default=0, verbose_name='Catégories')
+    active_categories = models.IntegerField(default=0, verbose_name='Catégories actives')
+    reconciled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Dernier recalcul complet'
+    )
+
+    class Meta:
+        verbose_name = 'Statistiques de la bibliothèque'
+        verbose_name_plural = 'Statistiques de la bibliothèque'
+
+    def __str__(self):
+        return 'Statistiques de la bibliothèque'
+
+    def as_dict(self):
+        """Compteurs sous forme de dictionnaire (contexte du tableau de bord)"""
+        from .stats import COUNTER_FIELDS
+        return {name: getattr(self, name) for name in COUNTER_FIELDS}
@@ -0,0 +1,266 @@
+"""
+Pagination par curseur (keyset) pour les grandes listes.
+
+Le `Paginator` de Django exécute un `COUNT(*)` puis un `OFFSET` dont le coût
+croît avec la profondeur de la page. Ici, chaque page est obtenue par une
+condition « après la dernière ligne vue » sur les colonnes du tri, ce qui
+permet d'utiliser les index quel que soit le rang de la page, sans comptage.
+
+Le curseur transmis dans l'URL (`?cursor=...`) est un jeton opaque
+(JSON encodé en base64) contenant la direction et les valeurs de tri de la
+ligne frontière. Une valeur NULL y est conservée telle quelle : les colonnes
+nullables sont triées avec NULL après toutes les valeurs (NULLS LAST en ordre
+croissant, NULLS FIRST en ordre décroissant) et la condition de reprise en tient
+compte (`IS NULL` / `IS NOT NULL`).
+
+Usage dans une vue : `page_obj = paginate(request, queryset, 20, ['-loan_date', '-id'])`.
+Sans paramètre `cursor`, la première page reste numérotée (avec le total), mais
+ses liens « Suivante » et « Dernière » passent en mode curseur : les pages
+profondes ne coûtent jamais d'OFFSET.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+
+CURSOR_PARAM = 'cursor'
+
+# Valeur de tri illisible dans un jeton (distincte d'un NULL légitime)
+_INVALID = object()
+
+
+class _CursorEncoder(json.JSONEncoder):
+    """Encodeur JSON sans perte de précision (microsecondes comprises)"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        if isinstance(o, (decimal.Decimal, uuid.UUID)):
+            return str(o)
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    """Sérialise un curseur en jeton opaque"""
+    payload = json.dumps({'d': direction, 'v': values}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+# Jeton de la dernière page (parcours inverse depuis la fin, sans valeur frontière)
+LAST_CURSOR = encode_cursor('p', [])
+
+
+def cursor_query(query_params, cursor):
+    """Query string (filtres conservés) menant à la page du curseur donné"""
+    params = query_params.copy()
+    params.pop('page', None)
+    params[CURSOR_PARAM] = cursor
+    return params.urlencode()
+
+
+def link_numbered_page(page, query_params):
+    """Liens « Suivante » / « Dernière » d'une page numérotée, en mode curseur.
+
+    `page.next_cursor` (jeton après la dernière ligne de la page) doit être renseigné.
+    """
+    next_cursor = getattr(page, 'next_cursor', None)
+    page.next_cursor_query = cursor_query(query_params, next_cursor) if next_cursor else ''
+    page.last_cursor_query = cursor_query(query_params, LAST_CURSOR)
+    return page
+
+
+def decode_cursor(token):
+    """Retourne `(direction, valeurs)` ou None si le jeton est invalide"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        direction, values = data['d'], data['v']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage:
+    """Page obtenue par curseur ; expose une interface proche de `django.core.paginator.Page`"""
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, query_params):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _query_for(self, cursor):
+        return cursor_query(self._query_params, cursor)
+
+    @property
+    def next_query(self):
+        """Query string (filtres conservés) de la page suivante"""
+        return self._query_for(self.next_cursor) if self.next_cursor else ''
+
+    @property
+    def previous_query(self):
+        """Query string (filtres conservés) de la page précédente"""
+        return self._query_for(self.previous_cursor) if self.previous_cursor else ''
+
+    @property
+    def first_query(self):
+        """Query string de la première page en mode curseur"""
+        return self._query_for('')
+
+    @property
+    def last_query(self):
+        """Query string de la dernière page en mode curseur"""
+        return self._query_for(LAST_CURSOR)
+
+
+class CursorPaginator:
+    """Pagine un queryset sur un tri total (le dernier champ doit être unique, ex. `id`)"""
+
+    def __init__(self, queryset, per_page, ordering):
+        self.per_page = int(per_page)
+        self.keys = [(f[1:], True) if f.startswith('-') else (f, False) for f in ordering]
+        self.model = queryset.model
+        self.nullable = {name: self._is_nullable(name) for name, _ in self.keys}
+        self.queryset = queryset.order_by(*self._ordering(reverse=False))
+
+    def _is_nullable(self, name):
+        try:
+            return self.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False  # annotation ou chemin de relation
+
+    def _ordering(self, reverse):
+        """Tri SQL (NULL après toutes les valeurs), éventuellement inversé"""
+        terms = []
+        for name, descending in self.keys:
+            descending = descending != reverse
+            if not self.nullable[name]:
+                terms.append(f'-{name}' if descending else name)
+            elif descending:
+                terms.append(F(name).desc(nulls_first=True))
+            else:
+                terms.append(F(name).asc(nulls_last=True))
+        return terms
+
+    def _to_python(self, name, value):
+        """Reconvertit une valeur JSON dans le type du champ de modèle"""
+        if value is None:
+            return None
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value  # annotation (ex. score de pertinence)
+        if field.is_relation:
+            field = field.target_field
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            return _INVALID
+
+    def _beyond(self, name, value, greater):
+        """Condition « strictement au-delà de `value` » sur une colonne (NULL = plus grande valeur)"""
+        if value is None:
+            return None if greater else Q(**{f'{name}__isnull': False})
+        condition = Q(**{f'{name}__{"gt" if greater else "lt"}': value})
+        if greater and self.nullable[name]:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def _after(self, values, forward):
+        """Condition « strictement après `values` » dans le sens demandé"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            term = self._beyond(name, values[i], greater=descending != forward)
+            if term is None:
+                continue  # rien au-delà de NULL : seules les égalités comptent
+            for j in range(i):
+                previous, value = self.keys[j][0], values[j]
+                term &= Q(**{f'{previous}__isnull': True}) if value is None else Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def cursor_after(self, obj):
+        """Jeton de la page qui suit la ligne `obj`"""
+        return self._cursor_for('n', obj)
+
+    def _cursor_for(self, direction, obj):
+        return encode_cursor(direction, [getattr(obj, name) for name, _ in self.keys])
+
+    def _backward(self, queryset):
+        """Page terminée par la fin de `queryset` (parcours en sens inverse puis remise dans l'ordre)"""
+        rows = list(queryset.order_by(*self._ordering(reverse=True))[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = list(reversed(rows[:self.per_page]))
+        previous_cursor = self._cursor_for('p', rows[0]) if has_more and rows else None
+        return rows, previous_cursor
+
+    def get_page(self, token, query_params):
+        decoded = decode_cursor(token)
+        values = None
+        if decoded and decoded == ('p', []):
+            # Dernière page
+            rows, previous_cursor = self._backward(self.queryset)
+            return CursorPage(rows, None, previous_cursor, query_params)
+        if decoded and len(decoded[1]) == len(self.keys):
+            direction, raw = decoded
+            values = [self._to_python(name, v) for (name, _), v in zip(self.keys, raw)]
+            if any(v is _INVALID for v in values):
+                values = None
+
+        if values is None:
+            # Première page
+            rows = list(self.queryset[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = self._cursor_for('n', rows[-1]) if has_more else None
+            return CursorPage(rows, next_cursor, None, query_params)
+
+        if direction == 'n':
+            rows = list(self.queryset.filter(self._after(values, True))[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            next_cursor = self._cursor_for('n', rows[-1]) if has_more and rows else None
+            previous_cursor = self._cursor_for('p', rows[0]) if rows else None
+            return CursorPage(rows, next_cursor, previous_cursor, query_params)
+
+        rows, previous_cursor = self._backward(self.queryset.filter(self._after(values, False)))
+        next_cursor = self._cursor_for('n', rows[-1]) if rows else None
+        return CursorPage(rows, next_cursor, previous_cursor, query_params)
+
+
+def paginate(request, queryset, per_page, ordering):
+    """Pagination par curseur si la requête contient `?cursor=`, sinon page numérotée
+    dont les liens « Suivante » / « Dernière » mènent au mode curseur"""
+    paginator = CursorPaginator(queryset, per_page, ordering)
+    if CURSOR_PARAM in request.GET:
+        return paginator.get_page(request.GET.get(CURSOR_PARAM), request.GET)
+    page = Paginator(paginator.queryset, per_page).get_page(request.GET.get('page'))
+    page.object_list = list(page.object_list)
+    page.next_cursor = paginator.cursor_after(page.object_list[-1]) if page.has_next() else None
+    return link_numbered_page(page, request.GET)
@@ -0,0 +1,148 @@
+"""
+Moteur de recherche plein texte du catalogue.
+
+- SQLite : table virtuelle FTS5 `library_book_fts` (tokenizer unicode61 sans
+  accents), tenue à jour par les signaux `post_save` / `post_delete` de `Book`.
+- PostgreSQL : index GIN sur l'expression `to_tsvector('french', ...)` ; la base
+  maintient l'index elle-même, aucune synchronisation applicative n'est nécessaire.
+- Autres moteurs (ou SQLite compilé sans FTS5) : repli sur des filtres `icontains`.
+
+Point d'entrée : `search_books(queryset, term)` qui filtre et annote `search_rank`
+(plus la valeur est grande, plus le livre est pertinent).
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'library_book_fts'
+FTS_COLUMNS = ('title', 'author', 'isbn', 'publisher', 'description')
+
+# Poids BM25 par colonne (même ordre que FTS_COLUMNS)
+FTS_WEIGHTS = (10.0, 8.0, 5.0, 2.0, 1.0)
+
+# Expression indexée côté PostgreSQL : doit rester identique à celle de la migration
+# pour que le planificateur utilise l'index GIN.
+PG_VECTOR_SQL = (
+    "setweight(to_tsvector('french', coalesce({t}.title, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce({t}.author, '')), 'A') || "
+    "setweight(to_tsvector('french', coalesce({t}.isbn, '')), 'B') || "
+    "setweight(to_tsvector('french', coalesce({t}.publisher, '')), 'C') || "
+    "setweight(to_tsvector('french', coalesce({t}.description, '')), 'D')"
+)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_available = None
+
+
+def _sqlite_fts_available():
+    """Vérifie (une seule fois par processus) que la table FTS5 existe."""
+    global _fts_available
+    if _fts_available is None:
+        with connection.cursor() as cursor:
+            _fts_available = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_available
+
+
+def get_backend():
+    """Retourne le moteur utilisé : 'postgresql', 'sqlite' ou 'fallback'."""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite' and _sqlite_fts_available():
+        return 'sqlite'
+    return 'fallback'
+
+
+def _fts5_query(term):
+    """Construit une requête FTS5 sûre : chaque mot est cité et cherché en préfixe."""
+    words = _WORD_RE.findall(term)
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def _fallback_filter(queryset, term):
+    return queryset.filter(
+        Q(title__icontains=term) |
+        Q(author__icontains=term) |
+        Q(isbn__icontains=term) |
+        Q(publisher__icontains=term)
+    )
+
+
+def search_books(queryset, term):
+    """Filtre `queryset` (de `Book`) par `term`, trié par pertinence décroissante."""
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    backend = get_backend()
+    table = queryset.model._meta.db_table
+
+    if backend == 'sqlite':
+        match = _fts5_query(term)
+        if not match:
+            return _fallback_filter(queryset, term)
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        queryset = queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            # bm25() renvoie un score négatif (plus petit = meilleur) : on l'inverse
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+        return queryset.order_by('-search_rank', 'title')
+
+    if backend == 'postgresql':
+        vector = PG_VECTOR_SQL.format(t=f'"{table}"')
+        queryset = queryset.filter(
+            RawSQL(f"({vector}) @@ websearch_to_tsquery('french', %s)", [term], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({vector}, websearch_to_tsquery('french', %s))", [term], output_field=FloatField()
+            )
+        )
+        return queryset.order_by('-search_rank', 'title')
+
+    return _fallback_filter(queryset, term)
+
+
+def index_book(book):
+    """(Ré)indexe un livre dans la table FTS5 (no-op hors SQLite)."""
+    if get_backend() != 'sqlite':
+        return
+    values = [getattr(book, c) or '' for c in FTS_COLUMNS]
+    columns = ', '.join(FTS_COLUMNS)
+    placeholders = ', '.join(['%s'] * len(FTS_COLUMNS))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (%s, {placeholders})',
+            [book.pk] + values,
+        )
+
+
+def unindex_book(book_id):
+    """Retire un livre de la table FTS5 (no-op hors SQLite)."""
+    if get_backend() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book_id])
+
+
+def rebuild_index():
+    """Reconstruit entièrement l'index FTS5 à partir de `library_book`."""
+    if get_backend() != 'sqlite':
+        return 0
+    columns = ', '.join(FTS_COLUMNS)
+    selected = ', '.join(f"coalesce({c}, '')" for c in FTS_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {selected} FROM library_book'
+        )
+        return cursor.rowcount
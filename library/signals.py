@@ -0,0 +1,81 @@
+"""
+Signaux de l'application library : maintenance de l'index plein texte,
+du vocabulaire de la recherche approchée, de l'index d'autocomplétion en mémoire
+de la version du cache catalogue et des compteurs `LibraryStats`.
+"""
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+from .models import Book, Category
+from .cache import bump_catalog_version
+from . import autocomplete, fuzzy, search, stats
+from loans.models import Loan
+from members.models import Lecteur
+
+
+def _touches_index(update_fields):
+    return update_fields is None or bool(set(update_fields) & set(search.FTS_COLUMNS))
+
+
+@receiver(pre_save, sender=Book)
+def remember_book_words(sender, instance, update_fields=None, **kwargs):
+    """Mots enregistrés avant la modification (vocabulaire de la recherche approchée)"""
+    if instance._state.adding or instance.pk is None or not _touches_index(update_fields):
+        instance._fuzzy_old_words = frozenset()
+    else:
+        instance._fuzzy_old_words = fuzzy.stored_words(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, update_fields=None, **kwargs):
+    """Réindexer le livre, sauf si seuls des champs non indexés ont été modifiés"""
+    if not _touches_index(update_fields):
+        return
+    search.index_book(instance)
+    fuzzy.index_book(instance, getattr(instance, '_fuzzy_old_words', frozenset()))
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    """Retirer le livre supprimé de l'index et du vocabulaire"""
+    search.unindex_book(instance.pk)
+    fuzzy.unindex_book(instance)
+
+
+@receiver(post_save, sender=Book)
+def update_autocomplete_on_save(sender, instance, **kwargs):
+    """Mettre à jour l'index en mémoire une fois la transaction validée"""
+    transaction.on_commit(lambda: autocomplete.update_book(instance))
+
+
+@receiver(post_delete, sender=Book)
+def update_autocomplete_on_delete(sender, instance, **kwargs):
+    book_id = instance.pk
+    transaction.on_commit(lambda: autocomplete.remove_book(book_id))
+
+
+# Index d'autocomplétion construit dès la première requête de chaque processus
+request_started.connect(autocomplete.warm_index, dispatch_uid='autocomplete_warm_index')
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Toute écriture sur le catalogue invalide les entrées en cache (une fois la
+    transaction validée : sinon une lecture concurrente remettrait en cache les
+    anciennes lignes sous la nouvelle version)"""
+    transaction.on_commit(bump_catalog_version)
+
+
+# Compteurs du tableau de bord (LibraryStats)
+for _model in (Book, Loan, Lecteur):
+    pre_save.connect(stats.on_pre_save, sender=_model, dispatch_uid=f'stats_pre_save_{_model._meta.label}')
+    post_save.connect(stats.on_post_save, sender=_model, dispatch_uid=f'stats_save_{_model._meta.label}')
+    pre_delete.connect(stats.on_pre_delete, sender=_model, dispatch_uid=f'stats_pre_delete_{_model._meta.label}')
+    post_delete.connect(stats.on_post_delete, sender=_model, dispatch_uid=f'stats_delete_{_model._meta.label}')
+post_save.connect(stats.on_category_saved, sender=Category, dispatch_uid='stats_category_save')
+pre_delete.connect(stats.on_category_pre_delete, sender=Category, dispatch_uid='stats_category_pre_delete')
+post_delete.connect(stats.on_category_deleted, sender=Category, dispatch_uid='stats_category_delete')
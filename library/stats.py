@@ -0,0 +1,254 @@
+"""
+Maintenance incrémentale des compteurs `LibraryStats`.
+
+À l'enregistrement ou à la suppression d'un `Book`, `Loan` ou `Lecteur`, l'état
+enregistré en base est relu par clé primaire (`pre_save` / `pre_delete`, l'instance
+pouvant être périmée), puis la différence avec le nouvel état est appliquée en un
+seul `UPDATE ... SET compteur = compteur + delta` sur la ligne unique.
+
+`active_categories` (catégories ayant au moins un livre actif) s'appuie sur le
+nombre de livres actifs tenu par catégorie (`Category.active_books`) : un livre
+qui entre dans une catégorie ou en sort ne fait varier que ce nombre, et le
+compteur global ne change que lorsqu'il passe par zéro. Aucun `COUNT(DISTINCT)`
+sur les livres n'est exécuté à l'écriture.
+
+Les opérations en masse (`queryset.update()`, `bulk_create`...) ne déclenchent
+pas ces signaux : elles doivent appeler `apply_delta()` (ou
+`refresh_categories()` pour les catégories touchées) elles-mêmes, ou la
+commande `reconcile_library_stats` doit être lancée ensuite.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+COUNTER_FIELDS = (
+    'total_books', 'available_books', 'unavailable_books',
+    'active_loans', 'overdue_loans',
+    'total_lecteurs', 'total_lecteurs_total',
+    'categories_count', 'active_categories',
+)
+
+STATS_PK = 1
+
+
+def book_counters(values):
+    available = values['available_copies'] > 0
+    return {
+        'total_books': 1,
+        'available_books': int(available),
+        'unavailable_books': int(not available),
+    }
+
+
+def loan_counters(values):
+    """Un emprunt compte tant qu'il n'est pas rendu (`return_date` NULL, comme
+    `Loan.objects.open()`) ; EN_RETARD rendu désigne un retour tardif, hors compteurs."""
+    is_open = values['return_date'] is None and values['status'] in ('EN_COURS', 'EN_RETARD')
+    return {
+        'active_loans': int(is_open),
+        'overdue_loans': int(is_open and values['status'] == 'EN_RETARD'),
+    }
+
+
+def lecteur_counters(values):
+    return {
+        'total_lecteurs': int(values['statut'] == 'active'),
+        'total_lecteurs_total': 1,
+    }
+
+
+# modèle -> (champs suivis, fonction de comptage)
+TRACKED = {
+    'library.Book': (('available_copies', 'category_id', 'is_active'), book_counters),
+    'loans.Loan': (('status', 'return_date'), loan_counters),
+    'members.Lecteur': (('statut',), lecteur_counters),
+}
+
+
+def get_stats():
+    """Ligne de statistiques (créée et recalculée si absente)"""
+    from .models import LibraryStats
+    stats = LibraryStats.objects.filter(pk=STATS_PK).first()
+    if stats is None:
+        stats = reconcile()
+    return stats
+
+
+def apply_delta(**deltas):
+    """Applique des variations aux compteurs en un seul UPDATE"""
+    from .models import LibraryStats
+    changes = {name: F(name) + delta for name, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if not LibraryStats.objects.filter(pk=STATS_PK).update(**changes):
+        # Pas encore de ligne : la créer par un recalcul complet (inclut déjà la variation)
+        reconcile()
+
+
+def compute():
+    """Calcule tous les compteurs de façon ensembliste (quelques requêtes agrégées)"""
+    from django.db.models import Count, Q
+    from loans.models import Loan
+    from members.models import Lecteur
+    from .models import Book, Category
+
+    values = Book.objects.aggregate(
+        total_books=Count('id'),
+        available_books=Count('id', filter=Q(available_copies__gt=0)),
+        unavailable_books=Count('id', filter=Q(available_copies=0)),
+    )
+    values.update(Loan.objects.open().aggregate(
+        active_loans=Count('id'),
+        overdue_loans=Count('id', filter=Q(status='EN_RETARD')),
+    ))
+    values.update(Lecteur.objects.aggregate(
+        total_lecteurs=Count('id', filter=Q(statut='active')),
+        total_lecteurs_total=Count('id'),
+    ))
+    values['categories_count'] = Category.objects.count()
+    values['active_categories'] = _count_active_categories()
+    return values
+
+
+def _count_active_categories():
+    from .models import Book
+    return Book.objects.filter(is_active=True, category__isnull=False).values('category_id').distinct().count()
+
+
+def _recount_categories(categories):
+    """Recalcule `active_books` des catégories données (un UPDATE ensembliste)"""
+    from .models import Book
+    active_books = (
+        Book.objects.filter(category=OuterRef('pk'), is_active=True)
+        .order_by().values('category').annotate(n=Count('id')).values('n')
+    )
+    categories.update(active_books=Coalesce(Subquery(active_books), 0))
+
+
+def reconcile():
+    """Recalcule et enregistre la ligne de statistiques"""
+    from .models import Category, LibraryStats
+    with transaction.atomic():
+        _recount_categories(Category.objects.all())
+        values = compute()
+        values['reconciled_at'] = timezone.now()
+        stats, _ = LibraryStats.objects.update_or_create(pk=STATS_PK, defaults=values)
+    return stats
+
+
+def refresh_categories(category_ids):
+    """Recalcule les catégories touchées par une opération en masse sur les livres"""
+    from .models import Category
+    categories = Category.objects.filter(pk__in=[pk for pk in set(category_ids) if pk is not None])
+    before = categories.filter(active_books__gt=0).count()
+    _recount_categories(categories)
+    apply_delta(active_categories=categories.filter(active_books__gt=0).count() - before)
+
+
+def _shift_category(category_id, delta):
+    """Fait varier de `delta` (±1) le nombre de livres actifs d'une catégorie.
+
+    Retourne la variation de `active_categories` : ±1 si le nombre passe par
+    zéro, 0 sinon. Chaque cas est un UPDATE conditionnel (sans lecture).
+    """
+    from .models import Category
+    categories = Category.objects.filter(pk=category_id)
+    if delta > 0:
+        if categories.filter(active_books=0).update(active_books=1):
+            return 1
+        categories.update(active_books=F('active_books') + 1)
+        return 0
+    if categories.filter(active_books=1).update(active_books=0):
+        return -1
+    categories.filter(active_books__gt=0).update(active_books=F('active_books') - 1)
+    return 0
+
+
+def _category_delta(old, new):
+    """Variation de `active_categories` quand un livre change de catégorie active"""
+    old_category, new_category = _active_category(old), _active_category(new)
+    if old_category == new_category:
+        return 0
+    delta = 0
+    if old_category is not None:
+        delta += _shift_category(old_category, -1)
+    if new_category is not None:
+        delta += _shift_category(new_category, 1)
+    return delta
+
+
+def _values(instance, fields):
+    return {name: getattr(instance, name) for name in fields}
+
+
+def _delta(old, new, counters):
+    delta = {}
+    if new:
+        for name, value in counters(new).items():
+            delta[name] = delta.get(name, 0) + value
+    if old:
+        for name, value in counters(old).items():
+            delta[name] = delta.get(name, 0) - value
+    return delta
+
+
+def _active_category(values):
+    """Catégorie à laquelle un livre actif contribue (None sinon)"""
+    if not values or not values.get('category_id') or not values.get('is_active'):
+        return None
+    return values['category_id']
+
+
+def _stored_values(sender, instance):
+    """État actuellement enregistré en base (l'instance peut être périmée)"""
+    fields, _ = TRACKED[sender._meta.label]
+    return sender._base_manager.filter(pk=instance.pk).values(*fields).first()
+
+
+def on_pre_save(sender, instance, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        instance._stats_old = None
+    else:
+        instance._stats_old = _stored_values(sender, instance)
+
+
+def on_post_save(sender, instance, created, **kwargs):
+    fields, counters = TRACKED[sender._meta.label]
+    old = None if created else getattr(instance, '_stats_old', None)
+    new = _values(instance, fields)
+    delta = _delta(old, new, counters)
+    if sender._meta.label == 'library.Book':
+        delta['active_categories'] = _category_delta(old, new)
+    apply_delta(**delta)
+
+
+def on_pre_delete(sender, instance, **kwargs):
+    instance._stats_old = _stored_values(sender, instance)
+
+
+def on_post_delete(sender, instance, **kwargs):
+    _, counters = TRACKED[sender._meta.label]
+    old = getattr(instance, '_stats_old', None)
+    if old is None:
+        return
+    delta = _delta(old, None, counters)
+    if sender._meta.label == 'library.Book':
+        delta['active_categories'] = _category_delta(old, None)
+    apply_delta(**delta)
+
+
+def on_category_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_delta(categories_count=1)
+
+
+def on_category_pre_delete(sender, instance, **kwargs):
+    instance._stats_active_books = (
+        sender._base_manager.filter(pk=instance.pk).values_list('active_books', flat=True).first() or 0
+    )
+
+
+def on_category_deleted(sender, instance, **kwargs):
+    # Les livres passent sans catégorie (SET_NULL, sans signal) : la catégorie cesse d'être active
+    apply_delta(categories_count=-1, active_categories=-int(getattr(instance, '_stats_active_books', 0) > 0))
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from datetime import timedelta
 from library.models import Book, Category
@@ -128,6 +128,8 @@ class TemplateFilterTests(TestCase):
 
 class DashboardTests(TestCase):
     def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
         from accounts.models import CustomUser
         self.admin = CustomUser.objects.create_superuser(username='admin', email='a@a.com', password='pass')
 
@@ -145,3 +147,592 @@ class DashboardTests(TestCase):
         self.assertIn('total_lecteurs_total', resp.context)
         self.assertEqual(resp.context['total_lecteurs'], 1)
         self.assertEqual(resp.context['total_lecteurs_total'], 2)
+
+
+class BookSearchTests(TestCase):
+    """Tests pour la recherche plein texte du catalogue"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='searcher', password='pass')
+        self.hobbit = Book.objects.create(title='Le Hobbit', author='J.R.R. Tolkien', isbn='9782267011258',
+                                          publisher='Bourgois', description='Un voyage inattendu')
+        self.fondation = Book.objects.create(title='Fondation', author='Isaac Asimov', isbn='9782070360536',
+                                             description='Le déclin de l\'Empire galactique, avec un hobbit égaré')
+
+    def test_search_matches_title_and_ranks_it_first(self):
+        from library.search import search_books
+        results = list(search_books(Book.objects.all(), 'hobbit'))
+        self.assertEqual(results, [self.hobbit, self.fondation])
+
+    def test_search_ignores_accents_and_prefixes(self):
+        from library.search import search_books
+        results = list(search_books(Book.objects.all(), 'declin gala'))
+        self.assertEqual(results, [self.fondation])
+
+    def test_index_follows_updates_and_deletes(self):
+        from library.search import search_books
+        self.hobbit.title = 'Bilbo le Hobbit'
+        self.hobbit.save()
+        self.assertEqual(list(search_books(Book.objects.all(), 'bilbo')), [self.hobbit])
+        self.hobbit.delete()
+        self.assertFalse(search_books(Book.objects.all(), 'bilbo').exists())
+
+    def test_book_list_uses_search(self):
+        from django.urls import reverse
+        self.client.login(username='searcher', password='pass')
+        resp = self.client.get(reverse('library:book_list'), {'search': 'asimov'})
+        self.assertEqual(list(resp.context['books']), [self.fondation])
+        self.assertEqual(resp.context['total_books'], 1)
+
+
+class FuzzySearchTests(TestCase):
+    """Tests pour la recherche approchée par trigrammes"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='fuzzy', password='pass')
+        self.hobbit = Book.objects.create(title='Le Hobbit', author='J.R.R. Tolkien', isbn='9782267011258')
+        self.fondation = Book.objects.create(title='Fondation', author='Isaac Asimov', isbn='9782070360536')
+
+    def test_vocabulary_is_built_on_save(self):
+        from library.models import CatalogWord
+        words = set(CatalogWord.objects.values_list('word', flat=True))
+        self.assertTrue({'hobbit', 'tolkien', 'fondation', 'asimov'} <= words)
+
+    def test_similar_words_ranks_near_matches(self):
+        from library.fuzzy import similar_words
+        self.assertEqual(similar_words('Tolkein')[0][0], 'tolkien')
+        self.assertEqual(similar_words('Asimof')[0][0], 'asimov')
+        self.assertEqual(similar_words('zzzz'), [])
+
+    def test_short_word_not_crowded_out_by_long_words(self):
+        from library import fuzzy
+        # Mots longs partageant plus de trigrammes avec « chats » que « chat »,
+        # mais bien moins similaires (Jaccard)
+        fuzzy.add_words({'chat'} | {f'chats{a}{b}elephantesque' for a in 'abcde' for b in 'fghij'})
+        self.assertEqual(fuzzy.similar_words('chats')[0][0], 'chat')
+
+    def test_correct_query(self):
+        from library.fuzzy import correct_query
+        self.assertEqual(correct_query('hobit tolkein'), 'hobbit tolkien')
+        self.assertIsNone(correct_query('Tolkien'))
+
+    def test_publisher_and_description_words_are_not_corrected(self):
+        from library.fuzzy import correct_query
+        Book.objects.create(
+            title='Dune', author='Frank Herbert', isbn='9782266320481',
+            publisher='Pocket', description='Arrakis, planète des sables',
+        )
+        self.assertIsNone(correct_query('pocket'))
+        self.assertIsNone(correct_query('arrakis'))
+
+    def test_vocabulary_follows_updates_and_deletes(self):
+        from library.models import CatalogWord
+        Book.objects.create(title='Le Hobbit annoté', author='J.R.R. Tolkien', isbn='9782267027006')
+        self.assertEqual(CatalogWord.objects.get(word='tolkien').book_count, 2)
+
+        self.fondation.title = 'Fondation et Empire'
+        self.fondation.save()
+        self.fondation.delete()
+        self.hobbit.delete()
+        words = set(CatalogWord.objects.values_list('word', flat=True))
+        self.assertNotIn('fondation', words)
+        self.assertNotIn('empire', words)
+        self.assertNotIn('asimov', words)
+        self.assertIn('tolkien', words)
+        self.assertEqual(CatalogWord.objects.get(word='tolkien').book_count, 1)
+
+    def test_book_list_fuzzy_mode_and_suggestion(self):
+        from django.urls import reverse
+        self.client.login(username='fuzzy', password='pass')
+        resp = self.client.get(reverse('library:book_list'), {'search': 'Asimof', 'fuzzy': 'on'})
+        self.assertEqual(list(resp.context['books']), [self.fondation])
+        self.assertEqual(resp.context['corrected_search'], 'asimov')
+
+        resp = self.client.get(reverse('library:book_list'), {'search': 'Tolkein'})
+        self.assertEqual(list(resp.context['books']), [])
+        self.assertEqual(resp.context['suggestion'], 'tolkien')
+        self.assertContains(resp, 'Vouliez-vous dire')
+
+    def test_fuzzy_false_and_on_are_cached_separately(self):
+        from django.core.cache import cache
+        from django.urls import reverse
+        cache.clear()
+        self.client.login(username='fuzzy', password='pass')
+        # « false » se lit False dans le formulaire : page en cache distincte de « on »
+        resp = self.client.get(reverse('library:book_list'), {'search': 'Asimof', 'fuzzy': 'false'})
+        self.assertEqual(list(resp.context['books']), [])
+        resp = self.client.get(reverse('library:book_list'), {'search': 'Asimof', 'fuzzy': 'on'})
+        self.assertEqual(list(resp.context['books']), [self.fondation])
+        resp = self.client.get(reverse('library:book_list'), {'search': 'Asimof', 'fuzzy': '0'})
+        self.assertEqual(list(resp.context['books']), [])
+
+
+class IsbnNormalizationTests(TestCase):
+    """Tests pour la normalisation des ISBN et la recherche par code-barres"""
+
+    def test_normalize_isbn(self):
+        from library.isbn import normalize_isbn
+        self.assertEqual(normalize_isbn('978-2-07-036053-6'), '9782070360536')
+        self.assertEqual(normalize_isbn('2-07-036053-X'), None)
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('ISBN 080442957X'), '9780804429573')
+        self.assertEqual(normalize_isbn('ISBN-13: 978-2-07-036053-6'), '9782070360536')
+        self.assertEqual(normalize_isbn('ISBN 13 9782070360536'), '9782070360536')
+        self.assertEqual(normalize_isbn('isbn-10: 0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('ISBN:0306406152'), '9780306406157')
+        self.assertIsNone(normalize_isbn('9782070360537'))
+        self.assertIsNone(normalize_isbn('1234567890'))
+        self.assertIsNone(normalize_isbn('Tolkien'))
+
+    def test_isbn13_synced_on_save(self):
+        book = Book.objects.create(title='Fondation', author='Isaac Asimov', isbn='0-306-40615-2')
+        self.assertEqual(book.isbn13, '9780306406157')
+        book.isbn = '978-2-07-036053-6'
+        book.save(update_fields=['isbn'])
+        book.refresh_from_db()
+        self.assertEqual(book.isbn13, '9782070360536')
+
+    def test_book_list_isbn_fast_path(self):
+        from django.urls import reverse
+        CustomUser.objects.create_user(username='counter', password='pass')
+        book = Book.objects.create(title='Fondation', author='Isaac Asimov', isbn='978-2-07-036053-6')
+        Book.objects.create(title='Autre', author='X', isbn='9780306406157')
+        self.client.login(username='counter', password='pass')
+        resp = self.client.get(reverse('library:book_list'), {'search': '9782070360536'})
+        self.assertEqual(list(resp.context['books']), [book])
+
+    def test_backfill_command(self):
+        from django.core.management import call_command
+        from io import StringIO
+        book = Book.objects.create(title='Fondation', author='Isaac Asimov', isbn='0-306-40615-2')
+        Book.objects.filter(pk=book.pk).update(isbn13=None)
+        out = StringIO()
+        call_command('backfill_isbn13', batch_size=1, stdout=out)
+        book.refresh_from_db()
+        self.assertEqual(book.isbn13, '9780306406157')
+        self.assertIn('1 mis à jour', out.getvalue())
+
+
+class CursorPaginationTests(TestCase):
+    """Tests pour la pagination par curseur (keyset)"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='pager', password='pass')
+        for i in range(30):
+            # Titres en double pour vérifier le départage par id
+            Book.objects.create(title=f'Livre {i // 2:02d}', author='Auteur', isbn=f'PAGE{i:03d}')
+
+    def test_walk_forward_and_backward(self):
+        from django.test import RequestFactory
+        from library.pagination import paginate
+        expected = list(Book.objects.order_by('title', 'id'))
+        factory = RequestFactory()
+
+        seen = []
+        pages = []
+        query = 'cursor='
+        while True:
+            page = paginate(factory.get(f'/?{query}'), Book.objects.all(), 12, ['title', 'id'])
+            pages.append(page)
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            query = page.next_query
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [12, 12, 6])
+
+        back = paginate(factory.get(f'/?{pages[2].previous_query}'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertEqual(list(back.object_list), expected[12:24])
+        first = paginate(factory.get(f'/?{back.previous_query}'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertEqual(list(first.object_list), expected[:12])
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        from django.test import RequestFactory
+        from library.pagination import paginate
+        page = paginate(RequestFactory().get('/?cursor=not-a-token'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertEqual(list(page.object_list), list(Book.objects.order_by('title', 'id')[:12]))
+
+    def test_nullable_sort_key_walks_both_ways(self):
+        import datetime
+        from django.test import RequestFactory
+        from library.pagination import paginate
+        # Un livre sur trois sans date de publication (NULL)
+        for i, book in enumerate(Book.objects.order_by('id')):
+            book.publication_date = None if i % 3 == 0 else datetime.date(2000 + i % 4, 1, 1)
+            book.save(update_fields=['publication_date'])
+        factory = RequestFactory()
+        for ordering in (['publication_date', 'id'], ['-publication_date', '-id']):
+            seen, pages, query = [], [], 'cursor='
+            while True:
+                page = paginate(factory.get(f'/?{query}'), Book.objects.all(), 7, ordering)
+                pages.append(page)
+                seen.extend(page.object_list)
+                if not page.has_next():
+                    break
+                query = page.next_query
+            self.assertEqual(len(seen), 30)
+            self.assertEqual(len(set(b.pk for b in seen)), 30)
+            back = paginate(factory.get(f'/?{pages[-1].previous_query}'), Book.objects.all(), 7, ordering)
+            self.assertEqual(list(back.object_list), pages[-2].object_list)
+
+    def test_numbered_page_links_into_cursor_mode(self):
+        from django.test import RequestFactory
+        from library.pagination import paginate
+        expected = list(Book.objects.order_by('title', 'id'))
+        factory = RequestFactory()
+        first = paginate(factory.get('/?search=x'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertIn('search=x', first.next_cursor_query)
+        second = paginate(factory.get(f'/?{first.next_cursor_query}'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertEqual(list(second.object_list), expected[12:24])
+
+        last = paginate(factory.get(f'/?{first.last_cursor_query}'), Book.objects.all(), 12, ['title', 'id'])
+        # Dernière page en mode curseur : les 12 dernières lignes
+        self.assertEqual(list(last.object_list), expected[-12:])
+        self.assertFalse(last.has_next())
+        before = paginate(factory.get(f'/?{last.previous_query}'), Book.objects.all(), 12, ['title', 'id'])
+        self.assertEqual(list(before.object_list), expected[6:18])
+
+    def test_book_list_cursor_mode_skips_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        self.client.login(username='pager', password='pass')
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('library:book_list'), {'cursor': ''})
+        self.assertEqual(len(resp.context['books']), 12)
+        self.assertIsNone(resp.context['total_books'])
+        # Requêtes de la liste (hors agrégat groupé des facettes) : aucun comptage
+        list_queries = [
+            q['sql'] for q in ctx.captured_queries
+            if 'FROM "library_book"' in q['sql'] and 'GROUP BY' not in q['sql']
+        ]
+        self.assertTrue(list_queries)
+        self.assertFalse(any('COUNT(' in sql for sql in list_queries))
+        self.assertContains(resp, 'Suivante')
+
+
+class FacetTests(TestCase):
+    """Tests pour les facettes du catalogue"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='facets', password='pass')
+        self.roman = Category.objects.create(name='Roman')
+        self.sf = Category.objects.create(name='SF')
+        Book.objects.create(title='A', author='X', isbn='F1', category=self.roman, language='Français')
+        Book.objects.create(title='B', author='X', isbn='F2', category=self.roman, language='Anglais', available_copies=0)
+        Book.objects.create(title='C', author='X', isbn='F3', category=self.sf, language='Français')
+
+    def _facets(self, **params):
+        from django.urls import reverse
+        self.client.login(username='facets', password='pass')
+        return self.client.get(reverse('library:book_list'), params).context['facets']
+
+    def test_counts_exclude_own_filter(self):
+        facets = self._facets(category=self.roman.pk)
+        self.assertEqual({f['name']: f['count'] for f in facets['categories']}, {'Roman': 2, 'SF': 1})
+        self.assertEqual({f['value']: f['count'] for f in facets['languages']}, {'Français': 1, 'Anglais': 1})
+        self.assertEqual({f['value']: f['count'] for f in facets['availability']}, {'available': 1, 'unavailable': 1})
+
+    def test_facets_use_one_cached_query_and_are_invalidated(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from library.facets import get_facet_rows
+        with CaptureQueriesContext(connection) as ctx:
+            rows = get_facet_rows(Book.objects.all(), {'search': ''})
+            get_facet_rows(Book.objects.all(), {'search': ''})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(sum(r[3] for r in rows), 3)
+
+        from library.cache import get_catalog_version
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='D', author='X', isbn='F4', category=self.sf)
+            # La version n'avance qu'à la validation de la transaction
+            self.assertEqual(get_catalog_version(), version)
+        rows = get_facet_rows(Book.objects.all(), {'search': ''})
+        self.assertEqual(sum(r[3] for r in rows), 4)
+
+
+class AutocompleteTests(TestCase):
+    """Tests pour l'autocomplétion par index de préfixes en mémoire"""
+
+    def setUp(self):
+        from library import autocomplete
+        autocomplete.reset_index()
+        self.user = CustomUser.objects.create_user(username='typer', password='pass')
+        self.book = Book.objects.create(title='Le Seigneur des Anneaux', author='J.R.R. Tolkien', isbn='AC1')
+        Book.objects.create(title='Les Misérables', author='Victor Hugo', isbn='AC2')
+
+    def test_lookup_by_title_word_author_and_accents(self):
+        from library.autocomplete import get_index
+        index = get_index()
+        self.assertEqual([r['label'] for r in index.lookup('anne')], ['Le Seigneur des Anneaux'])
+        self.assertEqual([r['label'] for r in index.lookup('les mise')], ['Les Misérables'])
+        self.assertEqual([r['label'] for r in index.lookup('hug')], ['Victor Hugo'])
+        self.assertEqual(index.lookup(''), [])
+
+    def test_endpoint_and_index_follow_signals(self):
+        from django.urls import reverse
+        from library.autocomplete import get_index
+        get_index()
+        self.client.login(username='typer', password='pass')
+        url = reverse('library:book_autocomplete')
+        resp = self.client.get(url, {'q': 'tolk'})
+        self.assertEqual(resp.json()['results'][0]['label'], 'J.R.R. Tolkien')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Bilbo le Hobbit'
+            self.book.save()
+        self.assertEqual([r['label'] for r in get_index().lookup('bilbo')], ['Bilbo le Hobbit'])
+        self.assertEqual(get_index().lookup('anneaux'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        self.assertEqual(get_index().lookup('bilbo'), [])
+
+    def test_index_is_warmed_by_first_request(self):
+        from django.urls import reverse
+        from library import autocomplete
+        self.client.login(username='typer', password='pass')
+        self.client.get(reverse('library:book_list'))
+        self.assertIsNotNone(autocomplete._index)
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.get_index().stats()['books'], 2)
+
+    def test_index_rebuilt_after_write_from_another_process(self):
+        from library.autocomplete import get_index
+        from library.cache import bump_catalog_version
+        get_index()
+        # Écriture sans signaux dans ce processus, comme celle d'un autre worker
+        Book.objects.bulk_create([Book(title='Notre-Dame de Paris', author='Victor Hugo', isbn='AC3')])
+        self.assertEqual(get_index().lookup('notre'), [])
+        bump_catalog_version()
+        self.assertEqual([r['label'] for r in get_index().lookup('notre')], ['Notre-Dame de Paris'])
+
+    def test_stats_reports_memory(self):
+        from library.autocomplete import get_index
+        stats = get_index().stats()
+        self.assertEqual(stats['books'], 2)
+        self.assertGreater(stats['entries'], 2)
+        self.assertGreater(stats['memory_bytes'], 0)
+
+
+class BookListCacheTests(TestCase):
+    """Tests pour le cache versionné des pages de résultats"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='cached', password='pass')
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', isbn='CACHE1', total_copies=1, available_copies=1)
+
+    def _catalog_queries(self, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse('library:book_list'), params)
+        return resp, [q for q in ctx.captured_queries if 'library_book' in q['sql']]
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.client.login(username='cached', password='pass')
+        resp, queries = self._catalog_queries({'search': 'dune'})
+        self.assertTrue(queries)
+        resp, queries = self._catalog_queries({'search': '  DUNE '})
+        self.assertEqual(queries, [])
+        self.assertEqual(list(resp.context['books']), [self.book])
+        self.assertEqual(resp.context['total_books'], 1)
+
+    def test_cached_page_links_follow_each_request(self):
+        self.client.login(username='cached', password='pass')
+        for i in range(13):
+            Book.objects.create(title=f'Dune {i:02d}', author='Frank Herbert', isbn=f'CACHE-LINK{i}')
+        self._catalog_queries({'search': 'dune', 'ref': 'first'})
+        resp, queries = self._catalog_queries({'ref': 'second', 'search': 'DUNE'})
+        self.assertEqual(queries, [])
+        self.assertIn('ref=second', resp.context['page_obj'].next_cursor_query)
+        facet_queries = [entry['query'] for entry in resp.context['facets']['availability']]
+        self.assertTrue(all('ref=second' in query and 'ref=first' not in query for query in facet_queries))
+
+        self._catalog_queries({'search': 'dune', 'cursor': '', 'ref': 'first'})
+        resp, queries = self._catalog_queries({'cursor': '', 'search': 'dune', 'ref': 'second'})
+        self.assertEqual(queries, [])
+        self.assertIn('ref=second', resp.context['page_obj'].next_query)
+        self.assertNotIn('ref=first', resp.context['page_obj'].next_query)
+
+    def test_borrow_invalidates_cached_pages(self):
+        self.client.login(username='cached', password='pass')
+        resp, _ = self._catalog_queries({'availability': 'available'})
+        self.assertEqual(resp.context['total_books'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.borrow_book()
+        resp, queries = self._catalog_queries({'availability': 'available'})
+        self.assertTrue(queries)
+        self.assertEqual(resp.context['total_books'], 0)
+
+
+class LibraryStatsTests(TestCase):
+    """Tests pour les compteurs matérialisés du tableau de bord"""
+
+    def assertStatsConsistent(self):
+        from library import stats
+        self.assertEqual(stats.get_stats().as_dict(), stats.compute())
+
+    def test_counters_follow_books_loans_and_readers(self):
+        from library import stats
+        stats.reconcile()
+        cat = Category.objects.create(name='Stats')
+        book = Book.objects.create(title='S', author='A', isbn='ST1', category=cat, total_copies=1, available_copies=1)
+        lecteur = Lecteur.objects.create(first_name='S', last_name='T', email='st@example.com', numero_abonnement='ST1')
+        self.assertStatsConsistent()
+
+        loan = Loan.objects.create(book=book, member=lecteur)
+        book.borrow_book()
+        self.assertStatsConsistent()
+        self.assertEqual(stats.get_stats().active_loans, 1)
+        self.assertEqual(stats.get_stats().unavailable_books, 1)
+
+        loan = Loan.objects.get(pk=loan.pk)
+        loan.return_loan()
+        lecteur.statut = 'suspended'
+        lecteur.save()
+        self.assertStatsConsistent()
+
+        # Instance périmée (le retour est passé par loan.book) : l'état en base fait foi
+        book.is_active = False
+        book.save()
+        self.assertEqual(stats.get_stats().active_categories, 0)
+        lecteur.delete()
+        cat.delete()
+        self.assertStatsConsistent()
+
+    def test_active_categories_follow_per_category_counts(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from library import stats
+        stats.reconcile()
+        roman, sf = Category.objects.create(name='Roman'), Category.objects.create(name='SF')
+        with CaptureQueriesContext(connection) as ctx:
+            books = [
+                Book.objects.create(title=f'R{i}', author='A', isbn=f'CAT{i}', category=roman)
+                for i in range(3)
+            ]
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(stats.get_stats().active_categories, 1)
+        self.assertEqual(Category.objects.get(pk=roman.pk).active_books, 3)
+
+        books[0].category = sf
+        books[0].save()
+        self.assertEqual(stats.get_stats().active_categories, 2)
+        books[0].is_active = False
+        books[0].save()
+        self.assertEqual(stats.get_stats().active_categories, 1)
+        # Instance périmée de la catégorie : le compteur tenu en base n'est pas écrasé
+        roman.name = 'Romans'
+        roman.save()
+        self.assertEqual(Category.objects.get(pk=roman.pk).active_books, 2)
+        self.assertStatsConsistent()
+
+        books[1].delete()
+        books[2].delete()
+        self.assertEqual(stats.get_stats().active_categories, 0)
+        self.assertStatsConsistent()
+
+    def test_bulk_activation_refreshes_touched_categories(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        from unittest import mock
+        from library import stats
+        stats.reconcile()
+        cat = Category.objects.create(name='Bulk')
+        for i in range(2):
+            Book.objects.create(title=f'B{i}', author='A', isbn=f'BULK{i}', category=cat)
+        admin = site._registry[Book]
+        request = RequestFactory().get('/')
+        with mock.patch.object(admin, 'message_user'):
+            admin.mark_as_inactive(request, Book.objects.filter(category=cat))
+            self.assertEqual(stats.get_stats().active_categories, 0)
+            self.assertStatsConsistent()
+            admin.mark_as_active(request, Book.objects.filter(category=cat))
+        self.assertEqual(stats.get_stats().active_categories, 1)
+        self.assertEqual(Category.objects.get(pk=cat.pk).active_books, 2)
+        self.assertStatsConsistent()
+
+    def test_dashboard_reads_single_row(self):
+        from django.core.cache import cache
+        from django.urls import reverse
+        from library import stats
+        cache.clear()
+        admin = CustomUser.objects.create_superuser(username='statsadmin', email='s@a.com', password='pass')
+        Book.objects.create(title='S', author='A', isbn='ST2')
+        stats.get_stats()
+        self.client.login(username='statsadmin', password='pass')
+        resp = self.client.get(reverse('library:dashboard'))
+        self.assertEqual(resp.context['total_books'], 1)
+        self.assertEqual(resp.context['active_categories'], 0)
+
+    def test_reconcile_command_fixes_drift(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from library import stats
+        from library.models import LibraryStats
+        Book.objects.create(title='S', author='A', isbn='ST3')
+        stats.reconcile()
+        LibraryStats.objects.update(total_books=42)
+        out = StringIO()
+        call_command('reconcile_library_stats', stdout=out)
+        self.assertIn('total_books: 42 -> 1', out.getvalue())
+        self.assertStatsConsistent()
+
+
+@override_settings(LIBRARY_CACHE_BACKGROUND_REFRESH=False)
+class StaleWhileRevalidateTests(TestCase):
+    """Tests pour le cache stale-while-revalidate du tableau de bord"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_hit_miss_stale_and_single_recompute(self):
+        from django.core.cache import cache
+        from library.cache import get_or_refresh, swr_counters
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(get_or_refresh('swr-test', compute, fresh_for=30), 1)
+        self.assertEqual(get_or_refresh('swr-test', compute, fresh_for=30), 1)
+        # Périmée : la valeur en cache est servie, un seul recalcul est lancé
+        cache.set('swr-test', (1, 0), 60)
+        self.assertEqual(get_or_refresh('swr-test', compute, fresh_for=30), 1)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(get_or_refresh('swr-test', compute, fresh_for=30), 2)
+        self.assertEqual(swr_counters(), {'hit': 2, 'miss': 1, 'stale': 1})
+
+    def test_concurrent_miss_waits_for_lock_holder(self):
+        from django.core.cache import cache
+        from library import cache as library_cache
+        cache.add('swr-wait:lock', 1, 30)
+
+        def fill_then_sleep(_):
+            cache.set('swr-wait', ('computed elsewhere', 10 ** 12), 30)
+
+        from unittest import mock
+        with mock.patch('library.cache.time.sleep', side_effect=fill_then_sleep):
+            value = library_cache.get_or_refresh('swr-wait', lambda: 'recomputed')
+        self.assertEqual(value, 'computed elsewhere')
+
+    def test_dashboard_cache_stats_endpoint(self):
+        from django.urls import reverse
+        CustomUser.objects.create_superuser(username='swradmin', email='s@a.com', password='pass')
+        self.client.login(username='swradmin', password='pass')
+        self.client.get(reverse('library:dashboard'))
+        self.client.get(reverse('library:dashboard'))
+        data = self.client.get(reverse('library:dashboard_cache_stats')).json()
+        self.assertEqual(data['miss'], 2)
+        self.assertEqual(data['hit'], 2)
@@ -5,7 +5,10 @@ app_name = 'library'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('dashboard/cache-stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
     path('books/', views.book_list, name='book_list'),
+    path('books/autocomplete/', views.book_autocomplete, name='book_autocomplete'),
+    path('books/autocomplete/stats/', views.book_autocomplete_stats, name='book_autocomplete_stats'),
     path('books/<int:pk>/', views.book_detail, name='book_detail'),
     path('books/create/', views.BookCreateView.as_view(), name='book_create'),
     path('books/<int:pk>/update/', views.BookUpdateView.as_view(), name='book_update'),
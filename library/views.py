@@ -1,13 +1,22 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.http import JsonResponse
+from django.urls import reverse, reverse_lazy
 from .models import Book, Category
 from .forms import BookForm, CategoryForm, BookSearchForm
+from .search import search_books
+from .fuzzy import correct_query
+from .isbn import normalize_isbn
+from .pagination import CursorPage, link_numbered_page, paginate
+from .facets import build_facets, get_facet_rows
+from .autocomplete import get_index as get_autocomplete_index
+from .cache import CATALOG_CACHE_TIMEOUT, catalog_key, get_or_refresh, swr_counters
+from .stats import get_stats
 from loans.models import Loan
 
 
@@ -31,77 +40,213 @@ class IsAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
         return redirect('library:book_list')
 
 
+DASHBOARD_COUNTERS_KEY = 'library:dashboard:counters'
+DASHBOARD_RECENT_LOANS_KEY = 'library:dashboard:recent_loans'
+
+
+def _recent_loans():
+    return list(Loan.objects.select_related('book', 'member')[:10])
+
+
 @login_required
 def dashboard(request):
-    """Tableau de bord principal"""
+    """Tableau de bord principal (compteurs lus dans la ligne `LibraryStats`)"""
+    counters = get_or_refresh(DASHBOARD_COUNTERS_KEY, lambda: get_stats().as_dict(), fresh_for=10)
     context = {
-        'total_books': Book.objects.count(),
-        'available_books': Book.objects.filter(available_copies__gt=0).count(),
-        'unavailable_books': Book.objects.filter(available_copies=0).count(),
-        'active_loans': Loan.objects.filter(status='EN_COURS').count(),
-        'overdue_loans': Loan.objects.filter(status='EN_RETARD').count(),
+        'total_books': counters['total_books'],
+        'available_books': counters['available_books'],
+        'unavailable_books': counters['unavailable_books'],
+        'active_loans': counters['active_loans'],
+        'overdue_loans': counters['overdue_loans'],
     }
     
     if is_admin(request.user):
         # Dashboard admin (accessible uniquement au bibliothécaire)
-        from members.models import Lecteur
         context.update({
-            'total_lecteurs': Lecteur.objects.filter(statut='active').count(),
-            'total_lecteurs_total': Lecteur.objects.count(),
-            'recent_loans': Loan.objects.select_related('book', 'member')[:10],
-            'categories_count': Category.objects.count(),
-            'active_categories': Category.objects.filter(books__is_active=True).distinct().count(),
+            'total_lecteurs': counters['total_lecteurs'],
+            'total_lecteurs_total': counters['total_lecteurs_total'],
+            'recent_loans': get_or_refresh(DASHBOARD_RECENT_LOANS_KEY, _recent_loans, fresh_for=30),
+            'categories_count': counters['categories_count'],
+            'active_categories': counters['active_categories'],
         })
         return render(request, 'library/admin_dashboard.html', context)
     else:
         # Pas de dashboard administrateur pour le lecteur, on affiche son espace de lecture
-        user_loans = request.user.lecteur.loans.filter(status='EN_COURS') if hasattr(request.user, 'lecteur') else Loan.objects.none()
+        user_loans = request.user.lecteur.loans.open() if hasattr(request.user, 'lecteur') else Loan.objects.none()
         context['user_loans'] = user_loans
         return render(request, 'library/reader_dashboard.html', context)
 
 
-@login_required
-def book_list(request):
-    """Liste des livres avec recherche et filtrage"""
+BOOK_LIST_PAGE_SIZE = 12
+
+
+def _book_list_cache_params(request, form):
+    """Paramètres normalisés de la recherche (clé du cache des pages de résultats)"""
+    params = request.GET
+    return {
+        'search': ' '.join(params.get('search', '').lower().split()),
+        'category': params.get('category', ''),
+        'availability': params.get('availability', ''),
+        'language': params.get('language', '').strip(),
+        # Même lecture que le formulaire : « false », « 0 »... valent False
+        'fuzzy': form.fields['fuzzy'].to_python(params.get('fuzzy')),
+        'page': params.get('page', ''),
+        'cursor': params.get('cursor'),
+        'bound': bool(params),
+    }
+
+
+def _search_catalog(request, form):
+    """Exécute la recherche du catalogue et retourne des résultats sérialisables (cache).
+
+    Seules des données sont retournées (livres, totaux, jetons de curseur, lignes
+    de facettes) : les liens, qui dépendent de la query string exacte de chaque
+    requête, sont construits par `book_list` à chaque affichage.
+    """
     books = Book.objects.filter(is_active=True)
-    
-    form = BookSearchForm(request.GET or None)
+    search = ''
+    isbn = None
+    suggestion = None
+    corrected_search = None
     
     if form.is_valid():
         search = form.cleaned_data.get('search')
         category = form.cleaned_data.get('category')
         availability = form.cleaned_data.get('availability')
+        language = form.cleaned_data.get('language', '').strip()
         
-        if search:
-            books = books.filter(
-                Q(title__icontains=search) |
-                Q(author__icontains=search) |
-                Q(isbn__icontains=search)
-            )
+        isbn = normalize_isbn(search)
+        if isbn:
+            # Code-barres / ISBN : simple lecture de l'index isbn13
+            books = books.filter(isbn13=isbn)
+        elif search:
+            if form.cleaned_data.get('fuzzy'):
+                # Recherche approchée : corriger les mots inconnus du vocabulaire
+                corrected_search = correct_query(search)
+            # Recherche plein texte (FTS5 / tsvector) triée par pertinence
+            books = search_books(books, corrected_search or search)
+
+        # Facettes : une requête groupée (en cache) sur le résultat de la recherche
+        search_key = {'isbn': isbn} if isbn else {'search': ' '.join((corrected_search or search or '').lower().split())}
+        facet_rows = get_facet_rows(books, search_key)
+        facet_filters = {'category': category, 'language': language, 'availability': availability}
         
         if category:
             books = books.filter(category=category)
+
+        if language:
+            books = books.filter(language=language)
         
         if availability == 'available':
             books = books.filter(available_copies__gt=0)
         elif availability == 'unavailable':
             books = books.filter(available_copies=0)
+    else:
+        facet_rows = get_facet_rows(books, {'search': ''})
+        facet_filters = {}
     
-    # Pagination
-    paginator = Paginator(books, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (classique ou par curseur avec ?cursor=)
+    if 'search_rank' in books.query.annotations:
+        ordering = ['-search_rank', 'title', 'id']
+    else:
+        ordering = ['title', 'id']
+    page_obj = paginate(request, books, BOOK_LIST_PAGE_SIZE, ordering)
+
+    # Aucun résultat : proposer « Vouliez-vous dire ? » à partir du vocabulaire
+    if search and not isbn and not corrected_search and not page_obj.object_list:
+        suggestion = correct_query(search)
+
+    results = {
+        'corrected_search': corrected_search,
+        'suggestion': suggestion,
+        'facet_rows': facet_rows,
+        'facet_filters': facet_filters,
+    }
+    if getattr(page_obj, 'is_cursor', False):
+        # En mode curseur, pas de COUNT(*) : le total n'est pas calculé
+        results['cursor'] = {
+            'books': list(page_obj.object_list),
+            'next_cursor': page_obj.next_cursor,
+            'previous_cursor': page_obj.previous_cursor,
+        }
+    else:
+        results.update({
+            'books': list(page_obj.object_list),
+            'number': page_obj.number,
+            'count': page_obj.paginator.count,
+            'next_cursor': page_obj.next_cursor,
+        })
+    return results
+
+
+@login_required
+def dashboard_cache_stats(request):
+    """Compteurs hit / miss / stale du cache du tableau de bord (bibliothécaire)"""
+    if not is_admin(request.user):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return JsonResponse(swr_counters())
+
+
+@login_required
+def book_list(request):
+    """Liste des livres avec recherche et filtrage.
+
+    Les résultats (page, totaux, facettes) sont mis en cache sous une clé dérivée
+    des paramètres normalisés et de la version du catalogue : tant qu'aucun livre
+    ni aucune catégorie n'est modifié, une recherche déjà vue ne réinterroge pas
+    le catalogue.
+    """
+    form = BookSearchForm(request.GET or None)
+
+    key = catalog_key('book_list', _book_list_cache_params(request, form))
+    results = cache.get(key)
+    if results is None:
+        results = _search_catalog(request, form)
+        cache.set(key, results, CATALOG_CACHE_TIMEOUT)
+
+    if 'cursor' in results:
+        cursor = results['cursor']
+        page_obj = CursorPage(cursor['books'], cursor['next_cursor'], cursor['previous_cursor'], request.GET)
+        total_books = None
+    else:
+        # Reconstituer la page sans recompter : le total vient du cache
+        paginator = Paginator(Book.objects.none(), BOOK_LIST_PAGE_SIZE)
+        paginator.count = results['count']
+        page_obj = Page(results['books'], results['number'], paginator)
+        page_obj.next_cursor = results['next_cursor']
+        link_numbered_page(page_obj, request.GET)
+        total_books = results['count']
     
     context = {
         'page_obj': page_obj,
         'books': page_obj.object_list,
         'form': form,
-        'total_books': books.count(),
+        'total_books': total_books,
+        'corrected_search': results['corrected_search'],
+        'suggestion': results['suggestion'],
+        'facets': build_facets(results['facet_rows'], request.GET, **results['facet_filters']),
     }
     
     return render(request, 'library/book_list.html', context)
 
 
+@login_required
+def book_autocomplete(request):
+    """Suggestions JSON (titres / auteurs) servies par l'index en mémoire, sans requête SQL"""
+    results = get_autocomplete_index().lookup(request.GET.get('q', ''))
+    for item in results:
+        item['url'] = reverse('library:book_detail', args=[item['book_id']])
+    return JsonResponse({'results': results})
+
+
+@login_required
+def book_autocomplete_stats(request):
+    """Taille de l'index d'autocomplétion du processus courant (bibliothécaire)"""
+    if not is_admin(request.user):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return JsonResponse(get_autocomplete_index().stats())
+
+
 def book_detail(request, pk):
     """Détail d'un livre (publique)"""
     book = get_object_or_404(Book, pk=pk)
@@ -1,5 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 from .models import Loan, LoanHistory
+from library import stats
 
 
 @admin.register(Loan)
@@ -39,13 +41,15 @@ class LoanAdmin(admin.ModelAdmin):
 
     def mark_as_returned(self, request, queryset):
         """Action pour marquer comme retourné"""
-        updated = queryset.filter(status='EN_COURS').update(status='RETOURNÉ')
+        updated = queryset.open().filter(status='EN_COURS').update(status='RETOURNÉ')
+        stats.apply_delta(active_loans=-updated)  # update() ne déclenche pas les signaux
         self.message_user(request, f'{updated} emprunt(s) marqué(s) comme retourné(s).')
     mark_as_returned.short_description = 'Marquer comme retourné'
 
     def mark_as_overdue(self, request, queryset):
         """Action pour marquer comme en retard"""
-        updated = queryset.filter(status='EN_COURS').update(status='EN_RETARD')
+        updated = queryset.open().filter(status='EN_COURS').update(status='EN_RETARD')
+        stats.apply_delta(overdue_loans=updated)  # toujours ouvert : reste compté actif
         self.message_user(request, f'{updated} emprunt(s) marqué(s) comme en retard.')
     mark_as_overdue.short_description = 'Marquer comme en retard'
 
@@ -53,7 +57,7 @@ class LoanAdmin(admin.ModelAdmin):
 @admin.register(LoanHistory)
 class LoanHistoryAdmin(admin.ModelAdmin):
     """Admin pour l'historique des emprunts"""
-    list_display = ('id', 'member', 'book', 'loan_date', 'return_date', 'status', 'fine', 'created_at')
+    list_display = ('id', 'loan_id', 'member', 'book', 'loan_date', 'return_date', 'status', 'fine', 'created_at')
     list_filter = ('status', 'loan_date', 'return_date', 'created_at')
     search_fields = ('member__first_name', 'member__last_name', 'book__title')
     readonly_fields = ('created_at',)
@@ -70,7 +74,7 @@ class LoanHistoryAdmin(admin.ModelAdmin):
 
 
 # Enregistrement des Demandes (actions séparées)
-from .models import DemandeEmprunt, DemandeRetour
+from .models import DemandeEmprunt, DemandeRetour, Notification, Reservation
 
 
 @admin.register(DemandeEmprunt)
@@ -80,6 +84,21 @@ class DemandeEmpruntAdmin(admin.ModelAdmin):
     list_filter = ('statut', 'date_demande')
     search_fields = ('lecteur__first_name', 'lecteur__last_name', 'livre__title')
     readonly_fields = ('date_demande', 'date_validation', 'valide_par')
+    actions = ['valider_selection']
+
+    def valider_selection(self, request, queryset):
+        """Valider les demandes sélectionnées (attribution par date de demande)"""
+        try:
+            report = DemandeEmprunt.valider_lot(queryset.values_list('pk', flat=True), request.user)
+        except ValidationError as exc:
+            self.message_user(request, exc.messages[0], level=messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f"{len(report['granted'])} demande(s) validée(s), {len(report['refused'])} refusée(s), "
+            f"{len(report['skipped'])} ignorée(s).",
+        )
+    valider_selection.short_description = 'Valider les demandes sélectionnées'
 
 
 @admin.register(DemandeRetour)
@@ -89,3 +108,23 @@ class DemandeRetourAdmin(admin.ModelAdmin):
     list_filter = ('statut', 'date_demande')
     search_fields = ('lecteur__first_name', 'lecteur__last_name', 'emprunt__book__title')
     readonly_fields = ('date_demande', 'date_validation', 'valide_par')
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    """Admin pour la file des réservations"""
+    list_display = ('id', 'livre', 'lecteur', 'statut', 'position', 'date_reservation', 'expire_le')
+    list_filter = ('statut', 'date_reservation')
+    search_fields = ('lecteur__first_name', 'lecteur__last_name', 'livre__title')
+    readonly_fields = ('date_reservation', 'date_attribution')
+    ordering = ('position', 'id')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """Admin pour la file des notifications e-mail"""
+    list_display = ('id', 'type', 'destinataire', 'statut', 'tentatives', 'prochain_essai', 'date_creation', 'date_envoi')
+    list_filter = ('statut', 'type', 'date_creation')
+    search_fields = ('destinataire', 'sujet')
+    readonly_fields = ('date_creation', 'date_envoi', 'derniere_erreur')
+    ordering = ('-id',)
@@ -0,0 +1,138 @@
+"""
+Politique d'amendes des emprunts.
+
+La politique (délai de grâce, tarif journalier, plafond, tarifs par catégorie)
+est décrite par le réglage `LIBRARY_FINE_POLICY` et s'évalue de deux façons
+cohérentes entre elles :
+
+- `amount()` en Python, au retour d'un emprunt (`Loan.return_loan`,
+  `Loan.return_batch`) ;
+- `expression()` en SQL, pour annoter ou agréger les amendes courues de tous les
+  emprunts ouverts en une seule requête (voir `LoanQuerySet.with_live_fine`).
+
+Une autre politique peut être branchée par `LIBRARY_FINE_POLICY_CLASS` (chemin
+pointé d'une classe exposant `amount()` et `expression()`).
+
+Exemple de réglage :
+
+    LIBRARY_FINE_POLICY = {
+        'daily_rate': '0.50',
+        'grace_days': 2,
+        'cap': '15.00',
+        'category_rates': {'Jeunesse': '0.20'},  # nom ou id de catégorie
+    }
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import NotSupportedError, models
+from django.db.models import Case, ExpressionWrapper, F, Func, Value, When
+from django.db.models.functions import Coalesce, Least
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+CENTS = Decimal('0.01')
+
+
+class DaysBetween(Func):
+    """Nombre de jours calendaires (UTC) entre deux horodatages : `end - start`"""
+    arity = 2
+    output_field = models.IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f'DaysBetween non supporté sur {connection.vendor}')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self._as_sql_template(
+            compiler, connection, 'CAST(julianday(date({end})) - julianday(date({start})) AS INTEGER)',
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self._as_sql_template(compiler, connection, '(({end})::date - ({start})::date)')
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self._as_sql_template(compiler, connection, 'DATEDIFF({end}, {start})')
+
+    def _as_sql_template(self, compiler, connection, template):
+        start, end = self.get_source_expressions()
+        start_sql, start_params = compiler.compile(start)
+        end_sql, end_params = compiler.compile(end)
+        # Les paramètres suivent l'ordre d'apparition dans le gabarit
+        if template.index('{end}') < template.index('{start}'):
+            params = (*end_params, *start_params)
+        else:
+            params = (*start_params, *end_params)
+        return template.format(start=start_sql, end=end_sql), params
+
+
+class FinePolicy:
+    """Amende = (jours de retard - délai de grâce) x tarif journalier, plafonnée.
+
+    Aucun jour n'est facturé tant que le retard ne dépasse pas `grace_days` ;
+    au-delà, seuls les jours après le délai de grâce sont facturés.
+    """
+
+    def __init__(self, daily_rate='1.00', grace_days=0, cap=None, category_rates=None):
+        self.daily_rate = Decimal(str(daily_rate))
+        self.grace_days = int(grace_days)
+        self.cap = Decimal(str(cap)) if cap is not None else None
+        self.category_rates = {key: Decimal(str(rate)) for key, rate in (category_rates or {}).items()}
+
+    def rate_for(self, category=None):
+        """Tarif journalier d'une catégorie (instance, id ou None)"""
+        if category is not None:
+            for key in (getattr(category, 'pk', category), getattr(category, 'name', None)):
+                if key is not None and key in self.category_rates:
+                    return self.category_rates[key]
+        return self.daily_rate
+
+    def amount(self, due_date, end_date, category=None):
+        """Amende d'un emprunt échu le `due_date` et rendu (ou évalué) le `end_date`"""
+        days = (end_date.date() - due_date.date()).days - self.grace_days
+        if days <= 0:
+            return Decimal('0.00')
+        fine = days * self.rate_for(category)
+        if self.cap is not None:
+            fine = min(fine, self.cap)
+        return fine.quantize(CENTS)
+
+    def _rate_expression(self, prefix=''):
+        whens = [
+            When(**{f'{prefix}book__category_id' if isinstance(key, int) else f'{prefix}book__category__name': key},
+                 then=Value(rate))
+            for key, rate in self.category_rates.items()
+        ]
+        if not whens:
+            return Value(self.daily_rate)
+        return Case(*whens, default=Value(self.daily_rate), output_field=models.DecimalField())
+
+    def expression(self, at=None, prefix=''):
+        """Expression ORM de l'amende d'un emprunt (sur `Loan`), évaluée à l'instant `at`.
+
+        Les emprunts rendus sont évalués à leur date de retour, les autres à `at`
+        (maintenant par défaut). `prefix` désigne les emprunts depuis un autre
+        modèle (ex. `'loans__'` depuis `Lecteur`, pour agréger par lecteur).
+        """
+        if at is None:
+            at = timezone.now()
+        output = models.DecimalField(max_digits=8, decimal_places=2)
+        days = DaysBetween(
+            F(f'{prefix}due_date'),
+            Coalesce(F(f'{prefix}return_date'), Value(at, output_field=models.DateTimeField())),
+        )
+        billable = days - Value(self.grace_days)
+        fine = Case(
+            When(GreaterThan(billable, 0), then=ExpressionWrapper(billable * self._rate_expression(prefix), output_field=output)),
+            default=Value(Decimal('0.00')),
+            output_field=output,
+        )
+        if self.cap is not None:
+            fine = Least(fine, Value(self.cap), output_field=output)
+        return fine
+
+
+def get_fine_policy():
+    """Politique configurée (`LIBRARY_FINE_POLICY_CLASS` et `LIBRARY_FINE_POLICY`)"""
+    policy_class = import_string(getattr(settings, 'LIBRARY_FINE_POLICY_CLASS', 'loans.fines.FinePolicy'))
+    return policy_class(**getattr(settings, 'LIBRARY_FINE_POLICY', {}))
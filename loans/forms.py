@@ -75,7 +75,7 @@ class DemandeRetourForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Limiter les emprunts sélectionnables à ceux du lecteur et en cours
         if lecteur is not None:
-            self.fields['emprunt'].queryset = Loan.objects.filter(member=lecteur, status='EN_COURS')
+            self.fields['emprunt'].queryset = Loan.objects.open().filter(member=lecteur)
         else:
             self.fields['emprunt'].queryset = Loan.objects.none()
 
@@ -129,6 +129,7 @@ class LoanSearchForm(forms.Form):
             ('loan_date', 'Date d\'emprunt'),
             ('due_date', 'Date d\'échéance'),
             ('-fine', 'Amende (plus élevée d\'abord)'),
+            ('-live_fine', 'Amende courue (plus élevée d\'abord)'),
         ],
         initial='loan_date',
         required=False,
@@ -185,6 +186,7 @@ class LoanSearchForm(forms.Form):
             ('loan_date', 'Date d\'emprunt'),
             ('due_date', 'Date d\'échéance'),
             ('-fine', 'Amende (plus élevée d\'abord)'),
+            ('-live_fine', 'Amende courue (plus élevée d\'abord)'),
         ],
         initial='loan_date',
         required=False,
@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from loans.models import DemandeRetour, Loan, LoanHistory, Notification
+
+
+class Command(BaseCommand):
+    help = ('Déplace les emprunts clos depuis plus de --days jours de Loan vers LoanHistory, '
+            'par lots ordonnés par clé (une transaction par lot, reprise possible après interruption).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Ancienneté minimale du retour (jours)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Nombre d\'emprunts déplacés par lot')
+        parser.add_argument('--dry-run', action='store_true', help='Compter seulement les emprunts à archiver')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days doit être positif et --batch-size supérieur à 0.')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archivable = Loan.objects.archivable(cutoff).order_by('pk')
+
+        if options['dry_run']:
+            self.stdout.write(f'{archivable.count()} emprunt(s) à archiver (clos avant le {cutoff:%d/%m/%Y}).')
+            return
+
+        # Chaque lot est copié puis supprimé dans la même transaction : une
+        # interruption laisse au pire le lot en cours intact, et une nouvelle
+        # exécution repart simplement des emprunts restants.
+        last_pk = 0
+        total = 0
+        started = time.monotonic()
+        while True:
+            chunk = list(
+                archivable.filter(pk__gt=last_pk).values(
+                    'pk', 'book_id', 'member_id', 'loan_date', 'due_date', 'return_date', 'status', 'fine',
+                )[:options['batch_size']]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1]['pk']
+            chunk_started = time.monotonic()
+            self._archive(chunk)
+            total += len(chunk)
+            self.stdout.write(
+                f'- {len(chunk)} emprunt(s) archivé(s) jusqu\'à l\'id {last_pk} '
+                f'en {(time.monotonic() - chunk_started) * 1000:.0f} ms'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} emprunt(s) archivé(s) en {time.monotonic() - started:.1f} s.'
+        ))
+
+    def _archive(self, chunk):
+        ids = [row['pk'] for row in chunk]
+        with transaction.atomic():
+            LoanHistory.objects.bulk_create(
+                [
+                    LoanHistory(
+                        loan_id=row['pk'],
+                        book_id=row['book_id'],
+                        member_id=row['member_id'],
+                        loan_date=row['loan_date'],
+                        due_date=row['due_date'],
+                        return_date=row['return_date'],  # NULL conservé : pas de date inventée
+                        status=row['status'],
+                        fine=row['fine'],
+                    )
+                    for row in chunk
+                ],
+                ignore_conflicts=True,  # lot déjà copié par une exécution antérieure
+            )
+            DemandeRetour.objects.filter(emprunt_id__in=ids).delete()
+            # Clé étrangère SET_NULL : les notifications sont conservées sans leur emprunt
+            Notification.objects.filter(emprunt_id__in=ids).update(emprunt=None)
+            # DELETE direct : le collecteur de Django chargerait chaque ligne pour
+            # les signaux de Loan (compteurs), inutiles ici : seuls des emprunts clos
+            # sont archivés et les compteurs ne portent que sur les emprunts ouverts.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(Loan._meta.db_table)} '
+                    f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                    ids,
+                )
@@ -0,0 +1,130 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from library.models import Book
+from loans.models import Loan
+from members.models import Lecteur
+
+# Index partiels comparés (voir Loan.Meta.indexes)
+BENCHMARKED_INDEXES = ('loan_open_due_date_idx', 'loan_open_member_idx')
+
+
+class Command(BaseCommand):
+    help = ('Compare plans d\'exécution et temps des requêtes sur les emprunts ouverts, sans puis avec '
+            'les index partiels, sur une table synthétique créée dans une base de test jetable.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Nombre d\'emprunts synthétiques')
+        parser.add_argument('--open-ratio', type=float, default=0.05, help='Part des emprunts non rendus')
+        parser.add_argument('--members', type=int, default=20_000, help='Nombre de lecteurs synthétiques')
+        parser.add_argument('--repeat', type=int, default=20, help='Exécutions par requête (médiane affichée)')
+
+    def handle(self, *args, **options):
+        # Base de test (comme `manage.py test`) : les données réelles ne sont pas touchées
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._populate(options)
+            indexes = [index for index in Loan._meta.indexes if index.name in BENCHMARKED_INDEXES]
+
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.remove_index(Loan, index)
+            self._analyze()
+            self.stdout.write(self.style.MIGRATE_HEADING('Sans index partiels'))
+            before = self._run_queries(options['repeat'])
+
+            with connection.schema_editor() as editor:
+                for index in indexes:
+                    editor.add_index(Loan, index)
+            self._analyze()
+            self.stdout.write(self.style.MIGRATE_HEADING('Avec index partiels'))
+            after = self._run_queries(options['repeat'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING('Résumé (médianes)'))
+            for label in before:
+                self.stdout.write(
+                    f'- {label} : {before[label]:.2f} ms -> {after[label]:.2f} ms '
+                    f'(x{before[label] / after[label] if after[label] else float("inf"):.1f})'
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _populate(self, options):
+        rows, members = options['rows'], options['members']
+        started = time.monotonic()
+        Lecteur.objects.bulk_create(
+            [Lecteur(first_name='Bench', last_name=str(i), email=f'bench{i}@example.com',
+                     numero_abonnement=f'B{i:07d}') for i in range(members)],
+            batch_size=5000,
+        )
+        Book.objects.bulk_create(
+            [Book(title=f'Livre {i}', author='Bench', isbn=f'BENCH{i:07d}', total_copies=100, available_copies=100)
+             for i in range(1000)],
+            batch_size=1000,
+        )
+        member_ids = list(Lecteur.objects.values_list('pk', flat=True))
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+
+        rng = random.Random(42)
+        now = timezone.now()
+        batch = []
+        for i in range(rows):
+            if rng.random() < options['open_ratio']:
+                # Emprunts ouverts : récents (une partie seulement est échue)
+                loan_date = now - timedelta(days=rng.randint(0, 60))
+                loan = Loan(status='EN_COURS', return_date=None)
+            else:
+                # Historique : cinq ans d'emprunts rendus
+                loan_date = now - timedelta(days=rng.randint(0, 5 * 365))
+                loan = Loan(status='RETOURNÉ', return_date=loan_date + timedelta(days=rng.randint(1, 40)))
+            due_date = loan_date + timedelta(days=28)
+            loan.book_id = rng.choice(book_ids)
+            loan.member_id = rng.choice(member_ids)
+            loan.due_date = due_date
+            batch.append(loan)
+            if len(batch) == 10000:
+                Loan.objects.bulk_create(batch)
+                batch = []
+        Loan.objects.bulk_create(batch)
+        self.stdout.write(f'{rows} emprunts synthétiques créés en {time.monotonic() - started:.1f} s.')
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _queries(self):
+        """Requêtes mesurées : libellé -> (queryset, évaluation)"""
+        now = timezone.now()
+        member_id = Loan.objects.open().values_list('member_id', flat=True).first()
+        open_loans = Loan.objects.open().order_by()
+        return {
+            'emprunts ouverts d\'un lecteur (COUNT)': (open_loans.filter(member_id=member_id), lambda qs: qs.count()),
+            'emprunts ouverts d\'un lecteur (liste)': (
+                open_loans.filter(member_id=member_id).order_by('due_date'), list,
+            ),
+            'emprunts ouverts échus (COUNT)': (open_loans.filter(due_date__lt=now), lambda qs: qs.count()),
+            'échéances des 3 prochains jours': (
+                open_loans.filter(due_date__gte=now, due_date__lt=now + timedelta(days=3)).values_list('pk', flat=True),
+                list,
+            ),
+        }
+
+    def _run_queries(self, repeat):
+        timings = {}
+        for label, (queryset, evaluate) in self._queries().items():
+            durations = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                evaluate(queryset.all())
+                durations.append((time.perf_counter() - started) * 1000)
+            timings[label] = statistics.median(durations)
+            self.stdout.write(f'- {label} : {timings[label]:.2f} ms')
+            for line in queryset.explain().splitlines():
+                self.stdout.write(f'    {line}')
+        return timings
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from loans.models import Reservation
+
+
+class Command(BaseCommand):
+    help = ('Expire les réservations dont l\'exemplaire mis de côté n\'a pas été retiré à temps : '
+            'l\'exemplaire passe à la réservation suivante ou revient en stock.')
+
+    def handle(self, *args, **options):
+        expired = Reservation.expirer()
+        self.stdout.write(self.style.SUCCESS(f'{expired} réservation(s) expirée(s).'))
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from library import stats
+from loans.models import Loan, Notification
+
+
+class Command(BaseCommand):
+    help = ('Passe en EN_RETARD les emprunts EN_COURS dont l\'échéance est dépassée, '
+            'par tranches d\'identifiants (UPDATE ensemblistes, relançable sans risque). '
+            'Met en file les avis de retard et les rappels avant échéance.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Largeur des tranches d\'identifiants')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Reprendre après cet identifiant (dernier id affiché par une exécution interrompue)')
+        parser.add_argument('--remind-days', type=int, default=2,
+                            help='Rappel aux emprunts arrivant à échéance dans ce nombre de jours (0 : aucun rappel)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['start_after'] < 0 or options['remind_days'] < 0:
+            raise CommandError('--batch-size doit être supérieur à 0, --start-after et --remind-days positifs.')
+        batch_size = options['batch_size']
+        now = timezone.now()
+        remind_until = now + timedelta(days=options['remind_days'])
+        max_pk = Loan.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+        # Tranches de clés primaires : chaque UPDATE parcourt l'index de la clé,
+        # quel que soit le nombre de lignes déjà traitées.
+        last_pk = options['start_after']
+        total = 0
+        started = time.monotonic()
+        while last_pk < max_pk:
+            upper = last_pk + batch_size
+            chunk_started = time.monotonic()
+            with transaction.atomic():
+                updated = Loan.objects.open().filter(
+                    pk__gt=last_pk, pk__lte=upper, status='EN_COURS', due_date__lt=now,
+                ).update(status='EN_RETARD')
+                # update() ne déclenche pas les signaux ; l'emprunt reste ouvert (compté actif)
+                stats.apply_delta(overdue_loans=updated)
+                # Notifications écrites dans la même transaction que le changement de statut
+                chunk = Loan.objects.open().filter(pk__gt=last_pk, pk__lte=upper).select_related('book', 'member')
+                Notification.pour_emprunts(
+                    'AVIS_RETARD',
+                    chunk.filter(status='EN_RETARD', due_date__lt=now).exclude(notifications__type='AVIS_RETARD'),
+                )
+                if options['remind_days'] > 0:
+                    Notification.pour_emprunts(
+                        'RAPPEL_ECHEANCE',
+                        chunk.filter(status='EN_COURS', due_date__gte=now, due_date__lte=remind_until)
+                        .exclude(notifications__type='RAPPEL_ECHEANCE'),
+                    )
+            total += updated
+            elapsed = (time.monotonic() - chunk_started) * 1000
+            self.stdout.write(f'- ids {last_pk + 1}..{min(upper, max_pk)} : {updated} emprunt(s) en {elapsed:.0f} ms')
+            last_pk = upper
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} emprunt(s) passé(s) en retard en {time.monotonic() - started:.1f} s.'
+        ))
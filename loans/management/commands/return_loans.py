@@ -0,0 +1,70 @@
+import re
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from loans.models import Loan
+
+
+class Command(BaseCommand):
+    help = ('Retourne un lot d\'emprunts en une transaction. Chaque ligne du fichier contient '
+            'un id d\'emprunt, ou « ISBN;numéro d\'abonnement » (séparateur ; ou ,).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('loans', nargs='*', type=int, help='Identifiants d\'emprunts à retourner')
+        parser.add_argument('--file', help='Fichier de retours (une ligne par livre, « - » pour l\'entrée standard)')
+        parser.add_argument('--date', help='Date de retour (AAAA-MM-JJ ou ISO 8601, défaut : maintenant)')
+
+    def _parse_line(self, line):
+        parts = [p.strip() for p in re.split(r'[;,\t]', line) if p.strip()]
+        if len(parts) == 1 and parts[0].isdigit():
+            return {'loan': int(parts[0])}
+        if len(parts) == 2:
+            return {'isbn': parts[0], 'member': parts[1]}
+        raise CommandError(f'Ligne invalide : {line!r}')
+
+    def _return_date(self, value):
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Date invalide : {value}')
+            parsed = datetime.combine(day, datetime.min.time())
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def handle(self, *args, **options):
+        items = [{'loan': pk} for pk in options['loans']]
+        if options['file']:
+            stream = sys.stdin if options['file'] == '-' else open(options['file'], encoding='utf-8')
+            with stream:
+                for line in stream:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        items.append(self._parse_line(line))
+        if not items:
+            raise CommandError('Aucun retour à traiter.')
+
+        report = Loan.return_batch(items, return_date=self._return_date(options['date']))
+
+        counts = {}
+        for entry in report:
+            counts[entry['result']] = counts.get(entry['result'], 0) + 1
+            label = entry['item'].get('loan') or f"{entry['item']['isbn']} / {entry['item']['member']}"
+            line = f"- {label} : {entry['result']}"
+            if entry['loan']:
+                line += f" (emprunt #{entry['loan']}"
+                if entry['result'] == 'returned':
+                    line += f", {entry['status']}, amende {entry['fine']} €"
+                line += ')'
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts.get('returned', 0)} retour(s) enregistré(s), "
+            f"{len(report) - counts.get('returned', 0)} ignoré(s)."
+        ))
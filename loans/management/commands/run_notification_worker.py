@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from loans.notifications import deliver_batch
+
+
+class Command(BaseCommand):
+    help = ('Envoie les notifications e-mail en file (table Notification) par lots, '
+            'une connexion par lot, avec nouvelles tentatives espacées en cas d\'échec.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Notifications envoyées par lot')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Tentatives avant abandon (statut ECHEC)')
+        parser.add_argument('--backoff', type=int, default=60,
+                            help='Délai (secondes) avant la première nouvelle tentative, doublé à chaque échec')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Pause (secondes) quand la file est vide')
+        parser.add_argument('--once', action='store_true',
+                            help='Vider la file des notifications dues puis s\'arrêter (cron, tests)')
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        try:
+            while True:
+                report = deliver_batch(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                    backoff=options['backoff'],
+                )
+                if report['claimed']:
+                    for key in totals:
+                        totals[key] += report[key]
+                    self.stdout.write(
+                        f"- lot de {report['claimed']} : {report['sent']} envoyée(s), "
+                        f"{report['retried']} replanifiée(s), {report['failed']} en échec"
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['sent']} notification(s) envoyée(s), {totals['retried']} replanifiée(s), "
+            f"{totals['failed']} en échec."
+        ))
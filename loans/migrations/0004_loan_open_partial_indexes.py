@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_alter_loan_member_alter_loanhistory_member_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['due_date'], name='loan_open_due_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('return_date__isnull', True)), fields=['member', 'status', 'due_date'], name='loan_open_member_idx'),
+        ),
+    ]
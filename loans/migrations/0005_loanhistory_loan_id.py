@@ -0,0 +1,22 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_loan_open_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanhistory',
+            name='loan_id',
+            field=models.PositiveIntegerField(blank=True, null=True, unique=True, verbose_name="Emprunt d'origine"),
+        ),
+        migrations.AddIndex(
+            model_name='loanhistory',
+            index=models.Index(fields=['loan_date'], name='loans_loanh_loan_da_aa7936_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_merge'),
+        ('library', '0006_book_available_copies_range'),
+        ('loans', '0005_loanhistory_loan_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.BigIntegerField(verbose_name='Position dans la file')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('DISPONIBLE', 'Disponible (à retirer)'), ('RETIREE', 'Retirée'), ('EXPIREE', 'Expirée'), ('ANNULEE', 'Annulée')], default='EN_ATTENTE', max_length=20, verbose_name='Statut')),
+                ('date_reservation', models.DateTimeField(auto_now_add=True, verbose_name='Date de réservation')),
+                ('date_attribution', models.DateTimeField(blank=True, null=True, verbose_name="Date d'attribution")),
+                ('expire_le', models.DateTimeField(blank=True, null=True, verbose_name='À retirer avant le')),
+                ('lecteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='members.lecteur', verbose_name='Lecteur')),
+                ('livre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='library.book', verbose_name='Livre')),
+            ],
+            options={
+                'verbose_name': 'Réservation',
+                'verbose_name_plural': 'Réservations',
+                'ordering': ['position', 'id'],
+                'indexes': [models.Index(fields=['livre', 'statut', 'position'], name='loans_reservation_queue_idx'), models.Index(fields=['statut', 'expire_le'], name='loans_reservation_expiry_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut__in', ('EN_ATTENTE', 'DISPONIBLE'))), fields=('livre', 'lecteur'), name='loans_reservation_active_unique'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def refuse_duplicate_pending(apps, schema_editor):
+    """Ne garder que la plus ancienne demande EN_ATTENTE par (lecteur, livre)"""
+    DemandeEmprunt = apps.get_model('loans', 'DemandeEmprunt')
+    duplicates = (
+        DemandeEmprunt.objects.filter(statut='EN_ATTENTE')
+        .values('lecteur_id', 'livre_id')
+        .annotate(n=Count('id'), first_id=Min('id'))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        DemandeEmprunt.objects.filter(
+            statut='EN_ATTENTE', lecteur_id=row['lecteur_id'], livre_id=row['livre_id'],
+        ).exclude(pk=row['first_id']).update(statut='REFUSE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandeemprunt',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name="Clé d'idempotence"),
+        ),
+        migrations.RunPython(refuse_duplicate_pending, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='demandeemprunt',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut', 'EN_ATTENTE')), fields=('lecteur', 'livre'), name='loans_demandeemprunt_pending_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='demandeemprunt',
+            constraint=models.UniqueConstraint(fields=('lecteur', 'idempotency_key'), name='loans_demandeemprunt_idempotency_unique'),
+        ),
+    ]
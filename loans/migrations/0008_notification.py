@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-17 23:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_merge'),
+        ('loans', '0007_demandeemprunt_pending_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('DEMANDE_VALIDEE', "Demande d'emprunt validée"), ('RAPPEL_ECHEANCE', 'Rappel avant échéance'), ('AVIS_RETARD', 'Avis de retard')], max_length=20, verbose_name='Type')),
+                ('destinataire', models.EmailField(max_length=254, verbose_name='Destinataire')),
+                ('sujet', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('corps', models.TextField(verbose_name='Message')),
+                ('cle', models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='Clé de dédoublonnage')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('ENVOYEE', 'Envoyée'), ('ECHEC', 'Échec')], default='EN_ATTENTE', max_length=20, verbose_name='Statut')),
+                ('tentatives', models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochain_essai', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochain essai')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_envoi', models.DateTimeField(blank=True, null=True, verbose_name="Date d'envoi")),
+                ('emprunt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='loans.loan', verbose_name='Emprunt')),
+                ('lecteur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='members.lecteur', verbose_name='Lecteur')),
+            ],
+            options={
+                'verbose_name': 'Notification',
+                'verbose_name_plural': 'Notifications',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['statut', 'prochain_essai'], name='loans_notification_due_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_notification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanhistory',
+            name='loan_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True, unique=True, verbose_name="Emprunt d'origine"),
+        ),
+        migrations.AlterField(
+            model_name='loanhistory',
+            name='return_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Date de retour'),
+        ),
+    ]
@@ -1,10 +1,93 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
-from library.models import Book
+from decimal import Decimal
+from library import stats
+from library.cache import bump_catalog_version
+from library.models import Book, Category
+from .fines import get_fine_policy
 from members.models import Lecteur
 from accounts.models import CustomUser
 
+# Durée d'un emprunt
+LOAN_DURATION = timedelta(days=28)
+
+
+def closing_status(due_date, return_date, category=None):
+    """Statut et amende (politique `loans.fines`) d'un emprunt rendu à `return_date`"""
+    if return_date > due_date:
+        return 'EN_RETARD', get_fine_policy().amount(due_date, return_date, category)
+    return 'RETOURNÉ', Decimal('0.00')
+
+
+def restock_books(counts):
+    """Remet en stock `{book_id: nombre d'exemplaires}` par des UPDATE `F()` groupés
+    (un par quantité), plafonnés au nombre total d'exemplaires."""
+    from django.db.models.functions import Least
+
+    counts = {book_id: count for book_id, count in counts.items() if count}
+    if not counts:
+        return
+    previous_stock = dict(
+        Book.objects.select_for_update()
+        .filter(pk__in=counts)
+        .order_by('pk')
+        .values_list('pk', 'available_copies')
+    )
+    by_count = {}
+    for book_id, count in counts.items():
+        by_count.setdefault(count, []).append(book_id)
+    now = timezone.now()
+    for count, book_pks in by_count.items():
+        Book.objects.filter(pk__in=book_pks).update(
+            available_copies=Least(models.F('available_copies') + count, models.F('total_copies')),
+            updated_at=now,
+        )
+    # update() ne déclenche pas les signaux
+    restocked = sum(1 for stock in previous_stock.values() if stock == 0)
+    stats.apply_delta(available_books=restocked, unavailable_books=-restocked)
+    transaction.on_commit(bump_catalog_version)
+
+
+# Statuts d'un emprunt non rendu (EN_RETARD : passé en retard par `mark_overdue`)
+OPEN_STATUSES = ('EN_COURS', 'EN_RETARD')
+
+# Condition des index partiels sur les emprunts ouverts : `open()` la reprend
+# telle quelle pour que SQLite comme PostgreSQL puissent utiliser ces index.
+OPEN_LOAN_CONDITION = models.Q(return_date__isnull=True)
+
+
+class LoanQuerySet(models.QuerySet):
+    def open(self):
+        """Emprunts non rendus : en cours, ou passés en retard par `mark_overdue`"""
+        return self.filter(OPEN_LOAN_CONDITION, status__in=OPEN_STATUSES)
+
+    def closed(self):
+        """Emprunts rendus (à temps ou en retard)"""
+        return self.exclude(OPEN_LOAN_CONDITION & models.Q(status__in=OPEN_STATUSES))
+
+    def with_live_fine(self, at=None):
+        """Annote `live_fine` : amende courue à `at` (maintenant) pour les emprunts
+        ouverts, amende enregistrée pour les emprunts rendus. Calculé en SQL."""
+        return self.annotate(live_fine=models.Case(
+            models.When(OPEN_LOAN_CONDITION & models.Q(status__in=OPEN_STATUSES),
+                        then=get_fine_policy().expression(at)),
+            default=models.F('fine'),
+            output_field=models.DecimalField(max_digits=8, decimal_places=2),
+        ))
+
+    def accrued_fines(self, at=None):
+        """Total des amendes courues sur les emprunts ouverts (une seule requête agrégée)"""
+        total = self.open().aggregate(total=models.Sum(get_fine_policy().expression(at)))['total']
+        return (total or Decimal('0')).quantize(Decimal('0.01'))
+
+    def archivable(self, cutoff):
+        """Emprunts clos avant `cutoff` (date de retour, ou d'échéance si non renseignée)"""
+        return self.closed().filter(
+            models.Q(return_date__lt=cutoff) | models.Q(return_date__isnull=True, due_date__lt=cutoff)
+        )
+
 
 class Loan(models.Model):
     """Modèle interne représentant un Emprunt effectif (table existante).
@@ -61,6 +144,8 @@ class Loan(models.Model):
         verbose_name='Remarques'
     )
 
+    objects = LoanQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Emprunt'
         verbose_name_plural = 'Emprunts'
@@ -68,6 +153,11 @@ class Loan(models.Model):
         indexes = [
             models.Index(fields=['status', 'member']),
             models.Index(fields=['loan_date']),
+            # Index partiels : seuls les emprunts ouverts (une petite fraction de la table)
+            models.Index(fields=['due_date'], condition=OPEN_LOAN_CONDITION, name='loan_open_due_date_idx'),
+            models.Index(
+                fields=['member', 'status', 'due_date'], condition=OPEN_LOAN_CONDITION, name='loan_open_member_idx',
+            ),
         ]
 
     def __str__(self):
@@ -76,12 +166,16 @@ class Loan(models.Model):
     def save(self, *args, **kwargs):
         """Définir la date d'échéance si elle n'existe pas"""
         if not self.due_date:
-            self.due_date = timezone.now() + timedelta(days=28)
+            self.due_date = timezone.now() + LOAN_DURATION
         super().save(*args, **kwargs)
 
+    def is_open(self):
+        """Vérifie si le livre n'a pas encore été rendu"""
+        return self.return_date is None and self.status in OPEN_STATUSES
+
     def is_overdue(self):
         """Vérifie si l'emprunt est en retard"""
-        if self.status == 'EN_COURS' and timezone.now() > self.due_date:
+        if self.is_open() and timezone.now() > self.due_date:
             return True
         return False
 
@@ -93,22 +187,129 @@ class Loan(models.Model):
         self.return_date = return_date
         
         # Calculer l'amende si en retard
-        if return_date > self.due_date:
-            days_overdue = (return_date.date() - self.due_date.date()).days
-            self.fine = days_overdue * 1.00  # 1€ par jour de retard
-            self.status = 'EN_RETARD'
-        else:
-            self.status = 'RETOURNÉ'
+        status, fine = closing_status(self.due_date, return_date, self.book.category)
+        self.status = status
+        if status == 'EN_RETARD':
+            self.fine = fine
         
-        # Rendre le livre disponible
-        self.book.return_book()
-        self.save()
+        with transaction.atomic():
+            # L'exemplaire rendu va à la première réservation en attente, sinon en stock
+            if not Reservation.allouer(self.book_id):
+                self.book.return_book()
+            self.save()
 
     def get_days_borrowed(self):
         """Nombre de jours empruntés"""
         end_date = self.return_date or timezone.now()
         return (end_date.date() - self.loan_date.date()).days
 
+    @classmethod
+    def return_batch(cls, items, return_date=None, validated_by=None):
+        """Retourner un lot d'emprunts en une transaction (poste de retour).
+
+        `items` : dicts `{'loan': id}` ou `{'isbn': ..., 'member': numero_abonnement}`.
+        Les emprunts sont résolus en une requête, les livres verrouillés une fois,
+        amendes et statuts calculés pour tout le lot puis écrits par `bulk_update`,
+        et les stocks restaurés par des UPDATE `F()` groupés (plafonnés au total).
+        Les demandes de retour en attente des emprunts clôturés sont validées.
+
+        Retourne un rapport par élément : `{'item', 'result', 'loan', 'status', 'fine'}`
+        avec `result` parmi `returned`, `already_returned`, `not_found`, `duplicate`.
+        """
+        from django.db.models import Q
+        from library.isbn import normalize_isbn
+
+        if return_date is None:
+            return_date = timezone.now()
+
+        # Clés de recherche de chaque élément
+        keys = []
+        for item in items:
+            if item.get('loan') not in (None, ''):
+                keys.append(('loan', int(item['loan'])))
+            else:
+                isbn = str(item.get('isbn') or '').strip()
+                keys.append(('pair', (normalize_isbn(isbn) or isbn, str(item.get('member') or '').strip())))
+        loan_ids = {value for kind, value in keys if kind == 'loan'}
+        pairs = {value for kind, value in keys if kind == 'pair'}
+
+        with transaction.atomic():
+            condition = Q(pk__in=loan_ids)
+            if pairs:
+                isbns = {isbn for isbn, _ in pairs}
+                condition |= Q(
+                    Q(book__isbn13__in=isbns) | Q(book__isbn__in=isbns),
+                    member__numero_abonnement__in={member for _, member in pairs},
+                    return_date__isnull=True,
+                )
+            loans = list(
+                cls.objects.select_for_update()
+                .filter(condition)
+                .order_by('loan_date', 'id')
+                .values('pk', 'book_id', 'due_date', 'return_date', 'status', 'book__category_id', 'book__category__name',
+                        'book__isbn', 'book__isbn13', 'member__numero_abonnement')
+            )
+            by_id = {loan['pk']: loan for loan in loans}
+            by_pair = {}
+            for loan in loans:
+                if loan['return_date'] is None:
+                    pair_isbn = loan['book__isbn13'] or loan['book__isbn']
+                    by_pair.setdefault((pair_isbn, loan['member__numero_abonnement']), []).append(loan)
+
+            report, to_close, seen = [], {}, set()
+            for item, (kind, value) in zip(items, keys):
+                if kind == 'loan':
+                    loan = by_id.get(value)
+                else:
+                    # Le plus ancien emprunt ouvert de ce lecteur pour ce livre, non déjà pris
+                    loan = next((l for l in by_pair.get(value, ()) if l['pk'] not in seen), None)
+                entry = {'item': item, 'result': 'not_found', 'loan': None, 'status': None, 'fine': None}
+                if loan is not None:
+                    entry['loan'] = loan['pk']
+                    if loan['pk'] in seen:
+                        entry['result'] = 'duplicate'
+                    elif loan['return_date'] is not None:
+                        entry.update(result='already_returned', status=loan['status'])
+                    else:
+                        category = loan['book__category_id'] and Category(
+                            pk=loan['book__category_id'], name=loan['book__category__name'],
+                        )
+                        status, fine = closing_status(loan['due_date'], return_date, category)
+                        entry.update(result='returned', status=status, fine=str(fine))
+                        to_close[loan['pk']] = (loan, status, fine)
+                    seen.add(loan['pk'])
+                report.append(entry)
+
+            if to_close:
+                cls.objects.bulk_update(
+                    [
+                        cls(pk=pk, return_date=return_date, status=status, fine=fine)
+                        for pk, (_, status, fine) in to_close.items()
+                    ],
+                    ['return_date', 'status', 'fine'],
+                )
+
+                returned_per_book = {}
+                for loan, _, _ in to_close.values():
+                    returned_per_book[loan['book_id']] = returned_per_book.get(loan['book_id'], 0) + 1
+                # Les exemplaires rendus vont d'abord aux réservations en attente
+                restock_books(Reservation.attribuer_exemplaires(returned_per_book))
+
+                DemandeRetour.objects.filter(emprunt_id__in=to_close, statut='EN_ATTENTE').update(
+                    statut='VALIDE', valide_par=validated_by, date_validation=timezone.now(),
+                )
+
+                # bulk_update et update() ne déclenchent pas les signaux
+                deltas = {'active_loans': 0, 'overdue_loans': 0}
+                for loan, status, _ in to_close.values():
+                    for name, value in stats.loan_counters({'status': status, 'return_date': return_date}).items():
+                        deltas[name] += value
+                    for name, value in stats.loan_counters(loan).items():
+                        deltas[name] -= value
+                stats.apply_delta(**deltas)
+
+        return report
+
 
 class LoanHistory(models.Model):
     """Historique des emprunts (archive)"""
@@ -131,6 +332,8 @@ class LoanHistory(models.Model):
         verbose_name='Date d\'échéance'
     )
     return_date = models.DateTimeField(
+        null=True,
+        blank=True,
         verbose_name='Date de retour'
     )
     status = models.CharField(
@@ -142,6 +345,12 @@ class LoanHistory(models.Model):
         decimal_places=2,
         verbose_name='Amende'
     )
+    loan_id = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        unique=True,
+        verbose_name='Emprunt d\'origine'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Archivé le'
@@ -151,6 +360,9 @@ class LoanHistory(models.Model):
         verbose_name = 'Historique d\'emprunt'
         verbose_name_plural = 'Historique des emprunts'
         ordering = ['-loan_date']
+        indexes = [
+            models.Index(fields=['loan_date']),
+        ]
 
     def __str__(self):
         return f"Archive: {self.member} - {self.book}"
@@ -178,44 +390,150 @@ class DemandeEmprunt(models.Model):
     commentaire = models.TextField(blank=True, null=True, verbose_name='Commentaire du lecteur')
     valide_par = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, verbose_name='Validé par')
     date_validation = models.DateTimeField(null=True, blank=True, verbose_name='Date de validation')
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False, verbose_name='Clé d\'idempotence')
 
     class Meta:
         verbose_name = 'Demande d\'emprunt'
         verbose_name_plural = 'Demandes d\'emprunt'
         ordering = ['-date_demande']
+        constraints = [
+            # Une seule demande en attente par lecteur et par livre
+            models.UniqueConstraint(
+                fields=['lecteur', 'livre'],
+                condition=models.Q(statut='EN_ATTENTE'),
+                name='loans_demandeemprunt_pending_unique',
+            ),
+            # Une clé d'idempotence (en-tête Idempotency-Key) ne sert qu'une fois par lecteur
+            models.UniqueConstraint(
+                fields=['lecteur', 'idempotency_key'],
+                name='loans_demandeemprunt_idempotency_unique',
+            ),
+        ]
 
     def __str__(self):
         return f"DemandeEmprunt #{self.pk} - {self.lecteur} -> {self.livre} ({self.statut})"
 
     def valider(self, bibliothecaire_user):
-        """Valider la demande : créer un Emprunt et diminuer le stock si possible"""
+        """Valider la demande : créer un Emprunt et diminuer le stock si possible.
+
+        Tout se fait dans une transaction : la demande est d'abord réclamée par un
+        UPDATE conditionnel sur `statut='EN_ATTENTE'`, puis un exemplaire est pris
+        par `Book.borrow_book()` (UPDATE ... WHERE available_copies > 0). Deux
+        bibliothécaires validant en même temps ne peuvent donc ni traiter deux fois
+        la même demande ni prêter plus d'exemplaires qu'il n'en existe.
+        """
         if self.statut != 'EN_ATTENTE':
             return False
-        # Vérifier disponibilité
-        if not self.livre.is_available():
-            # On peut marquer comme refusée si plus d'exemplaires
-            self.statut = 'REFUSE'
-            self.valide_par = bibliothecaire_user
-            self.date_validation = timezone.now()
-            self.save()
-            return False
-
-        # Créer l'emprunt
-        emprunt = Loan.objects.create(
-            book=self.livre,
-            member=self.lecteur,
-            # due_date sera calculée automatiquement si non fourni
-        )
-        # Diminuer le stock
-        self.livre.borrow_book()
 
-        self.statut = 'VALIDE'
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = DemandeEmprunt.objects.filter(pk=self.pk, statut='EN_ATTENTE').update(
+                statut='VALIDE', valide_par=bibliothecaire_user, date_validation=now,
+            )
+            if not claimed:
+                return False
+            if self.livre.borrow_book():
+                # Créer l'emprunt (due_date sera calculée automatiquement)
+                emprunt = Loan.objects.create(book=self.livre, member=self.lecteur)
+                Notification.pour_emprunts('DEMANDE_VALIDEE', [emprunt])
+            else:
+                # Plus d'exemplaire disponible : la demande est refusée
+                DemandeEmprunt.objects.filter(pk=self.pk).update(statut='REFUSE')
+                emprunt = False
+
+        self.statut = 'VALIDE' if emprunt else 'REFUSE'
         self.valide_par = bibliothecaire_user
-        self.date_validation = timezone.now()
-        self.save()
+        self.date_validation = now
         return emprunt
 
 
+    @classmethod
+    def valider_lot(cls, ids, bibliothecaire_user):
+        """Valider en une transaction un lot de demandes d'emprunt.
+
+        Les livres concernés sont verrouillés une seule fois, les exemplaires
+        attribués par ordre de date de demande, les emprunts créés par
+        `bulk_create` et les stocks décrémentés par des UPDATE groupés (un par
+        nombre d'exemplaires pris). Les demandes sans exemplaire restant sont
+        refusées dans la même transaction.
+
+        Retourne `{'granted': [...], 'refused': [...], 'skipped': [...]}` (ids des
+        demandes ; `skipped` : inexistantes ou déjà traitées). Lève `ValidationError`
+        (et annule tout) si le stock d'un livre a changé hors verrou.
+        """
+        ids = {int(pk) for pk in ids}
+        now = timezone.now()
+        with transaction.atomic():
+            demandes = list(
+                cls.objects.select_for_update()
+                .filter(pk__in=ids, statut='EN_ATTENTE')
+                .order_by('date_demande', 'id')
+            )
+            book_ids = {d.livre_id for d in demandes}
+            stock = dict(
+                Book.objects.select_for_update()
+                .filter(pk__in=book_ids)
+                .order_by('pk')
+                .values_list('pk', 'available_copies')
+            )
+
+            granted, refused, taken = [], [], {}
+            for demande in demandes:
+                if stock[demande.livre_id] > 0:
+                    stock[demande.livre_id] -= 1
+                    taken[demande.livre_id] = taken.get(demande.livre_id, 0) + 1
+                    granted.append(demande)
+                else:
+                    refused.append(demande)
+
+            due_date = now + LOAN_DURATION
+            loans = Loan.objects.bulk_create([
+                Loan(book_id=d.livre_id, member_id=d.lecteur_id, due_date=due_date)
+                for d in granted
+            ])
+            if any(loan.pk is None for loan in loans):
+                # Base sans RETURNING sur les insertions groupées : relire les emprunts
+                # du lot (échéance commune, à la microseconde près)
+                created = Loan.objects.filter(
+                    due_date=due_date,
+                    book_id__in=[d.livre_id for d in granted], member_id__in=[d.lecteur_id for d in granted],
+                )
+            else:
+                created = Loan.objects.filter(pk__in=[loan.pk for loan in loans])
+            Notification.pour_emprunts('DEMANDE_VALIDEE', created.select_related('book', 'member'))
+
+            # Un UPDATE par quantité prise : les livres concernés sont regroupés
+            by_count = {}
+            for book_id, count in taken.items():
+                by_count.setdefault(count, []).append(book_id)
+            for count, book_pks in by_count.items():
+                updated = Book.objects.filter(pk__in=book_pks, available_copies__gte=count).update(
+                    available_copies=models.F('available_copies') - count, updated_at=now,
+                )
+                if updated != len(book_pks):
+                    # Stock modifié hors verrou : tout annuler plutôt que survendre
+                    raise ValidationError('Stock modifié pendant la validation du lot : aucune demande traitée, réessayez.')
+
+            decision = {'valide_par': bibliothecaire_user, 'date_validation': now}
+            if granted:
+                cls.objects.filter(pk__in=[d.pk for d in granted]).update(statut='VALIDE', **decision)
+            if refused:
+                cls.objects.filter(pk__in=[d.pk for d in refused]).update(statut='REFUSE', **decision)
+
+            # bulk_create et update() ne déclenchent pas les signaux
+            emptied = sum(1 for book_id in taken if stock[book_id] == 0)
+            stats.apply_delta(active_loans=len(granted), available_books=-emptied, unavailable_books=emptied)
+            if taken:
+                transaction.on_commit(bump_catalog_version)
+
+        handled = {d.pk for d in demandes}
+        return {
+            'granted': [d.pk for d in granted],
+            'refused': [d.pk for d in refused],
+            'skipped': sorted(ids - handled),
+        }
+
+
 class DemandeRetour(models.Model):
     """Demande de retour créée par le Lecteur pour un Emprunt existant"""
 
@@ -253,3 +571,236 @@ class DemandeRetour(models.Model):
         self.date_validation = timezone.now()
         self.save()
         return True
+
+
+# ----- File d'attente des réservations (livres indisponibles) -----
+
+# Délai pour venir retirer un exemplaire mis de côté
+HOLD_PICKUP_DELAY = timedelta(days=3)
+
+ACTIVE_HOLD_STATUSES = ('EN_ATTENTE', 'DISPONIBLE')
+
+
+class Reservation(models.Model):
+    """Réservation d'un livre indisponible par un Lecteur.
+
+    Les réservations EN_ATTENTE d'un livre forment une file ordonnée par
+    `position` (index `(livre, statut, position)`). Quand un exemplaire est rendu,
+    il est attribué à la première réservation de la file (statut DISPONIBLE,
+    exemplaire mis de côté jusqu'à `expire_le`) au lieu de revenir en stock.
+    """
+
+    STATUTS = (
+        ('EN_ATTENTE', 'En attente'),
+        ('DISPONIBLE', 'Disponible (à retirer)'),
+        ('RETIREE', 'Retirée'),
+        ('EXPIREE', 'Expirée'),
+        ('ANNULEE', 'Annulée'),
+    )
+
+    livre = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='Livre', related_name='reservations')
+    lecteur = models.ForeignKey(Lecteur, on_delete=models.CASCADE, verbose_name='Lecteur', related_name='reservations')
+    position = models.BigIntegerField(verbose_name='Position dans la file')
+    statut = models.CharField(max_length=20, choices=STATUTS, default='EN_ATTENTE', verbose_name='Statut')
+    date_reservation = models.DateTimeField(auto_now_add=True, verbose_name='Date de réservation')
+    date_attribution = models.DateTimeField(null=True, blank=True, verbose_name='Date d\'attribution')
+    expire_le = models.DateTimeField(null=True, blank=True, verbose_name='À retirer avant le')
+
+    class Meta:
+        verbose_name = 'Réservation'
+        verbose_name_plural = 'Réservations'
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['livre', 'statut', 'position'], name='loans_reservation_queue_idx'),
+            models.Index(fields=['statut', 'expire_le'], name='loans_reservation_expiry_idx'),
+        ]
+        constraints = [
+            # Une seule réservation active par lecteur et par livre
+            models.UniqueConstraint(
+                fields=['livre', 'lecteur'],
+                condition=models.Q(statut__in=ACTIVE_HOLD_STATUSES),
+                name='loans_reservation_active_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Réservation #{self.pk} - {self.lecteur} -> {self.livre} ({self.statut})"
+
+    def save(self, *args, **kwargs):
+        """Les nouvelles réservations prennent place en fin de file"""
+        if self.position is None:
+            self.position = int(timezone.now().timestamp() * 1_000_000)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def allouer(cls, livre_id, copies=1):
+        """Attribue jusqu'à `copies` exemplaires rendus aux premières réservations en
+        attente du livre. Retourne le nombre d'exemplaires attribués (le reste doit
+        être remis en stock par l'appelant)."""
+        now = timezone.now()
+        ids = list(
+            cls.objects.select_for_update()
+            .filter(livre_id=livre_id, statut='EN_ATTENTE')
+            .order_by('position', 'id')
+            .values_list('pk', flat=True)[:copies]
+        )
+        if ids:
+            cls.objects.filter(pk__in=ids).update(
+                statut='DISPONIBLE', date_attribution=now, expire_le=now + HOLD_PICKUP_DELAY,
+            )
+        return len(ids)
+
+    @classmethod
+    def attribuer_exemplaires(cls, counts):
+        """Version groupée de `allouer` pour `{livre_id: exemplaires rendus}`.
+
+        Une requête repère les livres ayant des réservations en attente ; retourne
+        les exemplaires restant à remettre en stock, par livre.
+        """
+        waiting = set(
+            cls.objects.filter(livre_id__in=counts, statut='EN_ATTENTE')
+            .values_list('livre_id', flat=True).distinct()
+        )
+        remaining = dict(counts)
+        for livre_id in waiting:
+            remaining[livre_id] -= cls.allouer(livre_id, counts[livre_id])
+        return remaining
+
+    @classmethod
+    def expirer(cls, now=None):
+        """Expire en une passe les exemplaires mis de côté non retirés à temps ; ils
+        passent à la réservation suivante ou reviennent en stock. Retourne le nombre
+        de réservations expirées."""
+        if now is None:
+            now = timezone.now()
+        with transaction.atomic():
+            expired = list(
+                cls.objects.select_for_update()
+                .filter(statut='DISPONIBLE', expire_le__lt=now)
+                .values_list('pk', 'livre_id')
+            )
+            if not expired:
+                return 0
+            cls.objects.filter(pk__in=[pk for pk, _ in expired]).update(statut='EXPIREE')
+            released = {}
+            for _, livre_id in expired:
+                released[livre_id] = released.get(livre_id, 0) + 1
+            restock_books(cls.attribuer_exemplaires(released))
+        return len(expired)
+
+    def retirer(self):
+        """Le lecteur vient chercher l'exemplaire mis de côté : création de l'emprunt
+        (le stock a déjà été décompté à l'attribution)."""
+        with transaction.atomic():
+            if not Reservation.objects.filter(pk=self.pk, statut='DISPONIBLE').update(statut='RETIREE'):
+                return False
+            self.statut = 'RETIREE'
+            return Loan.objects.create(book_id=self.livre_id, member_id=self.lecteur_id)
+
+    def annuler(self):
+        """Annule la réservation ; un exemplaire déjà mis de côté est réattribué ou remis en stock"""
+        with transaction.atomic():
+            previous = (
+                Reservation.objects.select_for_update()
+                .filter(pk=self.pk, statut__in=ACTIVE_HOLD_STATUSES)
+                .values_list('statut', flat=True)
+                .first()
+            )
+            if previous is None:
+                return False
+            Reservation.objects.filter(pk=self.pk).update(statut='ANNULEE')
+            self.statut = 'ANNULEE'
+            if previous == 'DISPONIBLE' and not Reservation.allouer(self.livre_id):
+                self.livre.return_book()
+        return True
+
+
+# ----- Notifications e-mail (table « outbox ») -----
+
+class Notification(models.Model):
+    """E-mail à envoyer au lecteur, écrit dans la même transaction que le changement
+    d'état qui le déclenche (validation, échéance proche, retard).
+
+    L'envoi SMTP n'a jamais lieu pendant la requête : la commande
+    `run_notification_worker` vide la table par lots (voir `loans.notifications`).
+    `cle` (type + emprunt) empêche de notifier deux fois le même événement.
+    """
+
+    TYPES = (
+        ('DEMANDE_VALIDEE', 'Demande d\'emprunt validée'),
+        ('RAPPEL_ECHEANCE', 'Rappel avant échéance'),
+        ('AVIS_RETARD', 'Avis de retard'),
+    )
+
+    STATUTS = (
+        ('EN_ATTENTE', 'En attente'),
+        ('ENVOYEE', 'Envoyée'),
+        ('ECHEC', 'Échec'),
+    )
+
+    MESSAGES = {
+        'DEMANDE_VALIDEE': (
+            'Votre demande d\'emprunt est validée',
+            'Bonjour {lecteur},\n\nVotre demande d\'emprunt pour « {livre} » a été validée. '
+            'Le livre est à rendre avant le {echeance}.\n\nLa bibliothèque',
+        ),
+        'RAPPEL_ECHEANCE': (
+            'Rappel : « {livre} » est à rendre bientôt',
+            'Bonjour {lecteur},\n\nL\'emprunt de « {livre} » arrive à échéance le {echeance}. '
+            'Pensez à le rapporter.\n\nLa bibliothèque',
+        ),
+        'AVIS_RETARD': (
+            'Retard : « {livre} »',
+            'Bonjour {lecteur},\n\nL\'emprunt de « {livre} » devait être rendu le {echeance}. '
+            'Merci de le rapporter au plus vite.\n\nLa bibliothèque',
+        ),
+    }
+
+    type = models.CharField(max_length=20, choices=TYPES, verbose_name='Type')
+    lecteur = models.ForeignKey(Lecteur, null=True, blank=True, on_delete=models.SET_NULL, related_name='notifications', verbose_name='Lecteur')
+    emprunt = models.ForeignKey(Loan, null=True, blank=True, on_delete=models.SET_NULL, related_name='notifications', verbose_name='Emprunt')
+    destinataire = models.EmailField(verbose_name='Destinataire')
+    sujet = models.CharField(max_length=255, verbose_name='Sujet')
+    corps = models.TextField(verbose_name='Message')
+    cle = models.CharField(max_length=100, unique=True, null=True, blank=True, verbose_name='Clé de dédoublonnage')
+    statut = models.CharField(max_length=20, choices=STATUTS, default='EN_ATTENTE', verbose_name='Statut')
+    tentatives = models.PositiveSmallIntegerField(default=0, verbose_name='Tentatives')
+    prochain_essai = models.DateTimeField(default=timezone.now, verbose_name='Prochain essai')
+    derniere_erreur = models.TextField(blank=True, verbose_name='Dernière erreur')
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name='Date de création')
+    date_envoi = models.DateTimeField(null=True, blank=True, verbose_name='Date d\'envoi')
+
+    class Meta:
+        verbose_name = 'Notification'
+        verbose_name_plural = 'Notifications'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['statut', 'prochain_essai'], name='loans_notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification #{self.pk} - {self.type} -> {self.destinataire} ({self.statut})"
+
+    @classmethod
+    def pour_emprunts(cls, type, loans):
+        """Met en file une notification `type` par emprunt (à appeler dans la
+        transaction du changement d'état). Les emprunts déjà notifiés pour ce type
+        et les lecteurs sans e-mail sont ignorés. Retourne le nombre de lignes
+        proposées à l'insertion."""
+        sujet, corps = cls.MESSAGES[type]
+        notifications = []
+        for loan in loans:
+            if not loan.member.email:
+                continue
+            context = {
+                'lecteur': loan.member.get_full_name(),
+                'livre': loan.book.title,
+                'echeance': timezone.localtime(loan.due_date).strftime('%d/%m/%Y'),
+            }
+            notifications.append(cls(
+                type=type, lecteur_id=loan.member_id, emprunt_id=loan.pk,
+                destinataire=loan.member.email, cle=f'{type}:{loan.pk}',
+                sujet=sujet.format(**context), corps=corps.format(**context),
+            ))
+        cls.objects.bulk_create(notifications, ignore_conflicts=True)
+        return len(notifications)
@@ -0,0 +1,107 @@
+"""
+Envoi des notifications e-mail mises en file dans la table `Notification`.
+
+Les vues et les commandes n'envoient jamais d'e-mail elles-mêmes : elles écrivent
+une ligne `Notification` dans la transaction du changement d'état. Ce module
+vide la file par lots :
+
+- un lot est réclamé dans une courte transaction (`SELECT ... FOR UPDATE SKIP
+  LOCKED` quand la base le permet) et son `prochain_essai` est repoussé d'un
+  bail, pour que deux workers ne l'envoient pas en double ;
+- une seule connexion au serveur d'e-mails est ouverte pour tout le lot ;
+- un envoi en échec est replanifié avec un délai exponentiel
+  (`backoff`, `2 x backoff`, `4 x backoff`..., plafonné à `MAX_BACKOFF`) puis
+  abandonné (statut ECHEC) après `max_attempts` tentatives.
+
+Le backend d'e-mails est celui de `EMAIL_BACKEND` : les backends `locmem` et
+`filebased` de Django permettent de tester sans serveur SMTP.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification
+
+MAX_BACKOFF = timedelta(hours=6)
+
+# Durée pendant laquelle un lot réclamé n'est pas proposé à un autre worker
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def backoff_delay(attempts, backoff):
+    """Délai avant la tentative suivante après `attempts` échecs"""
+    return min(timedelta(seconds=backoff * 2 ** (attempts - 1)), MAX_BACKOFF)
+
+
+def claim_batch(batch_size, now=None):
+    """Réserve jusqu'à `batch_size` notifications dues et les retourne"""
+    if now is None:
+        now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(statut='EN_ATTENTE', prochain_essai__lte=now)
+            .order_by('prochain_essai', 'id')[:batch_size]
+        )
+        if batch:
+            Notification.objects.filter(pk__in=[n.pk for n in batch]).update(prochain_essai=now + CLAIM_LEASE)
+    return batch
+
+
+def deliver_batch(batch_size=100, max_attempts=5, backoff=60):
+    """Envoie un lot de notifications sur une seule connexion.
+
+    Retourne `{'claimed': n, 'sent': n, 'retried': n, 'failed': n}` ;
+    `claimed == 0` signifie que la file ne contient plus rien de dû.
+    """
+    batch = claim_batch(batch_size)
+    report = {'claimed': len(batch), 'sent': 0, 'retried': 0, 'failed': 0}
+    if not batch:
+        return report
+
+    sent, errors = [], {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # Serveur injoignable : tout le lot est replanifié
+        errors = {notification.pk: exc for notification in batch}
+    else:
+        try:
+            for notification in batch:
+                message = EmailMessage(
+                    notification.sujet, notification.corps, settings.DEFAULT_FROM_EMAIL,
+                    [notification.destinataire], connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as exc:
+                    errors[notification.pk] = exc
+                else:
+                    sent.append(notification.pk)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        Notification.objects.filter(pk__in=sent).update(
+            statut='ENVOYEE', date_envoi=now, tentatives=F('tentatives') + 1, derniere_erreur='',
+        )
+        report['sent'] = len(sent)
+    for notification in batch:
+        if notification.pk not in errors:
+            continue
+        attempts = notification.tentatives + 1
+        update = {'tentatives': attempts, 'derniere_erreur': f'{type(errors[notification.pk]).__name__}: {errors[notification.pk]}'}
+        if attempts >= max_attempts:
+            update['statut'] = 'ECHEC'
+            report['failed'] += 1
+        else:
+            update['prochain_essai'] = now + backoff_delay(attempts, backoff)
+            report['retried'] += 1
+        Notification.objects.filter(pk=notification.pk).update(**update)
+    return report
@@ -1,10 +1,21 @@
-from django.test import TestCase
+import io
+import json
+import time
+from decimal import Decimal
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from accounts.models import CustomUser
 from library.models import Book, Category
 from members.models import Lecteur
-from .models import DemandeEmprunt, DemandeRetour, Loan
+from .models import DemandeEmprunt, DemandeRetour, Loan, LoanHistory, Notification, Reservation
 
 
 class DemandeEmpruntTest(TestCase):
@@ -50,6 +61,58 @@ class DemandeEmpruntTest(TestCase):
         self.assertEqual(demande.valide_par, self.admin)
 
 
+class DemandeEmpruntUniciteTest(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='lect_uniq', password='lectpass', role='lecteur')
+        self.lecteur = Lecteur.objects.create(utilisateur=user, first_name='Uni', last_name='Que', email='uniq@local', numero_abonnement='U001')
+        self.book = Book.objects.create(title='Unique', author='Auteur', isbn='UNIQ01', total_copies=1, available_copies=1)
+        self.client.force_login(user)
+        self.url = reverse('loans:demande_emprunt')
+
+    def post(self, **headers):
+        return self.client.post(self.url, {'livre': self.book.pk}, HTTP_X_REQUESTED_WITH='XMLHttpRequest', **headers)
+
+    def test_doublon_refuse_par_la_contrainte(self):
+        self.assertEqual(self.post().status_code, 201)
+        resp = self.post()
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['status'], 'exists')
+        self.assertEqual(DemandeEmprunt.objects.filter(statut='EN_ATTENTE').count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DemandeEmprunt.objects.create(livre=self.book, lecteur=self.lecteur)
+
+    def test_nouvelle_demande_possible_apres_traitement(self):
+        DemandeEmprunt.objects.create(livre=self.book, lecteur=self.lecteur, statut='REFUSE')
+        self.assertEqual(self.post().status_code, 201)
+
+    def test_cle_idempotence_rejouee(self):
+        first = self.post(HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(first.status_code, 201)
+        # Même clé : la requête rejouée renvoie la réponse d'origine, sans doublon
+        DemandeEmprunt.objects.update(statut='REFUSE')
+        replay = self.post(HTTP_IDEMPOTENCY_KEY='abc-123')
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json()['status'], 'ok')
+        self.assertEqual(DemandeEmprunt.objects.count(), 1)
+
+    def test_cle_idempotence_rejouee_pour_un_autre_livre(self):
+        other = Book.objects.create(title='Autre', author='Auteur', isbn='UNIQ02', total_copies=1, available_copies=1)
+        self.assertEqual(self.post(HTTP_IDEMPOTENCY_KEY='abc-123').status_code, 201)
+        resp = self.client.post(
+            self.url, {'livre': other.pk}, HTTP_X_REQUESTED_WITH='XMLHttpRequest', HTTP_IDEMPOTENCY_KEY='abc-123',
+        )
+        self.assertEqual(resp.status_code, 422)
+        self.assertEqual(resp.json()['status'], 'conflict')
+        self.assertFalse(DemandeEmprunt.objects.filter(livre=other).exists())
+
+    def test_pas_de_lecture_prealable(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.post()
+        demande_queries = [q['sql'] for q in ctx.captured_queries if 'loans_demandeemprunt' in q['sql']]
+        self.assertEqual(len(demande_queries), 1)
+        self.assertTrue(demande_queries[0].startswith('INSERT'))
+
+
 class DemandeRetourTest(TestCase):
     def setUp(self):
         self.admin = CustomUser.objects.create_superuser(
@@ -79,3 +142,605 @@ class DemandeRetourTest(TestCase):
         demande.refresh_from_db()
         self.assertEqual(demande.statut, 'VALIDE')
         self.assertEqual(demande.valide_par, self.admin)
+
+
+class LoanListCursorTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin_cursor', email='cursor@test.local', password='admin123', role='admin', is_librarian=True
+        )
+        self.lecteur = Lecteur.objects.create(
+            first_name='Cursor', last_name='User', email='cursor@local', numero_abonnement='T100'
+        )
+        self.book = Book.objects.create(title='Livre C', author='Auteur', isbn='ISBN100', total_copies=50, available_copies=50)
+        for _ in range(25):
+            Loan.objects.create(book=self.book, member=self.lecteur)
+
+    def test_loan_list_cursor_pages_cover_all_loans(self):
+        from django.urls import reverse
+        self.client.login(username='admin_cursor', password='admin123')
+        url = reverse('loans:loan_list')
+        resp = self.client.get(url, {'cursor': ''})
+        first = list(resp.context['loans'])
+        resp = self.client.get(f"{url}?{resp.context['page_obj'].next_query}")
+        second = list(resp.context['loans'])
+        # Formulaire lié sans tri explicite : tri par défaut du formulaire (loan_date)
+        self.assertEqual(first + second, list(Loan.objects.order_by('loan_date', 'id')))
+        self.assertFalse(resp.context['page_obj'].has_next())
+
+
+class ValidationLotTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin_lot', email='lot@test.local', password='admin123', role='admin', is_librarian=True
+        )
+        self.book_a = Book.objects.create(title='Lot A', author='Auteur', isbn='LOT001', total_copies=2, available_copies=2)
+        self.book_b = Book.objects.create(title='Lot B', author='Auteur', isbn='LOT002', total_copies=1, available_copies=1)
+        self.lecteurs = [
+            Lecteur.objects.create(first_name='Lot', last_name=str(i), email=f'lot{i}@local', numero_abonnement=f'L{i:03d}')
+            for i in range(4)
+        ]
+
+    def _demande(self, livre, lecteur, minutes_ago):
+        demande = DemandeEmprunt.objects.create(livre=livre, lecteur=lecteur)
+        DemandeEmprunt.objects.filter(pk=demande.pk).update(date_demande=timezone.now() - timedelta(minutes=minutes_ago))
+        return demande
+
+    def test_copies_allocated_by_request_date(self):
+        from library.stats import get_stats
+        recent = self._demande(self.book_a, self.lecteurs[0], 1)
+        oldest = self._demande(self.book_a, self.lecteurs[1], 30)
+        middle = self._demande(self.book_a, self.lecteurs[2], 10)
+        single = self._demande(self.book_b, self.lecteurs[3], 5)
+        deja = self._demande(self.book_b, self.lecteurs[0], 60)
+        DemandeEmprunt.objects.filter(pk=deja.pk).update(statut='REFUSE')
+
+        report = DemandeEmprunt.valider_lot(
+            [recent.pk, oldest.pk, middle.pk, single.pk, deja.pk, 9999], self.admin
+        )
+
+        self.assertEqual(report['granted'], [oldest.pk, middle.pk, single.pk])
+        self.assertEqual(report['refused'], [recent.pk])
+        self.assertEqual(report['skipped'], sorted([deja.pk, 9999]))
+        self.book_a.refresh_from_db()
+        self.book_b.refresh_from_db()
+        self.assertEqual((self.book_a.available_copies, self.book_b.available_copies), (0, 0))
+        self.assertEqual(Loan.objects.count(), 3)
+        self.assertTrue(Loan.objects.filter(book=self.book_a, member=self.lecteurs[1]).exists())
+        recent.refresh_from_db()
+        self.assertEqual((recent.statut, recent.valide_par), ('REFUSE', self.admin))
+
+        counters = get_stats()
+        self.assertEqual((counters.active_loans, counters.available_books, counters.unavailable_books), (3, 0, 2))
+
+    def test_notifications_without_returning_bulk_insert(self):
+        from unittest import mock
+        from loans.models import Notification
+        first = self._demande(self.book_a, self.lecteurs[0], 2)
+        second = self._demande(self.book_a, self.lecteurs[1], 1)
+        # Comme MySQL : bulk_create ne renseigne pas les clés primaires
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            report = DemandeEmprunt.valider_lot([first.pk, second.pk], self.admin)
+        self.assertEqual(report['granted'], [first.pk, second.pk])
+        self.assertEqual(
+            set(Notification.objects.filter(type='DEMANDE_VALIDEE').values_list('emprunt_id', flat=True)),
+            set(Loan.objects.values_list('pk', flat=True)),
+        )
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def _lot_queries(self, books, lecteurs):
+        """Requêtes d'un lot : un exemplaire par livre, demandé par chaque lecteur"""
+        ids = []
+        for i, book in enumerate(books):
+            for j, lecteur in enumerate(lecteurs):
+                ids.append(self._demande(book, lecteur, i * len(lecteurs) + j + 1).pk)
+        with CaptureQueriesContext(connection) as ctx:
+            report = DemandeEmprunt.valider_lot(ids, self.admin)
+        self.assertEqual((len(report['granted']), len(report['refused'])), (len(books), len(books) * (len(lecteurs) - 1)))
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_lot_size(self):
+        def books(prefix, count):
+            return [
+                Book.objects.create(title=f'{prefix}{i}', author='Auteur', isbn=f'{prefix}{i:03d}', total_copies=1, available_copies=1)
+                for i in range(count)
+            ]
+        extra = [
+            Lecteur.objects.create(first_name='Lot', last_name=f'x{i}', email=f'lotx{i}@local', numero_abonnement=f'LX{i:03d}')
+            for i in range(4)
+        ]
+        small = self._lot_queries(books('QS', 2), self.lecteurs[:2])
+        large = self._lot_queries(books('QL', 8), self.lecteurs + extra)
+        self.assertEqual(small, large)
+
+    def test_concurrent_stock_change_is_reported_not_raised(self):
+        from unittest import mock
+        from django.core.exceptions import ValidationError
+        demande = self._demande(self.book_a, self.lecteurs[0], 5)
+        self.client.login(username='admin_lot', password='admin123')
+        url = reverse('loans:valider_demandes_emprunt_lot')
+        error = ValidationError('Stock modifié pendant la validation du lot')
+        with mock.patch.object(DemandeEmprunt, 'valider_lot', side_effect=error):
+            resp = self.client.post(url, {'ids': demande.pk}, follow=True)
+            self.assertRedirects(resp, reverse('loans:liste_demandes_emprunt'))
+            self.assertIn('Stock modifié', [str(m) for m in resp.context['messages']][0])
+            resp = self.client.post(url, {'ids': demande.pk}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(resp.status_code, 409)
+
+    def test_stock_changed_outside_lock_rolls_back_with_validation_error(self):
+        from unittest import mock
+        from django.core.exceptions import ValidationError
+        from django.db.models import QuerySet
+        demande = self._demande(self.book_a, self.lecteurs[0], 5)
+        original_update = QuerySet.update
+
+        def update(queryset, **kwargs):
+            if queryset.model is Book:
+                return 0  # le stock a changé entre le verrou et l'UPDATE
+            return original_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update):
+            with self.assertRaises(ValidationError):
+                DemandeEmprunt.valider_lot([demande.pk], self.admin)
+        demande.refresh_from_db()
+        self.assertEqual(demande.statut, 'EN_ATTENTE')
+        self.assertFalse(Loan.objects.exists())
+
+    def test_bulk_endpoint_returns_json_report(self):
+        from django.urls import reverse
+        demandes = [self._demande(self.book_b, lecteur, 10 - i) for i, lecteur in enumerate(self.lecteurs[:2])]
+        self.client.login(username='admin_lot', password='admin123')
+        resp = self.client.post(
+            reverse('loans:valider_demandes_emprunt_lot'),
+            {'ids': f'{demandes[0].pk},{demandes[1].pk}'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        self.assertEqual(resp.json(), {'granted': [demandes[0].pk], 'refused': [demandes[1].pk], 'skipped': []})
+
+
+class RetourLotTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin_retour', email='retour-lot@test.local', password='admin123', role='admin', is_librarian=True
+        )
+        self.lecteur = Lecteur.objects.create(first_name='Ret', last_name='Lot', email='rl@local', numero_abonnement='RL01')
+        self.autre = Lecteur.objects.create(first_name='Ret', last_name='Autre', email='rl2@local', numero_abonnement='RL02')
+        self.book = Book.objects.create(title='Retour A', author='Auteur', isbn='978-2-07-036822-8', total_copies=2, available_copies=0)
+        self.other = Book.objects.create(title='Retour B', author='Auteur', isbn='RETB', total_copies=1, available_copies=0)
+        self.late = Loan.objects.create(book=self.book, member=self.lecteur, due_date=timezone.now() - timedelta(days=3))
+        self.on_time = Loan.objects.create(book=self.book, member=self.autre)
+        self.by_isbn = Loan.objects.create(book=self.other, member=self.autre)
+        self.demande = DemandeRetour.objects.create(emprunt=self.on_time, lecteur=self.autre)
+
+    def test_return_batch_reports_each_item(self):
+        from library.stats import compute, get_stats
+        report = Loan.return_batch(
+            [
+                {'loan': self.late.pk},
+                {'loan': self.on_time.pk},
+                {'isbn': 'RETB', 'member': 'RL02'},
+                {'loan': self.late.pk},
+                {'isbn': '9782070368228', 'member': 'RL01'},
+                {'loan': 999999},
+            ],
+            validated_by=self.admin,
+        )
+        self.assertEqual(
+            [entry['result'] for entry in report],
+            ['returned', 'returned', 'returned', 'duplicate', 'not_found', 'not_found'],
+        )
+        self.assertEqual((report[0]['status'], report[0]['fine']), ('EN_RETARD', '3.00'))
+        self.assertEqual(report[1]['status'], 'RETOURNÉ')
+        self.assertEqual(report[2]['loan'], self.by_isbn.pk)
+
+        self.late.refresh_from_db()
+        self.assertEqual((self.late.status, self.late.fine), ('EN_RETARD', 3))
+        self.book.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.book.available_copies, self.other.available_copies), (2, 1))
+        self.demande.refresh_from_db()
+        self.assertEqual((self.demande.statut, self.demande.valide_par), ('VALIDE', self.admin))
+
+        # Un retour tardif (EN_RETARD avec date de retour) n'est plus un emprunt en retard
+        counters = get_stats()
+        self.assertEqual((counters.active_loans, counters.overdue_loans), (0, 0))
+        self.assertEqual(counters.as_dict(), compute())
+        self.assertEqual((counters.available_books, counters.unavailable_books), (2, 0))
+
+        again = Loan.return_batch([{'loan': self.late.pk}])
+        self.assertEqual(again[0]['result'], 'already_returned')
+
+    def test_endpoint_and_command(self):
+        import io
+        from django.core.management import call_command
+        from django.urls import reverse
+        self.client.login(username='admin_retour', password='admin123')
+        resp = self.client.post(
+            reverse('loans:retour_lot'),
+            data=json.dumps({'items': [{'loan': self.on_time.pk}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.json()['returned'], 1)
+
+        out = io.StringIO()
+        call_command('return_loans', str(self.late.pk), str(self.on_time.pk), stdout=out)
+        self.assertIn('1 retour(s) enregistré(s), 1 ignoré(s).', out.getvalue())
+
+
+class MarkOverdueTest(TestCase):
+    def setUp(self):
+        self.lecteur = Lecteur.objects.create(first_name='Sweep', last_name='User', email='sweep@local', numero_abonnement='SW01')
+        self.book = Book.objects.create(title='Sweep', author='Auteur', isbn='SWEEP01', total_copies=10, available_copies=10)
+        past = timezone.now() - timedelta(days=2)
+        self.late = [Loan.objects.create(book=self.book, member=self.lecteur, due_date=past) for _ in range(5)]
+        self.current = Loan.objects.create(book=self.book, member=self.lecteur)
+
+    def test_sweep_is_chunked_and_idempotent(self):
+        import io
+        from django.core.management import call_command
+        from library.stats import compute, get_stats
+        out = io.StringIO()
+        call_command('mark_overdue', '--batch-size', '2', stdout=out)
+        self.assertEqual(out.getvalue().count('- ids '), 3)
+        self.assertIn('5 emprunt(s) passé(s) en retard', out.getvalue())
+        self.assertEqual(Loan.objects.filter(status='EN_RETARD').count(), 5)
+        self.current.refresh_from_db()
+        self.assertEqual(self.current.status, 'EN_COURS')
+
+        # Les emprunts en retard restent ouverts : comptés actifs et en retard
+        counters = get_stats()
+        self.assertEqual((counters.active_loans, counters.overdue_loans), (6, 5))
+        self.assertEqual(counters.as_dict(), compute())
+
+        out = io.StringIO()
+        call_command('mark_overdue', '--start-after', str(self.late[2].pk), stdout=out)
+        self.assertIn('0 emprunt(s) passé(s) en retard', out.getvalue())
+
+        # Un emprunt passé en retard reste ouvert : il peut toujours être rendu
+        self.assertEqual(self.lecteur.get_active_loans_count(), 6)
+        self.assertTrue(Loan.objects.get(pk=self.late[0].pk).is_overdue())
+
+    def test_rejects_invalid_bounds(self):
+        import io
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        # --batch-size 0 ou négatif ne ferait jamais avancer la tranche
+        for args in (['--batch-size', '0'], ['--batch-size', '-5'], ['--start-after', '-1'], ['--remind-days', '-1']):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command('mark_overdue', *args, stdout=io.StringIO())
+        self.assertFalse(Loan.objects.filter(status='EN_RETARD').exists())
+
+
+class ArchiveLoansTest(TestCase):
+    def setUp(self):
+        self.lecteur = Lecteur.objects.create(first_name='Arch', last_name='User', email='arch@local', numero_abonnement='AR01')
+        self.book = Book.objects.create(title='Archive', author='Auteur', isbn='ARCH01', total_copies=5, available_copies=5)
+        old = timezone.now() - timedelta(days=400)
+        self.old_loans = []
+        for status in ('RETOURNÉ', 'EN_RETARD', 'RETOURNÉ'):
+            loan = Loan.objects.create(book=self.book, member=self.lecteur, due_date=old, return_date=old, status=status)
+            self.old_loans.append(loan)
+        DemandeRetour.objects.create(emprunt=self.old_loans[0], lecteur=self.lecteur, statut='VALIDE')
+        self.recent = Loan.objects.create(book=self.book, member=self.lecteur, return_date=timezone.now(), status='RETOURNÉ')
+        self.open = Loan.objects.create(book=self.book, member=self.lecteur, due_date=old)
+
+    def test_archive_moves_old_closed_loans_in_chunks(self):
+        import io
+        from django.core.management import call_command
+        from library.stats import get_stats, reconcile
+        reconcile()
+        out = io.StringIO()
+        call_command('archive_loans', '--batch-size', '2', stdout=out)
+        self.assertIn('3 emprunt(s) archivé(s) en', out.getvalue())
+        self.assertEqual(out.getvalue().count('- '), 2)
+
+        self.assertEqual(set(Loan.objects.values_list('pk', flat=True)), {self.recent.pk, self.open.pk})
+        self.assertEqual(
+            set(LoanHistory.objects.values_list('loan_id', flat=True)), {loan.pk for loan in self.old_loans}
+        )
+        self.assertFalse(DemandeRetour.objects.exists())
+        self.assertEqual(get_stats().overdue_loans, 0)
+
+        # Relance : rien à faire
+        out = io.StringIO()
+        call_command('archive_loans', stdout=out)
+        self.assertIn('0 emprunt(s) archivé(s)', out.getvalue())
+
+    def test_loans_with_notifications_are_archived(self):
+        import io
+        from django.core.management import call_command
+        Notification.pour_emprunts('DEMANDE_VALIDEE', [self.old_loans[1]])
+        notification = Notification.objects.get(emprunt=self.old_loans[1])
+        out = io.StringIO()
+        call_command('archive_loans', stdout=out)
+        self.assertIn('3 emprunt(s) archivé(s)', out.getvalue())
+        notification.refresh_from_db()
+        self.assertIsNone(notification.emprunt_id)
+        self.assertFalse(Loan.objects.filter(pk=self.old_loans[1].pk).exists())
+
+    def test_missing_return_date_stays_null(self):
+        import io
+        from django.core.management import call_command
+        old = timezone.now() - timedelta(days=400)
+        legacy = Loan.objects.create(book=self.book, member=self.lecteur, due_date=old, status='RETOURNÉ')
+        call_command('archive_loans', stdout=io.StringIO())
+        self.assertIsNone(LoanHistory.objects.get(loan_id=legacy.pk).return_date)
+
+    def test_loan_history_serves_archive(self):
+        import io
+        from django.core.management import call_command
+        from django.urls import reverse
+        call_command('archive_loans', stdout=io.StringIO())
+        CustomUser.objects.create_superuser(username='admin_arch', email='arch@test.local', password='admin123')
+        self.client.login(username='admin_arch', password='admin123')
+        resp = self.client.get(reverse('loans:loan_history'))
+        self.assertEqual(len(resp.context['history']), 3)
+
+
+class OpenLoanIndexTest(TestCase):
+    def test_open_loan_partial_indexes_exist(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Loan._meta.db_table)
+        self.assertEqual(constraints['loan_open_due_date_idx']['columns'], ['due_date'])
+        self.assertEqual(constraints['loan_open_member_idx']['columns'], ['member_id', 'status', 'due_date'])
+        # `open()` reprend la condition des index partiels telle quelle
+        self.assertIn('"return_date" IS NULL AND', str(Loan.objects.open().query))
+
+
+@override_settings(LIBRARY_FINE_POLICY={
+    'daily_rate': '0.50', 'grace_days': 2, 'cap': '5.00', 'category_rates': {'Jeunesse': '0.20'},
+})
+class FinePolicyTest(TestCase):
+    def setUp(self):
+        self.lecteur = Lecteur.objects.create(first_name='Fine', last_name='User', email='fine@local', numero_abonnement='FI01')
+        jeunesse = Category.objects.create(name='Jeunesse')
+        self.book = Book.objects.create(title='Adulte', author='A', isbn='FINE01', total_copies=10, available_copies=10)
+        self.kids = Book.objects.create(title='Enfant', author='A', isbn='FINE02', category=jeunesse, total_copies=10, available_copies=10)
+        now = timezone.now()
+        self.loans = {
+            'grace': Loan.objects.create(book=self.book, member=self.lecteur, due_date=now - timedelta(days=2)),
+            'late': Loan.objects.create(book=self.book, member=self.lecteur, due_date=now - timedelta(days=6)),
+            'capped': Loan.objects.create(book=self.book, member=self.lecteur, due_date=now - timedelta(days=40)),
+            'kids': Loan.objects.create(book=self.kids, member=self.lecteur, due_date=now - timedelta(days=7)),
+            'current': Loan.objects.create(book=self.book, member=self.lecteur),
+        }
+
+    def test_sql_expression_matches_python_policy(self):
+        from .fines import get_fine_policy
+        now = timezone.now()
+        policy = get_fine_policy()
+        expected = {'grace': '0.00', 'late': '2.00', 'capped': '5.00', 'kids': '1.00', 'current': '0.00'}
+        annotated = dict(Loan.objects.with_live_fine(now).values_list('pk', 'live_fine'))
+        for name, loan in self.loans.items():
+            python_amount = policy.amount(loan.due_date, now, loan.book.category)
+            self.assertEqual(str(python_amount), expected[name], name)
+            self.assertEqual(annotated[loan.pk], python_amount, name)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Loan.objects.accrued_fines(now), Decimal('8.00'))
+
+    def test_return_records_policy_fine_and_loan_list_sorts_by_live_fine(self):
+        from django.urls import reverse
+        self.loans['late'].return_loan()
+        self.loans['late'].refresh_from_db()
+        self.assertEqual(self.loans['late'].fine, Decimal('2.00'))
+
+        CustomUser.objects.create_superuser(username='admin_fine', email='fine@test.local', password='admin123')
+        self.client.login(username='admin_fine', password='admin123')
+        resp = self.client.get(reverse('loans:loan_list'), {'sort_by': '-live_fine'})
+        fines = [loan.live_fine for loan in resp.context['loans']]
+        self.assertEqual(fines, sorted(fines, reverse=True))
+        self.assertEqual(fines[0], Decimal('5.00'))
+
+
+class ReservationTest(TestCase):
+    def setUp(self):
+        self.lecteurs = [
+            Lecteur.objects.create(first_name='Hold', last_name=str(i), email=f'hold{i}@local', numero_abonnement=f'H{i:03d}')
+            for i in range(3)
+        ]
+        self.book = Book.objects.create(title='Réservé', author='Auteur', isbn='HOLD01', total_copies=1, available_copies=0)
+        self.loan = Loan.objects.create(book=self.book, member=self.lecteurs[0])
+        self.first = Reservation.objects.create(livre=self.book, lecteur=self.lecteurs[1])
+        self.second = Reservation.objects.create(livre=self.book, lecteur=self.lecteurs[2])
+
+    def test_return_allocates_next_hold_instead_of_restocking(self):
+        self.loan.return_loan()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.statut, self.second.statut), ('DISPONIBLE', 'EN_ATTENTE'))
+        self.assertIsNotNone(self.first.expire_le)
+
+        loan = self.first.retirer()
+        self.assertEqual((loan.book, loan.member), (self.book, self.lecteurs[1]))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+    def test_expiry_sweep_passes_copy_along_then_restocks(self):
+        import io
+        from django.core.management import call_command
+        self.loan.return_loan()
+        later = timezone.now() + timedelta(days=10)
+        self.assertEqual(Reservation.expirer(now=later), 1)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.statut, 'DISPONIBLE')
+
+        self.second.annuler()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+        out = io.StringIO()
+        call_command('expire_reservations', stdout=out)
+        self.assertIn('0 réservation(s) expirée(s)', out.getvalue())
+
+    def test_one_active_hold_per_reader_and_batch_returns_allocate(self):
+        from django.db import IntegrityError, transaction
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reservation.objects.create(livre=self.book, lecteur=self.lecteurs[1])
+
+        report = Loan.return_batch([{'loan': self.loan.pk}])
+        self.assertEqual(report[0]['result'], 'returned')
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.statut, 'DISPONIBLE')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+
+
+class ConcurrentValidationStressTest(TransactionTestCase):
+    """Des centaines de validations en parallèle sur un même livre : aucune survente"""
+
+    COPIES = 40
+    DEMANDES = 200
+    THREADS = 8
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin_stress', email='stress@test.local', password='admin123', role='admin', is_librarian=True
+        )
+        self.book = Book.objects.create(
+            title='Livre convoité', author='Auteur', isbn='STRESS01',
+            total_copies=self.COPIES, available_copies=self.COPIES,
+        )
+        lecteurs = Lecteur.objects.bulk_create([
+            Lecteur(first_name='L', last_name=str(i), email=f'stress{i}@local', numero_abonnement=f'S{i:04d}')
+            for i in range(self.DEMANDES)
+        ])
+        DemandeEmprunt.objects.bulk_create([DemandeEmprunt(livre=self.book, lecteur=l) for l in lecteurs])
+
+    def _valider(self, pk):
+        from django.db import OperationalError, connection
+        try:
+            for _ in range(200):
+                try:
+                    # Chaque thread relit sa demande : instances indépendantes
+                    return bool(DemandeEmprunt.objects.get(pk=pk).valider(self.admin))
+                except OperationalError:
+                    # SQLite sérialise les écritures (« database is locked ») : réessayer
+                    time.sleep(0.005)
+            raise AssertionError(f'Demande {pk} jamais traitée')
+        finally:
+            connection.close()
+
+    def test_parallel_validations_never_oversell(self):
+        from concurrent.futures import ThreadPoolExecutor
+        ids = list(DemandeEmprunt.objects.values_list('pk', flat=True))
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            results = list(pool.map(self._valider, ids))
+
+        self.assertEqual(sum(results), self.COPIES)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Loan.objects.filter(book=self.book).count(), self.COPIES)
+        self.assertEqual(DemandeEmprunt.objects.filter(statut='VALIDE').count(), self.COPIES)
+        self.assertEqual(DemandeEmprunt.objects.filter(statut='REFUSE').count(), self.DEMANDES - self.COPIES)
+        self.assertFalse(DemandeEmprunt.objects.filter(statut='EN_ATTENTE').exists())
+
+    def test_check_constraint_rejects_negative_or_excess_stock(self):
+        from django.db import IntegrityError, transaction
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Book.objects.filter(pk=self.book.pk).update(available_copies=self.COPIES + 1)
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    """Backend locmem qui compte les connexions ouvertes"""
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class FailingEmailBackend(locmem.EmailBackend):
+    """Backend dont chaque envoi échoue (serveur SMTP en panne)"""
+
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP indisponible')
+
+
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin_notif', email='admin@notif.local', password='admin123', role='admin', is_librarian=True
+        )
+        self.lecteur = Lecteur.objects.create(first_name='Notif', last_name='User', email='notif@local', numero_abonnement='N001')
+        self.book = Book.objects.create(title='Notifié', author='Auteur', isbn='NOTIF01', total_copies=5, available_copies=5)
+
+    def _run_worker(self, *args):
+        out = io.StringIO()
+        call_command('run_notification_worker', '--once', *args, stdout=out)
+        return out.getvalue()
+
+    def test_validation_enqueues_in_same_transaction(self):
+        demande = DemandeEmprunt.objects.create(livre=self.book, lecteur=self.lecteur)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            demande.valider(self.admin)
+            raise RuntimeError('annulation')
+        self.assertFalse(Notification.objects.exists())
+
+        demande.refresh_from_db()
+        loan = demande.valider(self.admin)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.type, notification.emprunt_id), ('DEMANDE_VALIDEE', loan.pk))
+        self.assertEqual(notification.destinataire, 'notif@local')
+        self.assertIn('« Notifié »', notification.corps)
+        # Aucun e-mail pendant la requête : seul le worker envoie
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_mark_overdue_enqueues_notices_once(self):
+        now = timezone.now()
+        late = Loan.objects.create(book=self.book, member=self.lecteur, due_date=now - timedelta(days=1))
+        soon = Loan.objects.create(book=self.book, member=self.lecteur, due_date=now + timedelta(days=1))
+        Loan.objects.create(book=self.book, member=self.lecteur, due_date=now + timedelta(days=10))
+        for _ in range(2):
+            call_command('mark_overdue', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Notification.objects.values_list('type', 'emprunt_id')),
+            [('AVIS_RETARD', late.pk), ('RAPPEL_ECHEANCE', soon.pk)],
+        )
+
+    @override_settings(EMAIL_BACKEND='loans.tests.CountingEmailBackend')
+    def test_worker_sends_batches_on_one_connection_each(self):
+        loans = [Loan.objects.create(book=self.book, member=self.lecteur) for _ in range(5)]
+        Notification.pour_emprunts('DEMANDE_VALIDEE', loans)
+        CountingEmailBackend.opened = 0
+
+        output = self._run_worker('--batch-size', '2')
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ['notif@local'])
+        self.assertEqual(CountingEmailBackend.opened, 3)
+        self.assertIn('5 notification(s) envoyée(s)', output)
+        self.assertFalse(Notification.objects.exclude(statut='ENVOYEE').exists())
+
+        # File vide : rien n'est renvoyé
+        self._run_worker()
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_sends_are_retried_with_backoff_then_abandoned(self):
+        loan = Loan.objects.create(book=self.book, member=self.lecteur)
+        Notification.pour_emprunts('DEMANDE_VALIDEE', [loan])
+
+        with override_settings(EMAIL_BACKEND='loans.tests.FailingEmailBackend'):
+            before = timezone.now()
+            self._run_worker('--backoff', '60', '--max-attempts', '2')
+            notification = Notification.objects.get()
+            self.assertEqual((notification.statut, notification.tentatives), ('EN_ATTENTE', 1))
+            self.assertIn('SMTP indisponible', notification.derniere_erreur)
+            self.assertGreaterEqual(notification.prochain_essai, before + timedelta(seconds=60))
+
+            # Pas encore dû : le worker ne le reprend pas
+            self._run_worker('--max-attempts', '2')
+            self.assertEqual(Notification.objects.get().tentatives, 1)
+
+            Notification.objects.update(prochain_essai=timezone.now())
+            self._run_worker('--max-attempts', '2')
+            notification.refresh_from_db()
+            self.assertEqual((notification.statut, notification.tentatives), ('ECHEC', 2))
+
+        Notification.objects.update(statut='EN_ATTENTE', prochain_essai=timezone.now())
+        self._run_worker()
+        notification.refresh_from_db()
+        self.assertEqual((notification.statut, notification.derniere_erreur), ('ENVOYEE', ''))
+        self.assertEqual(len(mail.outbox), 1)
@@ -10,13 +10,21 @@ urlpatterns = [
     # Demandes d'emprunt (lecteur -> bibliothécaire)
     path('demande/', views.demande_emprunt, name='demande_emprunt'),
     path('demandes/', views.liste_demandes_emprunt, name='liste_demandes_emprunt'),
+    path('demandes/valider-lot/', views.valider_demandes_emprunt_lot, name='valider_demandes_emprunt_lot'),
     path('demandes/<int:pk>/<str:decision>/', views.valider_demande_emprunt, name='valider_demande_emprunt'),
 
     # Demandes de retour (lecteur -> bibliothécaire)
     path('demande-retour/', views.demande_retour, name='demande_retour'),
     path('demandes-retour/', views.liste_demandes_retour, name='liste_demandes_retour'),
+    path('retours/lot/', views.retour_lot, name='retour_lot'),
     path('demandes-retour/<int:pk>/<str:decision>/', views.valider_demande_retour, name='valider_demande_retour'),
 
+    # Réservations (file d'attente des livres indisponibles)
+    path('reservations/', views.liste_reservations, name='liste_reservations'),
+    path('reservations/livre/<int:book_pk>/', views.reserver, name='reserver'),
+    path('reservations/<int:pk>/annuler/', views.annuler_reservation, name='annuler_reservation'),
+    path('reservations/<int:pk>/retirer/', views.retirer_reservation, name='retirer_reservation'),
+
     path('my-loans/', views.my_loans, name='my_loans'),
     path('history/', views.loan_history, name='loan_history'),
 ]
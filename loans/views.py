@@ -1,17 +1,23 @@
+import json
+
+from django.core.exceptions import ValidationError
 from django.shortcuts import render, get_object_or_404, redirect
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.views.generic import UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
-from .models import Loan, LoanHistory, DemandeEmprunt, DemandeRetour
+from .models import Loan, LoanHistory, DemandeEmprunt, DemandeRetour, Reservation
 from .forms import LoanForm, ReturnLoanForm, LoanSearchForm, DemandeEmpruntForm, DemandeRetourForm
 from library.models import Book
 from members.models import Lecteur
 from library.views import is_admin
+from library.pagination import paginate
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 
 class IsAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -31,7 +37,7 @@ def loan_list(request):
         messages.error(request, 'Vous n\'avez pas les permissions pour accéder à cette page.')
         return redirect('library:book_list')
     
-    loans = Loan.objects.select_related('book', 'member').all()
+    loans = Loan.objects.select_related('book', 'member').with_live_fine()
     
     form = LoanSearchForm(request.GET or None)
     
@@ -51,15 +57,12 @@ def loan_list(request):
         if status:
             loans = loans.filter(status=status)
         
-        if sort_by:
-            loans = loans.order_by(sort_by)
     else:
-        loans = loans.order_by('-loan_date')
+        sort_by = '-loan_date'
     
-    # Pagination
-    paginator = Paginator(loans, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (classique ou par curseur avec ?cursor=) ; `id` départage les ex-aequo
+    ordering = [sort_by, '-id' if sort_by.startswith('-') else 'id']
+    page_obj = paginate(request, loans, 20, ordering)
     
     context = {
         'page_obj': page_obj,
@@ -119,21 +122,36 @@ def demande_emprunt(request):
         if form.is_valid():
             demande = form.save(commit=False)
             demande.lecteur = lecteur
+            # En-tête optionnel : une requête rejouée (double clic, nouvel essai AJAX)
+            # avec la même clé est reconnue comme déjà traitée
+            demande.idempotency_key = request.headers.get('Idempotency-Key', '').strip()[:64] or None
+            ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
-            # Empêcher les doublons : une même demande EN_ATTENTE pour le même livre
-            existe = DemandeEmprunt.objects.filter(lecteur=lecteur, livre=demande.livre, statut='EN_ATTENTE').exists()
-            if existe:
-                # Support AJAX: retourner une réponse JSON appropriée
-                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                    from django.http import JsonResponse
-                    return JsonResponse({'status': 'exists', 'message': 'Vous avez déjà une demande en attente pour ce livre.'}, status=400)
-                messages.warning(request, 'Vous avez déjà une demande en attente pour ce livre.')
-                return redirect('library:book_detail', pk=demande.livre.pk)
+            # Une seule insertion : les doublons sont écartés par les contraintes
+            # d'unicité (demande EN_ATTENTE par lecteur et livre, clé d'idempotence)
+            try:
+                with transaction.atomic():
+                    demande.save()
+            except IntegrityError:
+                original = demande.idempotency_key and DemandeEmprunt.objects.filter(
+                    lecteur=lecteur, idempotency_key=demande.idempotency_key,
+                ).values_list('livre_id', flat=True).first()
+                if original and original != demande.livre_id:
+                    # Clé réutilisée pour un autre livre : ce n'est pas la même requête
+                    message = 'Cette clé d\'idempotence a déjà servi pour une demande portant sur un autre livre.'
+                    if ajax:
+                        return JsonResponse({'status': 'conflict', 'message': message}, status=422)
+                    messages.error(request, message)
+                    return redirect('library:book_detail', pk=demande.livre.pk)
+                if not original:
+                    # Support AJAX: retourner une réponse JSON appropriée
+                    if ajax:
+                        return JsonResponse({'status': 'exists', 'message': 'Vous avez déjà une demande en attente pour ce livre.'}, status=400)
+                    messages.warning(request, 'Vous avez déjà une demande en attente pour ce livre.')
+                    return redirect('library:book_detail', pk=demande.livre.pk)
 
-            demande.save()
             # Support AJAX: retourner une réponse JSON plutôt que rediriger
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                from django.http import JsonResponse
+            if ajax:
                 return JsonResponse({'status': 'ok', 'message': "Demande d'emprunt créée. Elle est en attente de validation."}, status=201)
 
             messages.success(request, 'Demande d\'emprunt créée. Elle est en attente de validation.')
@@ -159,9 +177,7 @@ def liste_demandes_emprunt(request):
     if status:
         demandes = demandes.filter(statut=status)
 
-    paginator = Paginator(demandes, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, demandes, 20, ['-date_demande', '-id'])
 
     context = {'page_obj': page_obj, 'demandes': page_obj.object_list}
     return render(request, 'loans/demandes_emprunt_list.html', context)
@@ -192,6 +208,51 @@ def valider_demande_emprunt(request, pk, decision):
     return redirect('loans:liste_demandes_emprunt')
 
 
+@login_required
+def valider_demandes_emprunt_lot(request):
+    """Valider en une fois plusieurs demandes d'emprunt (bibliothécaire).
+
+    POST `ids` (répété ou séparé par des virgules). En AJAX, retourne le rapport
+    `{granted, refused, skipped}` en JSON.
+    """
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    if not is_admin(request.user):
+        if is_ajax:
+            return JsonResponse({'error': 'forbidden'}, status=403)
+        messages.error(request, 'Vous n\'avez pas les permissions pour effectuer cette action.')
+        return redirect('library:book_list')
+    if request.method != 'POST':
+        return redirect('loans:liste_demandes_emprunt')
+
+    try:
+        ids = [int(pk) for value in request.POST.getlist('ids') for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        ids = None
+    if not ids:
+        if is_ajax:
+            return JsonResponse({'error': 'Aucune demande sélectionnée.'}, status=400)
+        messages.warning(request, 'Aucune demande sélectionnée.')
+        return redirect('loans:liste_demandes_emprunt')
+
+    try:
+        report = DemandeEmprunt.valider_lot(ids, request.user)
+    except ValidationError as exc:
+        if is_ajax:
+            return JsonResponse({'error': exc.messages[0]}, status=409)
+        messages.error(request, exc.messages[0])
+        return redirect('loans:liste_demandes_emprunt')
+    if is_ajax:
+        return JsonResponse(report)
+
+    if report['granted']:
+        messages.success(request, f"{len(report['granted'])} demande(s) validée(s) et emprunt(s) créé(s).")
+    if report['refused']:
+        messages.warning(request, f"{len(report['refused'])} demande(s) refusée(s) (livre indisponible).")
+    if report['skipped']:
+        messages.info(request, f"{len(report['skipped'])} demande(s) ignorée(s) (déjà traitée(s)).")
+    return redirect('loans:liste_demandes_emprunt')
+
+
 @login_required
 def demande_retour(request):
     """Le lecteur crée une demande de retour pour un emprunt en cours. Peut être pré-remplie depuis la page emprunt."""
@@ -222,7 +283,7 @@ def demande_retour(request):
         emprunt = None
         if emprunt_id:
             try:
-                emprunt = Loan.objects.get(pk=emprunt_id, member=lecteur, status='EN_COURS')
+                emprunt = Loan.objects.open().get(pk=emprunt_id, member=lecteur)
                 form = DemandeRetourForm(lecteur=lecteur, initial={'emprunt': emprunt})
             except Loan.DoesNotExist:
                 emprunt = None
@@ -234,6 +295,38 @@ def demande_retour(request):
     return render(request, 'loans/demande_retour_form.html', context)
 
 
+@login_required
+def retour_lot(request):
+    """Poste de retour : clôturer plusieurs emprunts en une fois (bibliothécaire).
+
+    POST JSON `{"items": [{"loan": 12}, {"isbn": "...", "member": "MEM001"}], "return_date": "..."}` ;
+    retourne le rapport par élément de `Loan.return_batch`.
+    """
+    if not is_admin(request.user):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST requis.'}, status=405)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+        items = payload['items']
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError
+        return_date = payload.get('return_date')
+        if return_date:
+            return_date = parse_datetime(return_date)
+            if return_date is None:
+                raise ValueError
+            if timezone.is_naive(return_date):
+                return_date = timezone.make_aware(return_date)
+        report = Loan.return_batch(items, return_date=return_date or None, validated_by=request.user)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Requête invalide.'}, status=400)
+
+    returned = sum(1 for entry in report if entry['result'] == 'returned')
+    return JsonResponse({'returned': returned, 'results': report})
+
+
 @login_required
 def liste_demandes_retour(request):
     """Liste des demandes de retour (bibliothécaire)"""
@@ -248,9 +341,7 @@ def liste_demandes_retour(request):
     if status:
         demandes = demandes.filter(statut=status)
 
-    paginator = Paginator(demandes, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, demandes, 20, ['-date_demande', '-id'])
 
     context = {'page_obj': page_obj, 'demandes': page_obj.object_list}
     return render(request, 'loans/demandes_retour_list.html', context)
@@ -287,12 +378,14 @@ def my_loans(request):
         messages.error(request, 'Vous n\'êtes pas enregistré en tant que lecteur.')
         return redirect('library:book_list')
     
-    active_loans = lecteur.loans.filter(status='EN_COURS')
-    returned_loans = lecteur.loans.filter(status__in=['RETOURNÉ', 'EN_RETARD'])
+    active_loans = lecteur.loans.open()
+    returned_loans = lecteur.loans.closed()
+    reservations = lecteur.reservations.filter(statut__in=['EN_ATTENTE', 'DISPONIBLE']).select_related('livre')
     
     context = {
         'active_loans': active_loans,
         'returned_loans': returned_loans,
+        'reservations': reservations,
     }
     
     return render(request, 'loans/my_loans.html', context)
@@ -316,10 +409,8 @@ def loan_history(request):
             Q(book__title__icontains=search)
         )
     
-    # Pagination
-    paginator = Paginator(history, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (classique ou par curseur avec ?cursor=)
+    page_obj = paginate(request, history, 20, ['-loan_date', '-id'])
     
     context = {
         'page_obj': page_obj,
@@ -328,3 +419,75 @@ def loan_history(request):
     }
     
     return render(request, 'loans/loan_history.html', context)
+
+
+@login_required
+def reserver(request, book_pk):
+    """Le lecteur réserve un livre indisponible (file d'attente)"""
+    if request.method != 'POST':
+        return redirect('library:book_detail', pk=book_pk)
+    if not hasattr(request.user, 'lecteur'):
+        messages.error(request, 'Vous devez être enregistré en tant que lecteur pour réserver.')
+        return redirect('library:book_detail', pk=book_pk)
+
+    livre = get_object_or_404(Book, pk=book_pk, is_active=True)
+    if livre.is_available():
+        messages.info(request, 'Ce livre est disponible : faites plutôt une demande d\'emprunt.')
+        return redirect('library:book_detail', pk=livre.pk)
+    try:
+        with transaction.atomic():
+            Reservation.objects.create(livre=livre, lecteur=request.user.lecteur)
+    except IntegrityError:
+        # Contrainte d'unicité partielle : une réservation active existe déjà
+        messages.warning(request, 'Vous avez déjà une réservation en cours pour ce livre.')
+    else:
+        messages.success(request, 'Réservation enregistrée. Vous serez servi dans l\'ordre de la file d\'attente.')
+    return redirect('library:book_detail', pk=livre.pk)
+
+
+@login_required
+def annuler_reservation(request, pk):
+    """Annuler une réservation (le lecteur concerné ou un bibliothécaire)"""
+    reservation = get_object_or_404(Reservation, pk=pk)
+    admin = is_admin(request.user)
+    if not admin and getattr(request.user, 'lecteur', None) != reservation.lecteur:
+        messages.error(request, 'Vous n\'avez pas les permissions pour effectuer cette action.')
+        return redirect('library:book_list')
+    if request.method == 'POST':
+        if reservation.annuler():
+            messages.success(request, 'Réservation annulée.')
+        else:
+            messages.warning(request, 'Cette réservation n\'est plus active.')
+    return redirect('loans:liste_reservations' if admin else 'loans:my_loans')
+
+
+@login_required
+def liste_reservations(request):
+    """File des réservations (bibliothécaire)"""
+    if not is_admin(request.user):
+        messages.error(request, 'Vous n\'avez pas les permissions pour accéder à cette page.')
+        return redirect('library:book_list')
+
+    reservations = Reservation.objects.select_related('livre', 'lecteur')
+    status = request.GET.get('status', 'DISPONIBLE')
+    if status:
+        reservations = reservations.filter(statut=status)
+
+    page_obj = paginate(request, reservations, 20, ['position', 'id'])
+    context = {'page_obj': page_obj, 'reservations': page_obj.object_list, 'status': status}
+    return render(request, 'loans/reservations_list.html', context)
+
+
+@login_required
+def retirer_reservation(request, pk):
+    """Remise au lecteur de l'exemplaire mis de côté : crée l'emprunt (bibliothécaire)"""
+    if not is_admin(request.user):
+        messages.error(request, 'Vous n\'avez pas les permissions pour effectuer cette action.')
+        return redirect('library:book_list')
+    reservation = get_object_or_404(Reservation, pk=pk)
+    if request.method == 'POST':
+        if reservation.retirer():
+            messages.success(request, 'Exemplaire remis au lecteur, emprunt créé.')
+        else:
+            messages.error(request, 'Aucun exemplaire n\'est mis de côté pour cette réservation.')
+    return redirect('loans:liste_reservations')
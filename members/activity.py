@@ -0,0 +1,82 @@
+"""
+Suivi de l'activité des lecteurs en écriture différée.
+
+`Lecteur.derniere_activite` n'avançait qu'à l'enregistrement du profil. Le
+middleware `members.middleware.ActivityTrackerMiddleware` note désormais, pour
+chaque requête authentifiée, l'heure de passage de l'utilisateur dans un tampon
+propre au processus (aucune écriture en base). Au plus une fois par
+`LIBRARY_ACTIVITY_FLUSH_INTERVAL` secondes (60 par défaut), le tampon est vidé
+par un seul UPDATE groupé (`CASE utilisateur_id WHEN ... THEN ...`) par tranche
+de `FLUSH_CHUNK` lecteurs.
+
+Chaque processus vide son propre tampon ; au pire, l'activité des dernières
+secondes d'un processus arrêté est perdue, ce qui est sans conséquence pour des
+rapports d'inactivité exprimés en jours.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Lecteurs mis à jour par instruction UPDATE : chacun lie 3 paramètres (WHEN id
+# THEN horodatage, plus l'id dans le IN), soit 900 sous la limite historique de
+# 999 paramètres de SQLite
+FLUSH_CHUNK = 300
+
+
+class ActivityBuffer:
+    """Dernière activité par utilisateur (id -> horodatage), partagée entre les threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def record(self, user_id, at=None):
+        with self._lock:
+            self._seen[user_id] = at or timezone.now()
+
+    def flush_due(self):
+        interval = getattr(settings, 'LIBRARY_ACTIVITY_FLUSH_INTERVAL', 60)
+        return bool(self._seen) and time.monotonic() - self._last_flush >= interval
+
+    def flush(self):
+        """Écrit le tampon en base ; retourne le nombre de lecteurs mis à jour"""
+        from .models import Lecteur
+
+        with self._lock:
+            seen, self._seen = self._seen, {}
+            self._last_flush = time.monotonic()
+        if not seen:
+            return 0
+
+        items = sorted(seen.items())
+        updated = 0
+        try:
+            for start in range(0, len(items), FLUSH_CHUNK):
+                chunk = items[start:start + FLUSH_CHUNK]
+                updated += Lecteur.objects.filter(utilisateur_id__in=[user_id for user_id, _ in chunk]).update(
+                    derniere_activite=Case(
+                        *[When(utilisateur_id=user_id, then=Value(at)) for user_id, at in chunk],
+                        output_field=DateTimeField(),
+                    ),
+                )
+        except DatabaseError:
+            logger.exception('Écriture de l\'activité des lecteurs impossible ; nouvel essai au prochain vidage')
+            with self._lock:
+                for user_id, at in seen.items():
+                    # Ne pas écraser une activité plus récente notée entre-temps
+                    self._seen.setdefault(user_id, at)
+        return updated
+
+
+buffer = ActivityBuffer()
@@ -3,6 +3,7 @@ from django import forms
 from django.contrib import messages
 from django.utils.crypto import get_random_string
 from .models import Lecteur
+from accounts.usernames import create_user_with_free_username
 
 
 class LecteurAdminForm(forms.ModelForm):
@@ -25,12 +26,40 @@ class LecteurAdminForm(forms.ModelForm):
         return cleaned
 
 
+class LoanStatsFilter(admin.SimpleListFilter):
+    """Filtre sur les compteurs annotés par `with_loan_stats()`"""
+    title = 'emprunts'
+    parameter_name = 'emprunts'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('active', 'Avec emprunts en cours'),
+            ('overdue', 'Avec retards'),
+            ('fines', 'Avec amendes'),
+            ('none', 'Sans emprunt en cours'),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == 'active':
+            return queryset.filter(active_loans_count__gt=0)
+        if self.value() == 'overdue':
+            return queryset.filter(overdue_loans_count__gt=0)
+        if self.value() == 'fines':
+            return queryset.filter(outstanding_fines__gt=0)
+        if self.value() == 'none':
+            return queryset.filter(active_loans_count=0)
+        return queryset
+
+
 @admin.register(Lecteur)
 class LecteurAdmin(admin.ModelAdmin):
     """Admin pour les Lecteurs"""
     form = LecteurAdminForm
-    list_display = ('numero_abonnement', 'get_full_name', 'email', 'phone', 'statut', 'is_active', 'date_inscription', 'utilisateur_link')
-    list_filter = ('statut', 'is_active', 'date_inscription')
+    list_display = ('numero_abonnement', 'get_full_name', 'email', 'phone', 'statut', 'is_active',
+                    'active_loans', 'overdue_loans', 'total_loans', 'outstanding_fines',
+                    'date_inscription', 'utilisateur_link')
+    list_filter = ('statut', 'is_active', LoanStatsFilter, 'date_inscription')
+    list_select_related = ('utilisateur',)
     search_fields = ('first_name', 'last_name', 'email', 'numero_abonnement')
     readonly_fields = ('date_inscription', 'derniere_activite')
     fieldsets = (
@@ -51,11 +80,35 @@ class LecteurAdmin(admin.ModelAdmin):
     date_hierarchy = 'date_inscription'
     actions = ['mark_as_active', 'mark_as_inactive', 'suspend_lecteur']
 
+    def get_queryset(self, request):
+        """Compteurs d'emprunts et amendes annotés en une requête groupée"""
+        return super().get_queryset(request).with_loan_stats()
+
     def get_full_name(self, obj):
         """Affiche le nom complet"""
         return obj.get_full_name()
     get_full_name.short_description = 'Nom Complet'
 
+    def active_loans(self, obj):
+        return obj.active_loans_count
+    active_loans.short_description = 'Emprunts en cours'
+    active_loans.admin_order_field = 'active_loans_count'
+
+    def overdue_loans(self, obj):
+        return obj.overdue_loans_count
+    overdue_loans.short_description = 'En retard'
+    overdue_loans.admin_order_field = 'overdue_loans_count'
+
+    def total_loans(self, obj):
+        return obj.total_loans_count
+    total_loans.short_description = 'Total emprunts'
+    total_loans.admin_order_field = 'total_loans_count'
+
+    def outstanding_fines(self, obj):
+        return obj.outstanding_fines
+    outstanding_fines.short_description = 'Amendes'
+    outstanding_fines.admin_order_field = 'outstanding_fines'
+
     def utilisateur_link(self, obj):
         if obj.utilisateur:
             return obj.utilisateur.username
@@ -63,20 +116,20 @@ class LecteurAdmin(admin.ModelAdmin):
     utilisateur_link.short_description = 'Utilisateur (login)'
 
     def mark_as_active(self, request, queryset):
-        """Action pour activer les lecteurs"""
-        updated = queryset.update(statut='active', is_active=True)
+        """Action pour activer les lecteurs (et leurs comptes liés)"""
+        updated = queryset.set_statut('active')
         self.message_user(request, f'{updated} lecteur(s) activé(s).')
     mark_as_active.short_description = 'Marquer comme actif'
 
     def mark_as_inactive(self, request, queryset):
-        """Action pour désactiver les lecteurs"""
-        updated = queryset.update(statut='inactive', is_active=False)
+        """Action pour désactiver les lecteurs (et leurs comptes liés)"""
+        updated = queryset.set_statut('inactive')
         self.message_user(request, f'{updated} lecteur(s) désactivé(s).')
     mark_as_inactive.short_description = 'Marquer comme inactif'
 
     def suspend_lecteur(self, request, queryset):
-        """Action pour suspendre les lecteurs"""
-        updated = queryset.update(statut='suspended', is_active=False)
+        """Action pour suspendre les lecteurs (et leurs comptes liés)"""
+        updated = queryset.set_statut('suspended')
         self.message_user(request, f'{updated} lecteur(s) suspendu(s).')
     suspend_lecteur.short_description = 'Suspendre le lecteur'
 
@@ -108,45 +161,24 @@ class LecteurAdmin(admin.ModelAdmin):
             else:
                 base_username = obj.numero_abonnement
 
-            username = base_username
-            suffix = 1
-            while User.objects.filter(username=username).exists():
-                # si collision (rare avec email), ajouter un suffixe
-                username = f"{base_username}{suffix}"
-                suffix += 1
-
             password = form.cleaned_data.get('user_password') or get_random_string(12)
 
-            # Créer l'utilisateur de façon robuste (retenter si collision unique)
-            from django.db import IntegrityError
-            max_attempts = 5
-            attempt = 0
-            created = False
-            user = None
-            while not created and attempt < max_attempts:
-                try:
-                    user = User.objects.create(
-                        username=username,
-                        email=obj.email or '',
-                        first_name=obj.first_name,
-                        last_name=obj.last_name,
-                        is_active=obj.is_active,
-                    )
-                    user.set_password(password)
-                    if hasattr(user, 'role'):
-                        user.role = 'lecteur'
-                    user.save()
-                    created = True
-                except IntegrityError:
-                    attempt += 1
-                    username = f"{base_username}{attempt}"
-
-            if not created:
+            # Un nom libre est choisi en une requête (suffixe numérique si collision)
+            user = create_user_with_free_username(
+                base_username, password,
+                email=obj.email or '',
+                first_name=obj.first_name,
+                last_name=obj.last_name,
+                is_active=obj.is_active,
+                role='lecteur',
+            )
+
+            if not user:
                 self.message_user(request, 'Échec de création de l\'utilisateur lié après plusieurs tentatives.', level=messages.ERROR)
             else:
                 obj.utilisateur = user
                 # Informer l'admin des identifiants une seule fois (connexion par email possible si l'email est utilisé comme username)
-                self.message_user(request, f"Lecteur créé. Identifiants: {username} / {password} (connexion via email possible)")
+                self.message_user(request, f"Lecteur créé. Identifiants: {user.username} / {password} (connexion via email possible)")
         else:
             # Si l'admin a fourni un mot de passe pour l'utilisateur lié
             pwd = form.cleaned_data.get('user_password')
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from loans.models import Loan
+from members.models import Lecteur
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Date invalide (AAAA-MM-JJ attendu) : {value}')
+
+
+class Command(BaseCommand):
+    help = ('Désactivation de fin d\'année : change le statut des lecteurs sélectionnés et '
+            'désactive leurs comptes utilisateur, en deux UPDATE dans une transaction.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--statut', choices=('inactive', 'suspended', 'active'), default='inactive',
+                            help='Nouveau statut (inactive par défaut ; active pour une réactivation)')
+        parser.add_argument('--registered-before', help='Lecteurs inscrits avant cette date (AAAA-MM-JJ)')
+        parser.add_argument('--inactive-days', type=int, help='Lecteurs sans activité depuis ce nombre de jours')
+        parser.add_argument('--prefix', help='Lecteurs dont le numéro d\'adhésion commence par ce préfixe')
+        parser.add_argument('--keep-borrowers', action='store_true',
+                            help='Ignorer les lecteurs ayant encore des emprunts en cours')
+        parser.add_argument('--all', action='store_true', help='Tous les lecteurs (aucun critère)')
+        parser.add_argument('--dry-run', action='store_true', help='Compter seulement les lecteurs concernés')
+
+    def handle(self, *args, **options):
+        lecteurs = Lecteur.objects.exclude(statut=options['statut'])
+        criteria = False
+        if options['registered_before']:
+            lecteurs = lecteurs.filter(date_inscription__date__lt=_date(options['registered_before']))
+            criteria = True
+        if options['inactive_days'] is not None:
+            lecteurs = lecteurs.filter(derniere_activite__lt=timezone.now() - timedelta(days=options['inactive_days']))
+            criteria = True
+        if options['prefix']:
+            lecteurs = lecteurs.filter(numero_abonnement__startswith=options['prefix'])
+            criteria = True
+        if not criteria and not options['all']:
+            raise CommandError('Indiquer au moins un critère (--registered-before, --inactive-days, --prefix) ou --all.')
+        if options['keep_borrowers']:
+            lecteurs = lecteurs.exclude(pk__in=Loan.objects.open().values('member_id'))
+
+        if options['dry_run']:
+            self.stdout.write(f"{lecteurs.count()} lecteur(s) passeraient au statut « {options['statut']} ».")
+            return
+
+        updated = lecteurs.set_statut(options['statut'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} lecteur(s) passé(s) au statut « {options['statut']} » (comptes utilisateur synchronisés)."
+        ))
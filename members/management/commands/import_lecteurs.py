@@ -0,0 +1,235 @@
+import csv
+import json
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+from accounts.usernames import allocate_username
+from library import stats
+from members.models import Lecteur
+
+FIELDS = ('first_name', 'last_name', 'email', 'phone', 'address', 'numero_abonnement', 'username', 'password')
+REQUIRED = ('first_name', 'last_name', 'email')
+CREDENTIALS_HEADER = ('numero_abonnement', 'email', 'username', 'password')
+
+
+def _init_worker():
+    """Processus de hachage lancés par `spawn` : charger la configuration Django"""
+    django.setup()
+
+
+def hash_passwords(passwords):
+    """Hache une tranche de mots de passe (exécuté dans un processus du pool)"""
+    return [make_password(password) for password in passwords]
+
+
+def read_rows(path, fmt):
+    """Lit le fichier ligne à ligne : (numéro de ligne, dictionnaire) par lecteur"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            missing = set(REQUIRED) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield line_num, {'_error': f'JSON invalide ({exc})'}
+                    continue
+                yield line_num, row if isinstance(row, dict) else {'_error': 'un objet JSON est attendu'}
+
+
+class Command(BaseCommand):
+    help = ('Importe des lecteurs (et leurs comptes utilisateur) depuis un fichier CSV ou JSONL, '
+            'par lots bulk_create, avec hachage des mots de passe réparti sur plusieurs processus.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier CSV (avec en-tête) ou JSONL, une ligne par lecteur')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Format du fichier (déduit de l\'extension par défaut)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Lecteurs créés par transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processus de hachage des mots de passe (1 : dans le processus courant)')
+        parser.add_argument('--credentials', help='Fichier CSV où écrire les identifiants générés')
+        parser.add_argument('--dry-run', action='store_true', help='Valider le fichier sans rien créer')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        dry_run = options['dry_run']
+        if not dry_run and not options['credentials']:
+            raise CommandError('--credentials est obligatoire (sauf avec --dry-run)')
+        if not os.path.exists(path):
+            raise CommandError(f'Fichier introuvable : {path}')
+
+        self.User = get_user_model()
+        self.max_lengths = {
+            field: Lecteur._meta.get_field(field).max_length
+            for field in ('first_name', 'last_name', 'email', 'phone', 'numero_abonnement')
+        }
+        self.max_lengths['username'] = self.User._meta.get_field('username').max_length
+        self.seen = {'email': set(), 'numero_abonnement': set(), 'username': set()}
+        self.errors = []
+        # Préfixe des numéros d'adhésion générés pour cet import
+        self.run_id = format(int(time.time()), 'x')
+        created = 0
+        started = time.monotonic()
+
+        pool = None
+        credentials_file = None
+        try:
+            if not dry_run:
+                if options['workers'] > 1:
+                    pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+                # Identifiants en clair : fichier lisible par son seul propriétaire
+                fd = os.open(options['credentials'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                credentials_file = open(fd, 'w', newline='', encoding='utf-8')
+                credentials = csv.writer(credentials_file)
+                credentials.writerow(CREDENTIALS_HEADER)
+
+            rows = read_rows(path, fmt)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                valid = self.validate_batch(batch)
+                if dry_run or not valid:
+                    created += len(valid)
+                    continue
+                created += self.create_batch(valid, pool, options['workers'], credentials)
+                credentials_file.flush()
+                self.stdout.write(f'- {created} lecteur(s) créé(s)')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if credentials_file is not None:
+                credentials_file.close()
+
+        for line_num, message in self.errors[:50]:
+            self.stdout.write(self.style.WARNING(f'ligne {line_num} : {message}'))
+        if len(self.errors) > 50:
+            self.stdout.write(f'... et {len(self.errors) - 50} erreur(s) de plus')
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Dry-run : {created} lecteur(s) valide(s), {len(self.errors)} ligne(s) rejetée(s). Aucun changement effectué.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{created} lecteur(s) importé(s), {len(self.errors)} ligne(s) rejetée(s) '
+                f'en {time.monotonic() - started:.1f} s.'
+            ))
+
+    def validate_batch(self, batch):
+        """Normalise et valide un lot ; les doublons (fichier et base) sont vérifiés
+        par une requête par colonne unique et par lot."""
+        candidates = []
+        for line_num, raw in batch:
+            if '_error' in raw:
+                self.errors.append((line_num, raw['_error']))
+                continue
+            row = {field: str(raw.get(field) or '').strip() for field in FIELDS}
+            row['email'] = row['email'].lower()
+            missing = [field for field in REQUIRED if not row[field]]
+            if missing:
+                self.errors.append((line_num, f"champ(s) obligatoire(s) vide(s) : {', '.join(missing)}"))
+                continue
+            try:
+                validate_email(row['email'])
+            except ValidationError:
+                self.errors.append((line_num, f"email invalide : {row['email']}"))
+                continue
+            row['numero_abonnement'] = row['numero_abonnement'] or f'IMP{self.run_id}{line_num:06d}'
+            row['username'] = row['username'] or row['email']
+            too_long = [field for field, limit in self.max_lengths.items() if len(row[field]) > limit]
+            if too_long:
+                self.errors.append((line_num, f"valeur trop longue : {', '.join(too_long)}"))
+                continue
+            candidates.append((line_num, row))
+
+        taken = {
+            # Emails comparés sans la casse : ceux de la base peuvent en comporter
+            'email': set(Lecteur.objects.annotate(email_lower=Lower('email')).filter(
+                email_lower__in=[row['email'] for _, row in candidates]).values_list('email_lower', flat=True)),
+            'numero_abonnement': set(Lecteur.objects.filter(
+                numero_abonnement__in=[row['numero_abonnement'] for _, row in candidates]
+            ).values_list('numero_abonnement', flat=True)),
+        }
+        taken_usernames = set(self.User.objects.filter(
+            username__in=[row['username'] for _, row in candidates]).values_list('username', flat=True))
+        valid = []
+        for line_num, row in candidates:
+            duplicate = next(
+                (field for field in taken if row[field] in taken[field] or row[field] in self.seen[field]), None,
+            )
+            if duplicate:
+                self.errors.append((line_num, f'{duplicate} déjà utilisé : {row[duplicate]}'))
+                continue
+            if row['username'] in taken_usernames or row['username'] in self.seen['username']:
+                # Nom pris : premier nom libre dérivé, comme pour les autres comptes créés
+                row['username'] = allocate_username(row['username'], reserved=self.seen['username'])
+            for field in self.seen:
+                self.seen[field].add(row[field])
+            valid.append(row)
+        return valid
+
+    def create_batch(self, rows, pool, workers, credentials):
+        """Crée les comptes puis les lecteurs d'un lot dans une transaction"""
+        generated = {}
+        for index, row in enumerate(rows):
+            if not row['password']:
+                generated[index] = row['password'] = secrets.token_urlsafe(12)
+
+        passwords = [row['password'] for row in rows]
+        if pool is None:
+            hashes = hash_passwords(passwords)
+        else:
+            # Une tranche par processus : le hachage (PBKDF2) domine le coût de l'import
+            size = -(-len(passwords) // workers)
+            chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+            hashes = [hashed for chunk in pool.map(hash_passwords, chunks) for hashed in chunk]
+
+        with transaction.atomic():
+            users = self.User.objects.bulk_create([
+                self.User(
+                    username=row['username'], email=row['email'], password=hashed, role='lecteur',
+                    first_name=row['first_name'][:150], last_name=row['last_name'][:150],
+                )
+                for row, hashed in zip(rows, hashes)
+            ])
+            if any(user.pk is None for user in users):
+                # Base sans RETURNING sur les insertions groupées
+                user_ids = dict(self.User.objects.filter(
+                    username__in=[row['username'] for row in rows]).values_list('username', 'pk'))
+            else:
+                user_ids = {user.username: user.pk for user in users}
+            Lecteur.objects.bulk_create([
+                Lecteur(
+                    utilisateur_id=user_ids[row['username']],
+                    first_name=row['first_name'], last_name=row['last_name'], email=row['email'],
+                    phone=row['phone'] or None, address=row['address'] or None,
+                    numero_abonnement=row['numero_abonnement'],
+                )
+                for row in rows
+            ])
+            # bulk_create ne déclenche pas les signaux (lecteurs créés au statut 'active')
+            stats.apply_delta(total_lecteurs=len(rows), total_lecteurs_total=len(rows))
+
+        for index, row in enumerate(rows):
+            credentials.writerow((row['numero_abonnement'], row['email'], row['username'], generated.get(index, '')))
+        return len(rows)
@@ -1,44 +1,127 @@
+import time
+from collections import Counter
+
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from library import stats
+from loans.models import (
+    DemandeEmprunt, DemandeRetour, Loan, LoanHistory, Notification, Reservation, restock_books,
+)
 from members.models import Lecteur
-from django.contrib.auth import get_user_model
+
+
+def _delete_ids(model, ids):
+    """DELETE direct par clés : le collecteur de Django chargerait chaque ligne
+    pour les signaux (compteurs), corrigés en une fois par l'appelant."""
+    if not ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+            ids,
+        )
+        return cursor.rowcount
 
 
 class Command(BaseCommand):
-    help = 'Supprime tous les Lecteur sauf ceux liés à des superusers. Utiliser --dry-run pour prévisualiser.'
+    help = ('Supprime tous les Lecteur sauf ceux liés à des superusers, par lots de clés '
+            '(suppressions ensemblistes, une transaction par lot). Utiliser --dry-run pour prévisualiser.')
 
     def add_arguments(self, parser):
         parser.add_argument('--dry-run', action='store_true', help='Ne pas supprimer, afficher seulement ce qui serait supprimé')
         parser.add_argument('--preserve-superusers', action='store_true', default=True, help='Préserver les lecteurs liés aux superusers')
+        parser.add_argument('--yes', action='store_true', help='Ne pas demander de confirmation (exécution scriptée)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Nombre de lecteurs supprimés par transaction')
 
     def handle(self, *args, **options):
-        dry_run = options.get('dry_run')
-        preserve_super = options.get('preserve_superusers')
-
-        User = get_user_model()
-        to_delete = []
-        for lect in Lecteur.objects.select_related('utilisateur'):
-            if preserve_super and lect.utilisateur and getattr(lect.utilisateur, 'is_superuser', False):
-                continue
-            to_delete.append(lect)
-
-        self.stdout.write(self.style.WARNING(f"{len(to_delete)} lecteur(s) trouvés pour suppression."))
-        if dry_run:
-            for lect in to_delete[:50]:
-                self.stdout.write(f"- {lect.pk} | {lect.get_full_name()} | {lect.email}")
-            if len(to_delete) > 50:
-                self.stdout.write(f"... et {len(to_delete)-50} de plus")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être supérieur à 0.')
+
+        targets = Lecteur.objects.all()
+        if options.get('preserve_superusers'):
+            targets = targets.exclude(utilisateur__is_superuser=True)
+        targets = targets.order_by('pk')
+
+        total = targets.count()
+        self.stdout.write(self.style.WARNING(f"{total} lecteur(s) trouvés pour suppression."))
+        if options['dry_run']:
+            for pk, first_name, last_name, email in targets.values_list('pk', 'first_name', 'last_name', 'email')[:50]:
+                self.stdout.write(f"- {pk} | {first_name} {last_name} | {email}")
+            if total > 50:
+                self.stdout.write(f"... et {total - 50} de plus")
             self.stdout.write(self.style.SUCCESS('Dry-run complete. Aucun changement effectué.'))
             return
-
-        # demande confirmation interactive
-        confirm = input('Confirmer suppression de ces lecteurs? Tapez OUI pour valider: ')
-        if confirm != 'OUI':
-            self.stdout.write(self.style.ERROR('Abandon: confirmation non fournie.'))
+        if not total:
             return
 
+        if not options['yes']:
+            confirm = input('Confirmer suppression de ces lecteurs? Tapez OUI pour valider: ')
+            if confirm != 'OUI':
+                self.stdout.write(self.style.ERROR('Abandon: confirmation non fournie.'))
+                return
+
+        # Parcours par clé : chaque lot reprend après le dernier id traité, sans
+        # charger la liste complète ni dépendre des lignes déjà supprimées.
+        last_pk = 0
         count = 0
-        for lect in to_delete:
-            lect.delete()
-            count += 1
+        started = time.monotonic()
+        while True:
+            chunk = list(targets.filter(pk__gt=last_pk).values_list('pk', 'statut')[:options['batch_size']])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            chunk_started = time.monotonic()
+            deleted = self._purge([pk for pk, _ in chunk], sum(1 for _, statut in chunk if statut == 'active'))
+            count += deleted
+            elapsed = time.monotonic() - chunk_started
+            rate = count / (time.monotonic() - started or 1e-9)
+            self.stdout.write(
+                f'- {deleted} lecteur(s) supprimé(s) jusqu\'à l\'id {last_pk} en {elapsed * 1000:.0f} ms '
+                f'({count}/{total}, {rate:.0f} lecteurs/s)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Suppression terminée: {count} lecteur(s) supprimé(s) en {time.monotonic() - started:.1f} s.'
+        ))
+
+    def _purge(self, ids, active):
+        """Supprime un lot de lecteurs et leurs dépendances en une transaction"""
+        with transaction.atomic():
+            loans = Loan.objects.filter(member_id__in=ids)
+            loan_ids = list(loans.values_list('pk', flat=True))
+            open_loans = loans.open().aggregate(
+                active=Count('id'), overdue=Count('id', filter=Q(status='EN_RETARD')),
+            )
+
+            # Clés étrangères SET_NULL : l'historique et les notifications sont conservés
+            Notification.objects.filter(lecteur_id__in=ids).update(lecteur=None)
+            Notification.objects.filter(emprunt_id__in=loan_ids).update(emprunt=None)
+            LoanHistory.objects.filter(member_id__in=ids).update(member=None)
+
+            # Modèles sans signaux ni dépendances : un DELETE par table
+            DemandeRetour.objects.filter(lecteur_id__in=ids).delete()
+            DemandeRetour.objects.filter(emprunt_id__in=loan_ids).delete()
+            DemandeEmprunt.objects.filter(lecteur_id__in=ids).delete()
+
+            # Exemplaires mis de côté pour ces lecteurs ou encore empruntés par eux :
+            # réservation suivante, sinon retour en stock
+            freed = Counter(dict(
+                Reservation.objects.filter(lecteur_id__in=ids, statut='DISPONIBLE')
+                .values_list('livre_id').annotate(n=Count('id')).order_by()
+            ))
+            freed.update(dict(loans.open().values_list('book_id').annotate(n=Count('id')).order_by()))
+            Reservation.objects.filter(lecteur_id__in=ids).delete()
+            restock_books(Reservation.attribuer_exemplaires(dict(freed)))
+
+            _delete_ids(Loan, loan_ids)
+            deleted = _delete_ids(Lecteur, ids)
 
-        self.stdout.write(self.style.SUCCESS(f'Suppression terminée: {count} lecteur(s) supprimé(s).'))
\ No newline at end of file
+            stats.apply_delta(
+                active_loans=-open_loans['active'],
+                overdue_loans=-open_loans['overdue'],
+                total_lecteurs=-active,
+                total_lecteurs_total=-deleted,
+            )
+        return deleted
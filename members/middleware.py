@@ -0,0 +1,18 @@
+from .activity import buffer
+
+
+class ActivityTrackerMiddleware:
+    """Note l'activité des utilisateurs connectés dans le tampon de `members.activity`
+    et le vide périodiquement (un UPDATE groupé, jamais une écriture par requête)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            buffer.record(user.pk)
+            if buffer.flush_due():
+                buffer.flush()
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.8 on 2026-10-18 00:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0005_merge'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lecteur',
+            name='derniere_activite',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Dernière activité'),
+        ),
+    ]
@@ -1,9 +1,71 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.urls import reverse
 from accounts.models import CustomUser
 
 
+class LecteurQuerySet(models.QuerySet):
+    def set_statut(self, statut):
+        """Change le statut des lecteurs sélectionnés et synchronise `is_active`
+        des comptes liés, comme `Lecteur.save()`, en deux UPDATE ensemblistes
+        (comptes puis lecteurs) dans une transaction. Retourne le nombre de
+        lecteurs modifiés."""
+        from library import stats
+
+        active = statut == 'active'
+        with transaction.atomic():
+            # Sélection figée par clés avant tout UPDATE : le queryset peut être
+            # annoté (with_loan_stats) ou filtré sur un état que l'on s'apprête à
+            # modifier (statut, `utilisateur__is_active`...)
+            ids = list(self.values_list('pk', flat=True))
+            selected = self.model.objects.filter(pk__in=ids)
+            # Les comptes d'abord, tant que la sélection reflète l'état initial
+            CustomUser.objects.filter(
+                pk__in=selected.filter(utilisateur__isnull=False).values('utilisateur_id'),
+            ).exclude(is_active=active).update(is_active=active)
+            was_active = selected.filter(statut='active').count()
+            updated = selected.update(statut=statut, is_active=active)
+            # update() ne déclenche pas les signaux des compteurs
+            stats.apply_delta(total_lecteurs=(updated - was_active) if active else -was_active)
+        return updated
+
+    def with_loan_stats(self, at=None):
+        """Annote les compteurs d'emprunts en une seule requête groupée (jointure
+        sur les emprunts) :
+
+        - `active_loans_count` : emprunts ouverts ;
+        - `overdue_loans_count` : emprunts ouverts dont l'échéance est dépassée à `at` ;
+        - `total_loans_count` : tous les emprunts (hors historique archivé) ;
+        - `outstanding_fines` : amendes courues à `at` sur les emprunts ouverts
+          (politique `loans.fines`) plus amendes enregistrées au retour.
+        """
+        from loans.fines import get_fine_policy
+        from loans.models import OPEN_STATUSES
+
+        if at is None:
+            at = timezone.now()
+        open_loan = Q(loans__return_date__isnull=True, loans__status__in=OPEN_STATUSES)
+        money = models.DecimalField(max_digits=10, decimal_places=2)
+        return self.annotate(
+            active_loans_count=Count('loans', filter=open_loan),
+            overdue_loans_count=Count('loans', filter=open_loan & Q(loans__due_date__lt=at)),
+            total_loans_count=Count('loans'),
+            outstanding_fines=Coalesce(
+                Sum(Case(
+                    When(open_loan, then=get_fine_policy().expression(at, prefix='loans__')),
+                    default=F('loans__fine'),
+                    output_field=money,
+                )),
+                Value(Decimal('0.00')),
+                output_field=money,
+            ),
+        )
+
+
 class Lecteur(models.Model):
     """Modèle représentant un Lecteur (lié à un utilisateur)
 
@@ -61,7 +123,7 @@ class Lecteur(models.Model):
         verbose_name='Date d\'inscription'
     )
     derniere_activite = models.DateTimeField(
-        auto_now=True,
+        default=timezone.now,  # avancée par le vidage du suivi d'activité (members.activity)
         verbose_name='Dernière activité'
     )
     statut = models.CharField(
@@ -80,6 +142,8 @@ class Lecteur(models.Model):
         verbose_name='Remarques'
     )
 
+    objects = LecteurQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Lecteur'
         verbose_name_plural = 'Lecteurs'
@@ -102,9 +166,11 @@ class Lecteur(models.Model):
         return reverse('members:member_detail', kwargs={'pk': self.pk})
 
     def get_active_loans_count(self):
-        """Nombre d'emprunts actifs pour ce lecteur"""
+        """Nombre d'emprunts actifs pour ce lecteur (annotation de `with_loan_stats()` si présente)"""
+        if hasattr(self, 'active_loans_count'):
+            return self.active_loans_count
         from loans.models import Loan
-        return Loan.objects.filter(member=self, status='EN_COURS').count()
+        return Loan.objects.open().filter(member=self).count()
 
     def save(self, *args, **kwargs):
         """Sauvegarde le Lecteur et synchronise l'état `is_active` de l'utilisateur lié.
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from members.models import Lecteur
 
 
@@ -219,3 +221,367 @@ class LecteurUserCreationTests(TestCase):
         self.assertFalse(Lecteur.objects.filter(pk=to_remove1.pk).exists())
         self.assertFalse(Lecteur.objects.filter(pk=to_remove2.pk).exists())
         self.assertTrue(Lecteur.objects.filter(pk=preserved.pk).exists())
+
+
+class ImportLecteursTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        Lecteur.objects.create(first_name='Déjà', last_name='Là', email='deja@example.com', numero_abonnement='EXIST1')
+
+    def _write(self, name, content):
+        import os
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def _import(self, path, *args):
+        from django.core.management import call_command
+        from io import StringIO
+        out = StringIO()
+        call_command('import_lecteurs', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_creates_linked_accounts_and_credentials(self):
+        import csv
+        import os
+        from library.stats import get_stats
+        path = self._write('lecteurs.csv', (
+            'first_name,last_name,email,numero_abonnement,password\n'
+            'Alice,Martin,alice@example.com,ETU001,\n'
+            'Bob,Durand,Bob@Example.com,,Fourni-123\n'
+            'Carl,Petit,pas-un-email,,\n'
+            'Dora,Roux,deja@example.com,,\n'
+            'Eve,Blanc,alice@example.com,,\n'
+            'Fred,Noir,fred@example.com,,\n'
+        ))
+        credentials = os.path.join(self.tmp.name, 'identifiants.csv')
+
+        output = self._import(path, '--batch-size', '2', '--workers', '2', '--credentials', credentials)
+
+        self.assertIn('3 lecteur(s) importé(s), 3 ligne(s) rejetée(s)', output)
+        self.assertIn('ligne 4 : email invalide', output)
+        self.assertIn('ligne 5 : email déjà utilisé', output)
+        self.assertIn('ligne 6 : email déjà utilisé', output)
+
+        alice = Lecteur.objects.select_related('utilisateur').get(numero_abonnement='ETU001')
+        self.assertEqual((alice.utilisateur.username, alice.utilisateur.role), ('alice@example.com', 'lecteur'))
+        self.assertEqual(Lecteur.objects.get(email='bob@example.com').utilisateur.username, 'bob@example.com')
+        self.assertTrue(self.client.login(username='bob@example.com', password='Fourni-123'))
+
+        self.assertEqual(os.stat(credentials).st_mode & 0o777, 0o600)
+        with open(credentials, newline='', encoding='utf-8') as handle:
+            rows = {row['email']: row for row in csv.DictReader(handle)}
+        self.assertEqual(set(rows), {'alice@example.com', 'bob@example.com', 'fred@example.com'})
+        self.assertEqual(rows['bob@example.com']['password'], '')
+        self.assertTrue(self.client.login(username='fred@example.com', password=rows['fred@example.com']['password']))
+
+        # bulk_create ne passe pas par les signaux : les compteurs sont tenus à jour
+        self.assertEqual(get_stats().total_lecteurs_total, 4)
+
+    def test_email_case_and_taken_usernames(self):
+        import os
+        Lecteur.objects.create(first_name='Jean', last_name='Dupont', email='Jean.Dupont@Example.com', numero_abonnement='EXIST2')
+        get_user_model().objects.create_user(username='pris', password='pass')
+        path = self._write('lecteurs.csv', (
+            'first_name,last_name,email,username\n'
+            'Jean,Dupont,jean.dupont@example.com,\n'
+            'Ines,Bleu,ines@example.com,pris\n'
+            'Jules,Rose,jules@example.com,dup\n'
+            'Lou,Rose,lou@example.com,dup\n'
+        ))
+        output = self._import(path, '--workers', '1', '--credentials', os.path.join(self.tmp.name, 'id.csv'))
+
+        self.assertIn('3 lecteur(s) importé(s), 1 ligne(s) rejetée(s)', output)
+        self.assertIn('ligne 2 : email déjà utilisé : jean.dupont@example.com', output)
+        usernames = dict(Lecteur.objects.filter(utilisateur__isnull=False).values_list('email', 'utilisateur__username'))
+        self.assertEqual(usernames, {'ines@example.com': 'pris1', 'jules@example.com': 'dup', 'lou@example.com': 'dup1'})
+
+    def test_jsonl_dry_run_validates_without_writing(self):
+        path = self._write('lecteurs.jsonl', (
+            '{"first_name": "Gus", "last_name": "Vert", "email": "gus@example.com"}\n'
+            '{"first_name": "Gus", "last_name": "Vert"\n'
+            '\n'
+            '{"first_name": "Hugo", "last_name": "Gris", "email": "hugo@example.com", "numero_abonnement": "EXIST1"}\n'
+        ))
+        output = self._import(path, '--dry-run')
+        self.assertIn('Dry-run : 1 lecteur(s) valide(s), 2 ligne(s) rejetée(s)', output)
+        self.assertIn('ligne 2 : JSON invalide', output)
+        self.assertIn('ligne 4 : numero_abonnement déjà utilisé', output)
+        self.assertEqual(Lecteur.objects.count(), 1)
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class LecteurLoanStatsTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from library.models import Book
+        from loans.models import Loan
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(username='admin_stats', password='pass', email='stats@example.com')
+        self.book = Book.objects.create(title='Stats', author='Auteur', isbn='STATS01', total_copies=20, available_copies=20)
+        now = timezone.now()
+        self.busy = Lecteur.objects.create(first_name='Anne', last_name='Busy', email='busy@example.com', numero_abonnement='ST01')
+        self.late = Lecteur.objects.create(first_name='Bea', last_name='Late', email='late@example.com', numero_abonnement='ST02')
+        self.idle = Lecteur.objects.create(first_name='Cid', last_name='Idle', email='idle@example.com', numero_abonnement='ST03')
+        for _ in range(3):
+            Loan.objects.create(book=self.book, member=self.busy)
+        returned = Loan.objects.create(book=self.book, member=self.busy)
+        Loan.objects.filter(pk=returned.pk).update(return_date=now, status='EN_RETARD', fine='2.00')
+        Loan.objects.create(book=self.book, member=self.late, due_date=now - timedelta(days=3))
+
+    def test_with_loan_stats_annotates_counts_and_fines(self):
+        from decimal import Decimal
+        with self.assertNumQueries(1):
+            stats = {
+                lecteur.pk: (lecteur.active_loans_count, lecteur.overdue_loans_count,
+                             lecteur.total_loans_count, lecteur.outstanding_fines)
+                for lecteur in Lecteur.objects.with_loan_stats()
+            }
+        self.assertEqual(stats[self.busy.pk], (3, 0, 4, Decimal('2.00')))
+        self.assertEqual(stats[self.late.pk], (1, 1, 1, Decimal('3.00')))
+        self.assertEqual(stats[self.idle.pk], (0, 0, 0, Decimal('0.00')))
+        busy = Lecteur.objects.with_loan_stats().get(pk=self.busy.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(busy.get_active_loans_count(), 3)
+
+    def test_list_sorts_and_filters_on_loan_stats(self):
+        self.client.force_login(self.admin)
+        url = reverse('members:member_list')
+        response = self.client.get(url, {'sort': '-active_loans'})
+        self.assertEqual([m.pk for m in response.context['members']], [self.busy.pk, self.late.pk, self.idle.pk])
+        response = self.client.get(url, {'sort': '-fines'})
+        self.assertEqual(response.context['members'][0].pk, self.late.pk)
+        response = self.client.get(url, {'loans': 'overdue'})
+        self.assertEqual([m.pk for m in response.context['members']], [self.late.pk])
+        response = self.client.get(url, {'loans': 'active', 'sort': '-active_loans', 'cursor': ''})
+        self.assertEqual([m.pk for m in response.context['members']], [self.busy.pk, self.late.pk])
+
+        # Une requête groupée pour la page, quel que soit le nombre de lecteurs
+        for i in range(10):
+            Lecteur.objects.create(first_name='N', last_name=f'Plus{i}', email=f'plus{i}@example.com', numero_abonnement=f'PL{i}')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "loans_loan"' in q['sql']])
+
+    def test_detail_uses_annotations(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('members:member_detail', args=[self.late.pk]))
+        self.assertContains(response, 'dont <span class="text-danger">1 en retard</span>')
+        self.assertContains(response, '3,00€')
+
+    def test_admin_changelist_sorts_filters_and_actions(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:members_lecteur_changelist')
+        response = self.client.get(url, {'o': '-7'})  # colonne « Emprunts en cours »
+        self.assertEqual(response.context['cl'].result_list[0].pk, self.busy.pk)
+        response = self.client.get(url, {'emprunts': 'none'})
+        self.assertEqual([m.pk for m in response.context['cl'].result_list], [self.idle.pk])
+
+        response = self.client.post(url, {
+            'action': 'suspend_lecteur', '_selected_action': [self.busy.pk, self.late.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Lecteur.objects.filter(statut='suspended').count(), 2)
+
+
+class PurgeLecteursChunkTests(TestCase):
+    def setUp(self):
+        from library.models import Book
+        from loans.models import DemandeEmprunt, DemandeRetour, Loan, LoanHistory, Notification, Reservation
+        from django.utils import timezone
+        User = get_user_model()
+        superu = User.objects.create_superuser(username='root', password='s', email='root@example.com')
+        self.kept = Lecteur.objects.create(first_name='Keep', last_name='Me', email='keep@example.com', numero_abonnement='KEEP', utilisateur=superu)
+        # Deux exemplaires sortis (emprunts ouverts des lecteurs purgés)
+        self.book = Book.objects.create(title='Purge', author='Auteur', isbn='PURGE01', total_copies=3, available_copies=1)
+        self.held_book = Book.objects.create(title='Mis de côté', author='Auteur', isbn='PURGE02', total_copies=1, available_copies=0)
+        self.doomed = [
+            Lecteur.objects.create(first_name='P', last_name=f'Purge{i}', email=f'purge{i}@example.com', numero_abonnement=f'PG{i}')
+            for i in range(5)
+        ]
+        loan = Loan.objects.create(book=self.book, member=self.doomed[0])
+        DemandeRetour.objects.create(emprunt=loan, lecteur=self.doomed[0])
+        Loan.objects.create(book=self.book, member=self.doomed[1], due_date=timezone.now(), status='EN_RETARD')
+        DemandeEmprunt.objects.create(livre=self.book, lecteur=self.doomed[2])
+        Notification.pour_emprunts('DEMANDE_VALIDEE', [loan])
+        LoanHistory.objects.create(member=self.doomed[3], book=self.book, loan_date=timezone.now(),
+                                   due_date=timezone.now(), return_date=timezone.now(), status='RETOURNÉ', fine=0)
+        # Exemplaire mis de côté pour un lecteur purgé, puis file d'attente d'un lecteur conservé
+        Reservation.objects.create(livre=self.held_book, lecteur=self.doomed[4], statut='DISPONIBLE')
+        self.next_hold = Reservation.objects.create(livre=self.held_book, lecteur=self.kept)
+
+    def test_yes_flag_purges_in_chunks_with_set_based_deletes(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from library.stats import compute, get_stats
+        from loans.models import DemandeEmprunt, DemandeRetour, Loan, LoanHistory, Notification
+
+        out = StringIO()
+        call_command('purge_lecteurs', '--yes', '--batch-size', '2', stdout=out)
+        output = out.getvalue()
+
+        self.assertEqual(output.count('lecteur(s) supprimé(s) jusqu'), 3)
+        self.assertIn('lecteurs/s', output)
+        self.assertIn('Suppression terminée: 5 lecteur(s) supprimé(s)', output)
+        self.assertEqual(list(Lecteur.objects.values_list('pk', flat=True)), [self.kept.pk])
+        self.assertFalse(Loan.objects.exists())
+        self.assertFalse(DemandeEmprunt.objects.exists() or DemandeRetour.objects.exists())
+        self.assertEqual(LoanHistory.objects.get().member_id, None)
+        self.assertEqual(Notification.objects.get().lecteur_id, None)
+
+        # L'exemplaire mis de côté passe au lecteur suivant dans la file
+        self.next_hold.refresh_from_db()
+        self.assertEqual(self.next_hold.statut, 'DISPONIBLE')
+        # Les exemplaires des emprunts ouverts supprimés reviennent en stock
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 3)
+
+        connection.check_constraints()
+        counters = get_stats().as_dict()
+        expected = compute()
+        for name in ('active_loans', 'overdue_loans', 'total_lecteurs', 'total_lecteurs_total'):
+            self.assertEqual(counters[name], expected[name], name)
+
+
+class BulkStatutTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_superuser(username='admin_bulk', password='pass', email='bulk@example.com')
+        self.lecteurs = []
+        for i in range(4):
+            user = User.objects.create_user(username=f'etu{i}', password='pass', role='lecteur')
+            self.lecteurs.append(Lecteur.objects.create(
+                utilisateur=user, first_name='Etu', last_name=str(i), email=f'etu{i}@example.com',
+                numero_abonnement=f'ETU{i}' if i < 3 else 'PROF1',
+            ))
+        self.sans_compte = Lecteur.objects.create(first_name='Sans', last_name='Compte', email='sc@example.com', numero_abonnement='ETU9')
+
+    def _assert_stats_consistent(self):
+        from library.stats import compute, get_stats
+        counters, expected = get_stats().as_dict(), compute()
+        for name in ('total_lecteurs', 'total_lecteurs_total'):
+            self.assertEqual(counters[name], expected[name], name)
+
+    def test_set_statut_updates_readers_and_accounts_set_based(self):
+        queryset = Lecteur.objects.filter(numero_abonnement__startswith='ETU')
+        with CaptureQueriesContext(connection) as ctx:
+            updated = queryset.set_statut('suspended')
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len([sql for sql in writes if 'library_librarystats' not in sql]), 2)
+        self.assertEqual(updated, 4)
+        self.assertEqual(Lecteur.objects.filter(statut='suspended', is_active=False).count(), 4)
+        users = get_user_model().objects.filter(username__startswith='etu')
+        self.assertEqual(dict(users.values_list('username', 'is_active')),
+                         {'etu0': False, 'etu1': False, 'etu2': False, 'etu3': True})
+        self._assert_stats_consistent()
+
+        # Réactivation : sélection filtrée sur le statut qui change
+        Lecteur.objects.filter(statut='suspended').set_statut('active')
+        self.assertFalse(get_user_model().objects.filter(username__startswith='etu', is_active=False).exists())
+        self._assert_stats_consistent()
+
+    def test_selection_filtered_on_account_state(self):
+        # Sélection filtrée sur `is_active` du compte, que le premier UPDATE modifie
+        updated = Lecteur.objects.filter(utilisateur__is_active=True).set_statut('suspended')
+        self.assertEqual(updated, 4)
+        self.assertEqual(Lecteur.objects.filter(statut='suspended', is_active=False).count(), 4)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='etu', is_active=True).exists())
+        self._assert_stats_consistent()
+
+    def test_admin_actions_sync_accounts_on_annotated_queryset(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:members_lecteur_changelist')
+        response = self.client.post(url + '?emprunts=none', {
+            'action': 'mark_as_inactive', '_selected_action': [self.lecteurs[0].pk, self.lecteurs[1].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(get_user_model().objects.get(username='etu0').is_active)
+        self.assertEqual(Lecteur.objects.get(pk=self.lecteurs[1].pk).statut, 'inactive')
+        self._assert_stats_consistent()
+
+    def test_deactivate_command_for_term_end(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from library.models import Book
+        from loans.models import Loan
+        book = Book.objects.create(title='Encore', author='Auteur', isbn='TERM01', total_copies=1, available_copies=1)
+        Loan.objects.create(book=book, member=self.lecteurs[2])
+
+        with self.assertRaises(CommandError):
+            call_command('deactivate_lecteurs', stdout=StringIO())
+
+        out = StringIO()
+        call_command('deactivate_lecteurs', '--prefix', 'ETU', '--keep-borrowers', '--dry-run', stdout=out)
+        self.assertIn('3 lecteur(s)', out.getvalue())
+        self.assertFalse(Lecteur.objects.exclude(statut='active').exists())
+
+        out = StringIO()
+        call_command('deactivate_lecteurs', '--prefix', 'ETU', '--keep-borrowers', stdout=out)
+        self.assertIn('3 lecteur(s) passé(s) au statut « inactive »', out.getvalue())
+        self.assertEqual(
+            set(Lecteur.objects.filter(statut='active').values_list('numero_abonnement', flat=True)),
+            {'ETU2', 'PROF1'},
+        )
+        self.assertEqual(
+            set(get_user_model().objects.filter(is_active=False).values_list('username', flat=True)),
+            {'etu0', 'etu1'},
+        )
+        self._assert_stats_consistent()
+
+
+class ActivityTrackerTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from members.activity import buffer
+        self.buffer = buffer
+        self.buffer.flush()  # tampon partagé par le processus de test
+        self.addCleanup(self.buffer._seen.clear)
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'actif{i}', password='pass', role='lecteur') for i in range(3)]
+        self.lecteurs = [
+            Lecteur.objects.create(utilisateur=user, first_name='Act', last_name=str(i), email=f'act{i}@example.com', numero_abonnement=f'ACT{i}')
+            for i, user in enumerate(self.users)
+        ]
+        self.long_ago = timezone.now() - timedelta(days=90)
+        Lecteur.objects.update(derniere_activite=self.long_ago)
+
+    def test_requests_are_buffered_without_writes(self):
+        self.client.force_login(self.users[0])
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('library:dashboard'))
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "members_lecteur"')])
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(Lecteur.objects.get(pk=self.lecteurs[0].pk).derniere_activite, self.long_ago)
+
+    def test_profile_save_keeps_last_activity(self):
+        # Seul le vidage du tampon fait avancer `derniere_activite`
+        lecteur = Lecteur.objects.get(pk=self.lecteurs[0].pk)
+        lecteur.phone = '0600000000'
+        lecteur.save()
+        self.assertEqual(Lecteur.objects.get(pk=lecteur.pk).derniere_activite, self.long_ago)
+
+    def test_periodic_flush_writes_one_bulk_update(self):
+        from django.test import override_settings
+        self.buffer.record(self.users[1].pk)
+        self.buffer.record(self.users[2].pk)
+        self.buffer.record(999999)  # utilisateur sans lecteur : ignoré
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len(self.buffer), 0)
+        activity = dict(Lecteur.objects.values_list('pk', 'derniere_activite'))
+        self.assertEqual(activity[self.lecteurs[0].pk], self.long_ago)
+        self.assertGreater(activity[self.lecteurs[1].pk], self.long_ago)
+        self.assertGreater(activity[self.lecteurs[2].pk], self.long_ago)
+
+        # Intervalle écoulé : la requête suivante vide le tampon
+        self.client.force_login(self.users[0])
+        with override_settings(LIBRARY_ACTIVITY_FLUSH_INTERVAL=0):
+            self.client.get(reverse('library:dashboard'))
+        self.assertGreater(Lecteur.objects.get(pk=self.lecteurs[0].pk).derniere_activite, self.long_ago)
@@ -1,14 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.views.generic import CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from .models import Lecteur
 from .forms import LecteurForm
+from accounts.usernames import create_user_with_free_username
 from library.views import is_admin
+from library.pagination import paginate
 
 
 class IsAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -21,9 +22,30 @@ class IsAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
         return redirect('library:book_list')
 
 
+# Tris proposés dans la liste des lecteurs (annotations de `with_loan_stats()` comprises)
+LECTEUR_SORTS = {
+    'name': ['last_name', 'first_name', 'id'],
+    '-active_loans': ['-active_loans_count', 'id'],
+    '-overdue_loans': ['-overdue_loans_count', 'id'],
+    '-total_loans': ['-total_loans_count', 'id'],
+    '-fines': ['-outstanding_fines', 'id'],
+}
+
+# Filtres sur les compteurs d'emprunts (clause HAVING de la requête groupée)
+LECTEUR_LOAN_FILTERS = {
+    'active': Q(active_loans_count__gt=0),
+    'overdue': Q(overdue_loans_count__gt=0),
+    'fines': Q(outstanding_fines__gt=0),
+}
+
+
 @login_required
 def lecteur_list(request):
-    """Liste des lecteurs (accessible uniquement au bibliothécaire)"""
+    """Liste des lecteurs (accessible uniquement au bibliothécaire)
+
+    Les compteurs d'emprunts et les amendes sont annotés par `with_loan_stats()` :
+    une requête groupée pour toute la page, triable et filtrable.
+    """
     if not is_admin(request.user):
         messages.error(request, 'Vous n\'avez pas les permissions pour accéder à cette page.')
         return redirect('library:book_list')
@@ -44,11 +66,20 @@ def lecteur_list(request):
     status = request.GET.get('status', '')
     if status:
         lecteurs = lecteurs.filter(statut=status)
+
+    lecteurs = lecteurs.with_loan_stats()
+
+    # Filtrer sur les emprunts (actifs, en retard, avec amendes)
+    loans_filter = request.GET.get('loans', '')
+    if loans_filter in LECTEUR_LOAN_FILTERS:
+        lecteurs = lecteurs.filter(LECTEUR_LOAN_FILTERS[loans_filter])
+
+    sort = request.GET.get('sort', 'name')
+    if sort not in LECTEUR_SORTS:
+        sort = 'name'
     
-    # Pagination
-    paginator = Paginator(lecteurs, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination (classique ou par curseur avec ?cursor=)
+    page_obj = paginate(request, lecteurs, 20, LECTEUR_SORTS[sort])
     
     context = {
         'page_obj': page_obj,
@@ -56,6 +87,8 @@ def lecteur_list(request):
         'members': page_obj.object_list,  # compatibilité avec les templates utilisant 'members'
         'search': search,
         'status': status,
+        'loans_filter': loans_filter,
+        'sort': sort,
     }
     
     return render(request, 'members/member_list.html', context)
@@ -64,16 +97,16 @@ def lecteur_list(request):
 @login_required
 def lecteur_detail(request, pk):
     """Détail d'un lecteur"""
-    lecteur = get_object_or_404(Lecteur, pk=pk)
+    lecteur = get_object_or_404(Lecteur.objects.with_loan_stats(), pk=pk)
     
     # Vérifier les permissions : un lecteur ne peut voir que son propre profil
     if not is_admin(request.user) and (not hasattr(request.user, 'lecteur') or request.user != lecteur.utilisateur):
         messages.error(request, 'Vous n\'avez pas les permissions pour accéder à cette page.')
         return redirect('library:book_list')
     
-    # Récupérer les emprunts de ce lecteur
-    active_loans = lecteur.loans.filter(status='EN_COURS')
-    loan_history = lecteur.loans.filter(status__in=['RETOURNÉ', 'EN_RETARD'])
+    # Récupérer les emprunts de ce lecteur (les compteurs viennent des annotations)
+    active_loans = lecteur.loans.open().select_related('book')
+    loan_history = lecteur.loans.closed()
     
     context = {
         'lecteur': lecteur,
@@ -102,13 +135,10 @@ class LecteurCreateView(IsAdminMixin, CreateView):
 
         # Créer automatiquement un utilisateur lié (CustomUser) si pas fourni
         if not form.instance.utilisateur:
-            from django.contrib.auth import get_user_model
             import secrets
-            User = get_user_model()
 
             # Préférer un username fourni dans le formulaire sinon utiliser l'email
             base_username = form.cleaned_data.get('user_username') or (form.instance.email if form.instance.email else form.instance.numero_abonnement)
-            username = base_username
 
             # Si l'admin a fourni un mot de passe dans le formulaire, l'utiliser après validation
             provided_password = form.cleaned_data.get('user_password')
@@ -118,36 +148,18 @@ class LecteurCreateView(IsAdminMixin, CreateView):
                 # Générer un mot de passe sûr (assez long pour passer les validateurs)
                 password = secrets.token_urlsafe(12)
 
-            # Essayer de créer l'utilisateur de façon robuste (retries si collision sur la contrainte unique)
-            from django.db import IntegrityError
-            import secrets as _secrets
-            max_attempts = 6
-            attempt = 0
-            created = False
-            user = None
-            while not created and attempt < max_attempts:
-                candidate = username if attempt == 0 else f"{username}-{_secrets.token_hex(3)}"
-                if User.objects.filter(username=candidate).exists():
-                    attempt += 1
-                    continue
-                try:
-                    user = User.objects.create_user(
-                        username=candidate,
-                        email=form.instance.email or '',
-                        first_name=form.instance.first_name,
-                        last_name=form.instance.last_name,
-                    )
-                    user.role = 'lecteur'
-                    user.set_password(password)
-                    user.save()
-                    created = True
-                    username = candidate
-                except IntegrityError:
-                    attempt += 1
-
-            if created:
+            # Un nom libre est choisi en une requête (suffixe numérique si collision)
+            user = create_user_with_free_username(
+                base_username, password,
+                email=form.instance.email or '',
+                first_name=form.instance.first_name,
+                last_name=form.instance.last_name,
+                role='lecteur',
+            )
+
+            if user:
                 form.instance.utilisateur = user
-                created_user_info = {'username': username, 'password': password}
+                created_user_info = {'username': user.username, 'password': password}
             else:
                 # Ne pas bloquer la création du Lecteur : sauvegarder le Lecteur sans utilisateur lié
                 messages.error(self.request, "L'utilisateur lié n'a pas pu être créé après plusieurs tentatives. Le lecteur est enregistré sans compte utilisateur. Veuillez créer manuellement un compte pour lui.")
@@ -228,36 +240,20 @@ class LecteurUpdateView(IsAdminMixin, UpdateView):
             else:
                 # Créer un utilisateur si aucun lié
                 import secrets as _secrets
-                from django.db import IntegrityError
                 username_base = user_username or (form.instance.email or form.instance.numero_abonnement)
-                username = username_base
                 password = user_password or _secrets.token_urlsafe(12)
 
-                max_attempts = 6
-                attempt = 0
-                created = False
-                while not created and attempt < max_attempts:
-                    candidate = username if attempt == 0 else f"{username}-{_secrets.token_hex(3)}"
-                    if User.objects.filter(username=candidate).exists():
-                        attempt += 1
-                        continue
-                    try:
-                        utilisateur = User.objects.create_user(
-                            username=candidate,
-                            email=form.instance.email or '',
-                            first_name=form.instance.first_name,
-                            last_name=form.instance.last_name,
-                        )
-                        utilisateur.role = 'lecteur'
-                        utilisateur.set_password(password)
-                        utilisateur.save()
-                        created = True
-                        created_user_info = {'username': candidate, 'password': password}
-                    except IntegrityError:
-                        attempt += 1
-
-                if created:
+                utilisateur = create_user_with_free_username(
+                    username_base, password,
+                    email=form.instance.email or '',
+                    first_name=form.instance.first_name,
+                    last_name=form.instance.last_name,
+                    role='lecteur',
+                )
+
+                if utilisateur:
                     form.instance.utilisateur = utilisateur
+                    created_user_info = {'username': utilisateur.username, 'password': password}
                 else:
                     messages.warning(self.request, "L'utilisateur lié n'a pas pu être créé automatiquement.")
 